@@ -0,0 +1,206 @@
+"""
+Admission control for the Memory-Enhanced API
+Each lane (a group of endpoints) admits a bounded number of concurrent requests and parks
+the overflow in a bounded FIFO queue. A request is shed with 503 + ``Retry-After`` as soon as
+it is clear it cannot start in time: when the queue is full, when the lane's observed service
+time says the wait would exceed its deadline, or when the deadline passes while it waits.
+Cheap endpoints get their own lane, so a backlog of analyses never delays them.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+
+# Optional client hint: seconds the caller is willing to wait for the whole request
+TIMEOUT_HEADER = b"x-request-timeout"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted"""
+
+    def __init__(self, lane: str, reason: str, retry_after: float):
+        super().__init__(f"{lane} lane is at capacity ({reason}); retry in {retry_after:.1f}s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Concurrency limit plus a bounded, deadline-aware wait queue for one lane
+
+    Slots are handed over directly from a finishing request to the oldest waiter, so queued
+    requests are served in arrival order and cannot be overtaken by new arrivals. Service time
+    is tracked as an EWMA of slot hold times and used to estimate how long a new waiter would
+    queue. ``acquire`` returns the seconds spent queued; every admitted request must ``release``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        max_queue: int,
+        max_wait: float,
+        service_alpha: float = 0.2,
+        observe_wait: Optional[Callable[[str, float], None]] = None,
+        on_reject: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.service_alpha = service_alpha
+        self.observe_wait = observe_wait
+        self.on_reject = on_reject
+        self.in_flight = 0
+        self.service_time: Optional[float] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self, position: int) -> float:
+        """Expected queueing time for the waiter at 1-based ``position``
+
+        With every slot busy, one frees on average every ``service_time / concurrency``
+        seconds, so the waiter at ``position`` starts after ``position`` such releases.
+        """
+        if self.service_time is None:
+            return 0.0
+        return position / self.concurrency * self.service_time
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return 0.0
+
+        deadline = self.max_wait
+        if timeout is not None:
+            # Leave room to actually serve the request inside the caller's budget
+            deadline = min(deadline, timeout - (self.service_time or 0.0))
+        expected = self.estimated_wait(len(self._waiters) + 1)
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", expected)
+        if deadline <= 0 or expected > deadline:
+            self._reject("deadline", expected)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            if not future.done() or future.cancelled():
+                self._discard(future)
+                self._reject("timeout", self.estimated_wait(len(self._waiters) + 1))
+            # Otherwise the slot arrived together with the deadline: keep it
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the client went away; pass it on
+                self.release()
+            else:
+                self._discard(future)
+            raise
+        waited = time.monotonic() - started
+        self.admitted += 1
+        if self.observe_wait is not None:
+            self.observe_wait(self.name, waited)
+        return waited
+
+    def release(self, held: Optional[float] = None):
+        if held is not None:
+            self.service_time = held if self.service_time is None else (
+                self.service_alpha * held + (1 - self.service_alpha) * self.service_time
+            )
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # Hand the slot straight to the oldest live waiter; in_flight is unchanged
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _discard(self, future: asyncio.Future):
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def _reject(self, reason: str, expected: float):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        if self.on_reject is not None:
+            self.on_reject(self.name, reason)
+        retry_after = max(1.0, expected or self.service_time or 1.0)
+        raise AdmissionRejected(self.name, reason, retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "in_flight": self.in_flight,
+            "queued": self.depth,
+            "admitted": self.admitted,
+            "queued_total": self.queued,
+            "rejected": dict(self.rejected),
+            "service_time_ms": round(self.service_time * 1000, 2) if self.service_time is not None else None
+        }
+
+
+def _request_timeout(scope: Dict[str, Any]) -> Optional[float]:
+    for name, value in scope.get("headers", ()):
+        if name == TIMEOUT_HEADER:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AdmissionMiddleware:
+    """ASGI middleware routing each HTTP request through its lane's ``AdmissionLimiter``
+
+    ``classify(method, path)`` names the lane; requests with no lane (or an unknown one) are
+    passed straight through. The slot is held until the response body has been sent, so
+    streaming endpoints count against their lane for their whole duration.
+    """
+
+    def __init__(self, app, classify: Callable[[str, str], Optional[str]], limiters: Dict[str, AdmissionLimiter]):
+        self.app = app
+        self.classify = classify
+        self.limiters = limiters
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        lane = self.classify(scope["method"], scope["path"])
+        limiter = self.limiters.get(lane) if lane is not None else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire(_request_timeout(scope))
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": str(e)},
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+            await response(scope, receive, send)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
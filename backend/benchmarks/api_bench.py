@@ -0,0 +1,304 @@
+"""
+End-to-end latency benchmark for the Memory-Enhanced API
+Starts the fake memory and RAG services (``fake_services.py``) and the API as separate
+processes, then drives ``/analyze-with-memory``, ``/health-journey/{user_id}`` and
+``/sessions/{id}/context`` with a closed loop of N concurrent clients per concurrency level.
+Reports throughput and p50/p95/p99 latency per scenario and level, and writes the run as
+JSON so it can be compared with a later one (``--compare``).
+
+    python backend/benchmarks/api_bench.py --concurrency 1,8,32 --duration 10
+    python backend/benchmarks/api_bench.py --api-env FAST_SERIALIZATION=1 --compare backend/benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+LAB_PANEL = {"TSH": 2.8, "Free T3": 3.1, "Free T4": 1.2, "ferritin": 45, "Vitamin D": 38, "fasting glucose": 88}
+
+
+def _analyze(client: httpx.AsyncClient, index: int, args: argparse.Namespace):
+    # Distinct queries miss the API's RAG cache unless --repeat-queries is set
+    query = "What do my thyroid markers say about my metabolism?"
+    if not args.repeat_queries:
+        query = f"{query} (request {index})"
+    return client.post("/analyze-with-memory", json={
+        "user_id": f"bench-user-{index % args.users}",
+        "session_id": f"bench-session-{index % args.sessions}",
+        "query": query,
+        "lab_data": LAB_PANEL
+    })
+
+
+def _health_journey(client: httpx.AsyncClient, index: int, args: argparse.Namespace):
+    return client.get(f"/health-journey/bench-user-{index % args.users}")
+
+
+def _session_context(client: httpx.AsyncClient, index: int, args: argparse.Namespace):
+    return client.get(f"/sessions/bench-session-{index % args.sessions}/context", params={"limit": 10})
+
+
+SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, int, argparse.Namespace], Any]] = {
+    "analyze": _analyze,
+    "health_journey": _health_journey,
+    "session_context": _session_context,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples: List[float], statuses: Counter, window: float) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    row: Dict[str, Any] = {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / window, 2) if window > 0 else 0.0,
+        "ok_throughput_rps": round(ok / window, 2) if window > 0 else 0.0,
+        "error_rate": round(1 - ok / len(ordered), 4) if ordered else 0.0,
+        "statuses": dict(statuses)
+    }
+    if ordered:
+        row.update({
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2)
+        })
+    return row
+
+
+async def run_level(client: httpx.AsyncClient, scenario: str, concurrency: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Closed loop: each of ``concurrency`` clients sends its next request as soon as the last one returns"""
+    send = SCENARIOS[scenario]
+    counter = itertools.count()
+    samples: List[float] = []
+    statuses: Counter = Counter()
+    measure_from = time.perf_counter() + args.warmup
+    stop_at = measure_from + args.duration
+
+    async def client_loop():
+        while time.perf_counter() < stop_at:
+            index = next(counter)
+            started = time.perf_counter()
+            try:
+                response = await send(client, index, args)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if started >= measure_from:
+                samples.append(time.perf_counter() - started)
+                statuses[status] += 1
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    window = time.perf_counter() - measure_from
+    return {"concurrency": concurrency, **summarize(samples, statuses, window)}
+
+
+def _start(command: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with status {process.returncode} before becoming ready")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="api_bench_")
+    processes: List[subprocess.Popen] = []
+    api_url = args.api_url
+    try:
+        if api_url is None:
+            memory_port, rag_port, api_port = _free_port(), _free_port(), _free_port()
+            fake_command = [
+                sys.executable, "fake_services.py",
+                "--profile", args.profile,
+                "--memory-port", str(memory_port),
+                "--rag-port", str(rag_port),
+                "--seed", str(args.seed)
+            ]
+            for value in args.latency:
+                fake_command += ["--latency", value]
+            for value in args.error_rate:
+                fake_command += ["--error-rate", value]
+            processes.append(_start(fake_command, dict(os.environ), os.path.join(workdir, "fake_services.log")))
+            await _wait_ready(f"http://127.0.0.1:{memory_port}/stats", processes[-1])
+
+            # Spool, traces and the shared cache live in a scratch directory, never in the repo
+            api_env = {
+                **os.environ,
+                "MEMORY_SERVICE_URL": f"http://127.0.0.1:{memory_port}",
+                "RAG_SERVICE_URL": f"http://127.0.0.1:{rag_port}",
+                "WRITE_BEHIND_SPOOL": os.path.join(workdir, "spool", "memory_writes.jsonl"),
+                "TRACE_PATH": os.path.join(workdir, "traces", "analysis_traces.jsonl"),
+                "SHARED_CACHE_PATH": os.path.join(workdir, "cache", "shared_cache.sqlite3"),
+                **dict(args.api_env)
+            }
+            api_command = [
+                sys.executable, "-m", "uvicorn", "memory_enhanced_api:app",
+                "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning"
+            ]
+            workers = int(api_env.get("API_WORKERS") or 1)
+            if workers > 1:
+                api_command += ["--workers", str(workers)]
+            elif "SHARED_CACHE_PATH" not in dict(args.api_env):
+                api_env.pop("SHARED_CACHE_PATH")
+            processes.append(_start(api_command, api_env, os.path.join(workdir, "api.log")))
+            api_url = f"http://127.0.0.1:{api_port}"
+            await _wait_ready(f"{api_url}/health/ready", processes[-1])
+
+        results: Dict[str, Any] = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "api_url": args.api_url or "local",
+            "profile": None if args.api_url else args.profile,
+            "latency_overrides": args.latency,
+            "error_rate_overrides": args.error_rate,
+            "api_env": dict(args.api_env),
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "users": args.users,
+            "sessions": args.sessions,
+            "repeat_queries": args.repeat_queries,
+            "python": platform.python_version(),
+            "git_commit": _git_commit(),
+            "scenarios": {}
+        }
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2, max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout, limits=limits) as client:
+            for scenario in args.scenarios:
+                rows = []
+                for concurrency in args.concurrency:
+                    row = await run_level(client, scenario, concurrency, args)
+                    rows.append(row)
+                    _print_row(scenario, row)
+                results["scenarios"][scenario] = rows
+        if args.api_url is None:
+            results["workdir"] = workdir
+        return results
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_row(scenario: str, row: Dict[str, Any]):
+    if not row["requests"]:
+        print(f"{scenario:<16} c={row['concurrency']:<4} no completed requests")
+        return
+    print(
+        f"{scenario:<16} c={row['concurrency']:<4} {row['throughput_rps']:>9.1f} req/s  "
+        f"p50 {row['p50_ms']:>9.1f}ms  p95 {row['p95_ms']:>9.1f}ms  p99 {row['p99_ms']:>9.1f}ms  "
+        f"errors {row['error_rate'] * 100:.1f}%"
+    )
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Print throughput and latency changes for every scenario and level present in both runs"""
+    print(f"\nChange vs {previous.get('started_at')} ({previous.get('git_commit')})")
+    for scenario, rows in current["scenarios"].items():
+        before = {row["concurrency"]: row for row in previous.get("scenarios", {}).get(scenario, [])}
+        for row in rows:
+            old = before.get(row["concurrency"])
+            if not old or not old.get("requests") or not row["requests"]:
+                continue
+            changes = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+                delta = (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                changes.append(f"{key} {delta:+.1f}%")
+            print(f"{scenario:<16} c={row['concurrency']:<4} " + "  ".join(changes))
+
+
+def _key_value(value: str):
+    key, sep, setting = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{value}'")
+    return key, setting
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=lambda value: [int(level) for level in value.split(",")], default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--repeat-queries", action="store_true", help="Send the same analysis query every time (RAG cache hits)")
+    parser.add_argument("--profile", default="laptop", help="Fake service latency profile")
+    parser.add_argument("--latency", action="append", default=[], help="Passed to fake_services.py --latency")
+    parser.add_argument("--error-rate", action="append", default=[], help="Passed to fake_services.py --error-rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--api-env", action="append", type=_key_value, default=[], metavar="KEY=VALUE",
+                        help="Environment for the API process (e.g. FAST_SERIALIZATION=1, API_WORKERS=4)")
+    parser.add_argument("--api-url", help="Benchmark an already running API instead of starting one")
+    parser.add_argument("--output", help="Results path (default: backend/benchmarks/results/api_bench_<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"api_bench_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
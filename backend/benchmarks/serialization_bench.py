@@ -0,0 +1,180 @@
+"""
+Serialization benchmark for MemoryEnhancedResponse
+Compares the default path (validated model returned through a FastAPI route with
+``response_model``) against the fast path (``model_construct`` + ``FastJSONResponse``) for a
+typical and a large payload. Each path is measured twice: the encode step alone, and end to end
+through a minimal ASGI app so FastAPI's own response handling is included.
+
+    python backend/benchmarks/serialization_bench.py --iterations 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from pydantic import TypeAdapter
+
+from memory_enhanced_api import MemoryEnhancedResponse
+from serialization import ORJSON_AVAILABLE, FastJSONResponse, dumps, model_payload
+from trends import TrendEngine
+
+
+def build_payload(analysis_chars: int, sources: int, source_chars: int, biomarkers: int, readings: int) -> Dict[str, Any]:
+    """Response fields shaped like a real analysis; sizes are the knobs"""
+    trends = {
+        f"biomarker_{b}": [
+            {
+                "value": round(10 + b + (r % 7) * 0.37, 2),
+                "interpretation": "Ray Peat interpretation of the reading. " * 4,
+                "recommendations": "Increase carbohydrate intake; avoid PUFA.",
+                "timestamp": f"2026-{1 + r % 12:02d}-{1 + r % 28:02d}T08:00:00",
+                "metadata": {"session_id": f"session-{r}", "source": "lab_panel"}
+            }
+            for r in range(readings)
+        ]
+        for b in range(biomarkers)
+    }
+    return {
+        "analysis": ("Your thyroid markers suggest a low metabolic rate. " * (analysis_chars // 52 + 1))[:analysis_chars],
+        "sources": [
+            {"content": "Excerpt from a Ray Peat article. " * (source_chars // 33 + 1), "metadata": {"title": f"Article {i}", "score": 0.9 - i * 0.01}}
+            for i in range(sources)
+        ],
+        "context_used": {
+            "health_journey_entries": biomarkers,
+            "memory_entries": 3,
+            "contextual_insights": True,
+            "context_sources": {
+                "session": {"status": "ok", "latency_ms": 3.2},
+                "health_journey": {"status": "ok", "latency_ms": 41.0},
+                "memory": {"status": "ok", "latency_ms": 37.5}
+            },
+            "prompt_tokens": 1432,
+            "prompt_token_budget": 2000,
+            "prompt_truncated": False,
+            "prompt_omitted": {"lab": 0, "trends": 0, "memory": 0, "interpretations": 0}
+        },
+        "personalized": True,
+        "session_id": "0b6f3c8e-4d59-4a53-9a39-6f0b8f6a1d2e",
+        "recommendations": ["Consider adding orange juice with meals to support thyroid function."] * 5,
+        "health_trends": trends,
+        "trend_summary": TrendEngine().summarize(trends)
+    }
+
+
+PAYLOADS = {
+    "typical": lambda: build_payload(analysis_chars=3000, sources=5, source_chars=600, biomarkers=8, readings=6),
+    "large": lambda: build_payload(analysis_chars=40000, sources=20, source_chars=2000, biomarkers=40, readings=120),
+}
+
+
+RESPONSE_ADAPTER = TypeAdapter(MemoryEnhancedResponse)
+
+
+def default_encode(payload: Dict[str, Any]) -> bytes:
+    # The steps a response_model route takes: build the model, validate the return value
+    # against the response field, then serialize it through pydantic-core
+    model = MemoryEnhancedResponse(**payload)
+    return RESPONSE_ADAPTER.dump_json(RESPONSE_ADAPTER.validate_python(model))
+
+
+def fast_encode(payload: Dict[str, Any]) -> bytes:
+    return dumps(model_payload(MemoryEnhancedResponse.model_construct(**payload)))
+
+
+def time_calls(fn: Callable[[], Any], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def time_requests(client: httpx.AsyncClient, path: str, iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def build_app(payload: Dict[str, Any]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=MemoryEnhancedResponse)
+    async def default_route():
+        return MemoryEnhancedResponse(**payload)
+
+    @app.get("/fast")
+    async def fast_route():
+        return FastJSONResponse(model_payload(MemoryEnhancedResponse.model_construct(**payload)))
+
+    return app
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean_us": round(statistics.fmean(ordered) * 1e6, 1),
+        "p50_us": round(ordered[len(ordered) // 2] * 1e6, 1),
+        "p99_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 1)
+    }
+
+
+async def run(iterations: int, warmup: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"orjson": ORJSON_AVAILABLE, "iterations": iterations, "payloads": {}}
+    for name, make_payload in PAYLOADS.items():
+        payload = make_payload()
+        size = len(default_encode(payload))
+        row: Dict[str, Any] = {"bytes": size}
+
+        for label, fn in (("encode_default", default_encode), ("encode_fast", fast_encode)):
+            time_calls(lambda: fn(payload), warmup)
+            row[label] = summarize(time_calls(lambda: fn(payload), iterations))
+
+        transport = httpx.ASGITransport(app=build_app(payload))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for label, path in (("route_default", "/default"), ("route_fast", "/fast")):
+                await time_requests(client, path, warmup)
+                row[label] = summarize(await time_requests(client, path, iterations))
+
+        row["encode_speedup"] = round(row["encode_default"]["mean_us"] / row["encode_fast"]["mean_us"], 2)
+        row["route_speedup"] = round(row["route_default"]["mean_us"] / row["route_fast"]["mean_us"], 2)
+        results["payloads"][name] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations, args.warmup))
+    print(f"orjson available: {results['orjson']}; {args.iterations} iterations per measurement")
+    for name, row in results["payloads"].items():
+        print(f"\n{name} payload ({row['bytes'] / 1024:.1f} KiB)")
+        for label in ("encode_default", "encode_fast", "route_default", "route_fast"):
+            stats = row[label]
+            print(f"  {label:<15} mean {stats['mean_us']:>10.1f}us  p50 {stats['p50_us']:>10.1f}us  p99 {stats['p99_us']:>10.1f}us")
+        print(f"  speedup: encode x{row['encode_speedup']}, route x{row['route_speedup']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Biomarker reference data for the Memory-Enhanced API
+Optimal ranges mirror ``OPTIMAL_RANGES`` in lib/biomarker-analysis.ts; lab panels arrive with
+free-form names ("TSH", "Free T3", "free_t3"), so lookups go through ``normalize_biomarker``.
+"""
+
+import re
+from typing import Any, Dict, Optional
+
+OPTIMAL_RANGES: Dict[str, Dict[str, Any]] = {
+    # Thyroid Function
+    "tsh": {"min": 0.5, "max": 2.0, "unit": "µIU/mL", "description": "Thyroid Stimulating Hormone"},
+    "freet4": {"min": 1.3, "max": 1.8, "unit": "ng/dL", "description": "Free Thyroxine"},
+    "freet3": {"min": 3.2, "max": 4.4, "unit": "pg/mL", "description": "Free Triiodothyronine"},
+    "reverset3": {"min": 9, "max": 24, "unit": "ng/dL", "description": "Reverse T3"},
+
+    # Metabolic Health
+    "fastingglucose": {"min": 72, "max": 85, "unit": "mg/dL", "description": "Fasting Glucose"},
+    "fastinginsulin": {"min": 2, "max": 5, "unit": "µIU/mL", "description": "Fasting Insulin"},
+    "hba1c": {"min": 4.8, "max": 5.2, "unit": "%", "description": "Hemoglobin A1c"},
+
+    # Lipid Profile
+    "totalcholesterol": {"min": 180, "max": 250, "unit": "mg/dL", "description": "Total Cholesterol"},
+    "hdl": {"min": 50, "max": 100, "unit": "mg/dL", "description": "HDL Cholesterol"},
+    "ldl": {"min": 70, "max": 150, "unit": "mg/dL", "description": "LDL Cholesterol"},
+    "triglycerides": {"min": 50, "max": 80, "unit": "mg/dL", "description": "Triglycerides"},
+
+    # Inflammation
+    "hscrp": {"min": 0.0, "max": 0.5, "unit": "mg/L", "description": "High-Sensitivity C-Reactive Protein"},
+
+    # Vitamins and Minerals
+    "vitamind": {"min": 50, "max": 80, "unit": "ng/mL", "description": "Vitamin D 25-OH"},
+    "vitaminb12": {"min": 500, "max": 1300, "unit": "pg/mL", "description": "Vitamin B12"},
+    "folate": {"min": 10, "max": 24, "unit": "ng/mL", "description": "Folate"},
+    "ferritin": {"min": 30, "max": 150, "unit": "ng/mL", "description": "Ferritin"},
+    "iron": {"min": 85, "max": 160, "unit": "µg/dL", "description": "Iron"},
+    "transferrin": {"min": 250, "max": 380, "unit": "mg/dL", "description": "Transferrin"},
+    "magnesium": {"min": 2.0, "max": 2.6, "unit": "mg/dL", "description": "Magnesium"},
+    "zinc": {"min": 90, "max": 140, "unit": "µg/dL", "description": "Zinc"},
+
+    # Liver Function
+    "alt": {"min": 10, "max": 30, "unit": "U/L", "description": "Alanine Aminotransferase"},
+    "ast": {"min": 10, "max": 30, "unit": "U/L", "description": "Aspartate Aminotransferase"},
+    "alkalinephosphatase": {"min": 70, "max": 120, "unit": "U/L", "description": "Alkaline Phosphatase"},
+
+    # Kidney Function
+    "creatinine": {"min": 0.7, "max": 1.2, "unit": "mg/dL", "description": "Creatinine"},
+    "bun": {"min": 10, "max": 20, "unit": "mg/dL", "description": "Blood Urea Nitrogen"},
+
+    # Complete Blood Count
+    "wbc": {"min": 4.5, "max": 11.0, "unit": "10³/µL", "description": "White Blood Cells"},
+    "rbc": {"min": 4.2, "max": 5.4, "unit": "10⁶/µL", "description": "Red Blood Cells"},
+    "hemoglobin": {"min": 13.5, "max": 17.5, "unit": "g/dL", "description": "Hemoglobin"},
+    "hematocrit": {"min": 40, "max": 52, "unit": "%", "description": "Hematocrit"},
+    "platelets": {"min": 150, "max": 450, "unit": "10³/µL", "description": "Platelets"},
+}
+
+# Common spellings that do not normalize onto the canonical key
+ALIASES = {
+    "glucose": "fastingglucose",
+    "insulin": "fastinginsulin",
+    "a1c": "hba1c",
+    "t3": "freet3",
+    "ft3": "freet3",
+    "t4": "freet4",
+    "ft4": "freet4",
+    "rt3": "reverset3",
+    "crp": "hscrp",
+    "cholesterol": "totalcholesterol",
+    "vitd": "vitamind",
+    "25ohd": "vitamind",
+    "b12": "vitaminb12",
+    "alp": "alkalinephosphatase",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+
+def normalize_biomarker(name: str) -> str:
+    """Canonical lookup key: lowercase alphanumerics, with common aliases resolved"""
+    key = _NON_ALNUM.sub("", str(name).lower())
+    return ALIASES.get(key, key)
+
+
+def optimal_range(name: str) -> Optional[Dict[str, Any]]:
+    return OPTIMAL_RANGES.get(normalize_biomarker(name))
+
+
+def range_deviation(name: str, value: float) -> Optional[float]:
+    """Signed distance outside the optimal range as a fraction of the violated bound
+
+    0.0 inside the range, negative below it, positive above it; None for unknown biomarkers.
+    """
+    bounds = optimal_range(name)
+    if bounds is None:
+        return None
+    if value < bounds["min"]:
+        return (value - bounds["min"]) / bounds["min"] if bounds["min"] else -1.0
+    if value > bounds["max"]:
+        return (value - bounds["max"]) / bounds["max"] if bounds["max"] else 1.0
+    return 0.0
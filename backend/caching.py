@@ -0,0 +1,463 @@
+"""
+In-process caches for the Memory-Enhanced API
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def fingerprint(value: Any) -> str:
+    """Content address of a JSON-compatible value (key order and whitespace do not matter)"""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def json_size(value: Any) -> int:
+    """Approximate the memory held by a cached value by its JSON-encoded size"""
+    return len(json.dumps(value, default=str, separators=(",", ":")))
+
+
+class TTLCache:
+    """LRU cache with per-entry TTL, an entry-count bound and an approximate byte bound
+
+    Entries may belong to a ``group`` (e.g. a user id) so every entry for that group can be
+    invalidated at once. Each invalidation bumps the group's generation; a ``set`` carrying a
+    generation read before the invalidation is dropped, so a lookup that raced a write cannot
+    repopulate the cache with stale data.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, sizeof: Callable[[Any], int] = json_size):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+        self._generations: Dict[Hashable, int] = {}
+        self._generation_counter = 0
+        self._generation_floor = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at, _, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self, group: Hashable) -> int:
+        return self._generations.get(group, self._generation_floor)
+
+    def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None, generation: Optional[int] = None, ttl: Optional[float] = None) -> bool:
+        """Store ``value``; returns False if it was too large or raced an invalidation of its group"""
+        if group is not None and generation is not None and generation != self.generation(group):
+            return False
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl), size, group)
+        self.bytes += size
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, key: Hashable):
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_group(self, group: Hashable):
+        """Drop every entry in ``group`` and fence off in-flight lookups for it"""
+        self._generation_counter += 1
+        self._generations[group] = self._generation_counter
+        if len(self._generations) > self.max_entries:
+            # Forget old fences; raising the floor conservatively fences every older lookup
+            self._generations.clear()
+            self._generation_floor = self._generation_counter
+        for key in list(self._groups.get(group, ())):
+            self.invalidate(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._groups.clear()
+        self.bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, _, size, group = self._entries.pop(key)
+        self.bytes -= size
+        if group is not None:
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+class SingleFlight:
+    """Collapse concurrent identical lookups onto one shared upstream call
+
+    The first caller for a key starts the call as a task; later callers await the same task
+    through ``asyncio.shield``, so a waiter that is cancelled (client disconnect, budget
+    timeout) leaves the shared call and every other waiter untouched.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled_waiters = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        try:
+            return await asyncio.shield(call)
+        except asyncio.CancelledError:
+            self.cancelled_waiters += 1
+            raise
+
+    def _finish(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Mark the exception retrieved even if every waiter has gone away
+            call.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled_waiters": self.cancelled_waiters
+        }
+
+
+class SQLiteCacheTier:
+    """On-disk cache tier backed by a SQLite file; survives restarts
+
+    Values are stored as JSON text with an absolute expiry time. Calls are synchronous and
+    thread-safe; async callers should go through ``TieredCache``, which runs them in a thread.
+    ``stats`` only reads counters, so it never touches the file and is safe on the event loop.
+    The file may be shared by several processes (WAL mode); group generations live in the file
+    too, so an invalidation in one process fences in-flight lookups in every other. Expired rows
+    are deleted when a lookup finds them and every ``purge_every`` writes, which also trims the
+    namespace to ``max_entries`` rows, soonest-expiring first.
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: Optional[int] = None, purge_every: int = 1000):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "namespace TEXT NOT NULL, grp TEXT NOT NULL, generation INTEGER NOT NULL, "
+            "PRIMARY KEY (namespace, grp))"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.fenced = 0
+        self.invalidations = 0
+        self.purged = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Any:
+        return self.lookup(key)[0]
+
+    def lookup(self, key: str) -> Tuple[Any, float]:
+        """``(value, seconds left to live)``, or ``(MISSING, 0.0)``"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            remaining = row[1] - time.time() if row is not None else 0.0
+            if row is not None and remaining <= 0:
+                # Guarded on expiry: another process may have just rewritten the key
+                cursor = self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                    (self.namespace, key, time.time())
+                )
+                self.purged += cursor.rowcount
+        if remaining <= 0:
+            self.misses += 1
+            return MISSING, 0.0
+        self.hits += 1
+        return json.loads(row[0]), remaining
+
+    def set(self, key: str, value: Any, ttl: float, group: Optional[str] = None, generation: Optional[int] = None) -> bool:
+        """Store ``value``; returns False if ``group`` was invalidated since ``generation`` was read"""
+        encoded = json.dumps(value, default=str, separators=(",", ":"))
+        with self._lock:
+            if group is None or generation is None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, encoded, time.time() + ttl)
+                )
+            else:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if self._generation(group) != generation:
+                        self.fenced += 1
+                        return False
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (self.namespace, key, encoded, time.time() + ttl)
+                    )
+                finally:
+                    self._conn.execute("COMMIT")
+            self.writes += 1
+            if self.writes % self.purge_every == 0:
+                self._purge()
+            return True
+
+    def setdefault(self, key: str, value: Any, ttl: float) -> Any:
+        """Store ``value`` unless a live entry exists; returns whichever value is stored"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row is not None and row[1] > time.time():
+                    return json.loads(row[0])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, default=str, separators=(",", ":")), time.time() + ttl)
+                )
+                return value
+            finally:
+                self._conn.execute("COMMIT")
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def generation(self, group: str) -> int:
+        with self._lock:
+            return self._generation(group)
+
+    def _generation(self, group: str) -> int:
+        row = self._conn.execute(
+            "SELECT generation FROM generations WHERE namespace = ? AND grp = ?", (self.namespace, group)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def invalidate_group(self, group: str):
+        """Bump ``group``'s generation and delete its entries (keys starting with ``group_prefix(group)``)"""
+        prefix = group_prefix(group)
+        self.invalidations += 1
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO generations (namespace, grp, generation) VALUES (?, ?, 1) "
+                    "ON CONFLICT (namespace, grp) DO UPDATE SET generation = generation + 1",
+                    (self.namespace, group)
+                )
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key >= ? AND key < ?",
+                    (self.namespace, prefix, prefix + "\U0010ffff")
+                )
+            finally:
+                self._conn.execute("COMMIT")
+
+    def purge_expired(self) -> int:
+        """Delete expired rows, then trim to ``max_entries``; returns the number of expired rows"""
+        with self._lock:
+            return self._purge()
+
+    def _purge(self) -> int:
+        cursor = self._conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, time.time())
+        )
+        purged = cursor.rowcount
+        self.purged += purged
+        if self.max_entries is not None:
+            count = self._conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+            if count > self.max_entries:
+                cursor = self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key IN "
+                    "(SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at LIMIT ?)",
+                    (self.namespace, self.namespace, count - self.max_entries)
+                )
+                self.evicted += cursor.rowcount
+        return purged
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "fenced": self.fenced,
+            "invalidations": self.invalidations,
+            "purged": self.purged,
+            "evicted": self.evicted,
+            "max_entries": self.max_entries
+        }
+
+
+def group_prefix(group: str) -> str:
+    """Key prefix for grouped entries in a ``SQLiteCacheTier``; grouped keys are ``group_key(group, ...)``"""
+    return f"{group}\x1f"
+
+
+def group_key(group: str, *parts: Any) -> str:
+    return group_prefix(group) + "\x1f".join(str(part) for part in parts)
+
+
+class TieredCache:
+    """In-process ``TTLCache`` in front of an optional ``SQLiteCacheTier``
+
+    Second-tier hits are promoted into the first tier for no longer than the second-tier entry
+    has left to live, so promotion never extends an entry's lifetime. Keys must be strings when a second
+    tier is configured, and grouped keys must be built with ``group_key``. ``l2_ttl`` lets the
+    second tier keep entries longer than the first: when the second tier is shared between
+    processes, a short first-tier TTL bounds how long one process can serve an entry that
+    another process has invalidated. Reads and writes are best-effort: a second-tier error
+    (typically a locked shared file) is logged and treated as a miss or a dropped write, so
+    callers never lose a value they already fetched. Invalidations still raise.
+    """
+
+    def __init__(self, l1: TTLCache, l2: Optional[SQLiteCacheTier] = None, l2_ttl: Optional[float] = None):
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_ttl = l1.ttl if l2_ttl is None else l2_ttl
+
+    async def get(self, key: str, group: Optional[str] = None) -> Any:
+        value = self.l1.get(key)
+        if value is not MISSING or self.l2 is None:
+            return value
+        try:
+            value, remaining = await asyncio.to_thread(self.l2.lookup, key)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.l1.name} cache disk read failed: {e}")
+            return MISSING
+        if value is not MISSING:
+            self.l1.set(key, value, group=group, ttl=min(self.l1.ttl, remaining))
+        return value
+
+    async def generation(self, group: str) -> Tuple[int, int]:
+        """Fence token for ``set``: both tiers' generations for ``group``"""
+        l2_generation = 0
+        if self.l2 is not None:
+            try:
+                l2_generation = await asyncio.to_thread(self.l2.generation, group)
+            except sqlite3.Error as e:
+                # -1 never matches a stored generation, so the later disk write is skipped
+                logger.warning(f"{self.l1.name} cache disk read failed: {e}")
+                l2_generation = -1
+        return self.l1.generation(group), l2_generation
+
+    async def set(self, key: str, value: Any, group: Optional[str] = None, generation: Optional[Tuple[int, int]] = None) -> bool:
+        l1_generation, l2_generation = generation if generation is not None else (None, None)
+        if not self.l1.set(key, value, group=group, generation=l1_generation) and generation is not None:
+            return False
+        if self.l2 is None:
+            return True
+        try:
+            return await asyncio.to_thread(self.l2.set, key, value, self.l2_ttl, group, l2_generation)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.l1.name} cache disk write failed: {e}")
+            return False
+
+    async def invalidate(self, key: str):
+        self.l1.invalidate(key)
+        if self.l2 is not None:
+            await asyncio.to_thread(self.l2.delete, key)
+
+    async def invalidate_group(self, group: str):
+        self.l1.invalidate_group(group)
+        if self.l2 is not None:
+            await asyncio.to_thread(self.l2.invalidate_group, group)
+
+    def purge_expired(self) -> int:
+        return self.l2.purge_expired() if self.l2 is not None else 0
+
+    def close(self):
+        if self.l2 is not None:
+            self.l2.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.l1.stats()
+        if self.l2 is not None:
+            stats["disk"] = self.l2.stats()
+        return stats
@@ -0,0 +1,101 @@
+"""
+Conditional GET support for the Memory-Enhanced API
+Session context and health journeys only change through writes this API makes, so each is
+given a version that the write-behind handlers bump once a write has reached the memory
+service. Strong ETags are a hash of that version, the process epoch and the representation's
+parameters, so an unchanged poll is answered with ``304 Not Modified`` before any upstream
+fetch. Versions live in process memory, or in the shared SQLite tier in multi-worker mode.
+Neither sees writes made through another replica or straight to the memory service, so the
+API only enables this on request, and every tag also rolls over after ``max_staleness``.
+"""
+
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from caching import SQLiteCacheTier, group_key
+
+# The shared epoch row outlives any realistic deployment; versions in the file never expire
+EPOCH_TTL = 10 * 365 * 24 * 3600.0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """``If-None-Match`` evaluation (weak comparison, as RFC 9110 requires for this header)"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ContentVersions:
+    """Per-resource versions bumped by this API's own writes
+
+    In process memory, versions come from one monotonic clock and at most ``max_entries``
+    resources are tracked. A resource that is not tracked (never written, or evicted) reports
+    the highest version ever evicted, which is at least what it last had, so eviction can cause
+    an extra 200 but never a stale 304. With ``l2`` the versions and the epoch live in the
+    shared SQLite file instead, so every worker issues and accepts the same ETags. Tags include
+    the current ``max_staleness`` time bucket (0 disables it), which bounds how long a write
+    these versions never saw can stay hidden behind 304s.
+    """
+
+    def __init__(self, l2: Optional[SQLiteCacheTier] = None, max_entries: int = 100000, max_staleness: float = 300.0):
+        self.l2 = l2
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self.epoch = uuid.uuid4().hex if l2 is None else l2.setdefault("epoch", uuid.uuid4().hex, EPOCH_TTL)
+        self._versions: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self.bumps = 0
+        self.not_modified = 0
+
+    async def get(self, kind: str, key: str) -> int:
+        if self.l2 is not None:
+            return await asyncio.to_thread(self.l2.generation, group_key(kind, key))
+        return self._versions.get((kind, key), self._floor)
+
+    async def bump(self, kind: str, key: str):
+        self.bumps += 1
+        if self.l2 is not None:
+            await asyncio.to_thread(self.l2.invalidate_group, group_key(kind, key))
+            return
+        self._clock += 1
+        self._versions[(kind, key)] = self._clock
+        self._versions.move_to_end((kind, key))
+        while len(self._versions) > self.max_entries:
+            _, version = self._versions.popitem(last=False)
+            self._floor = max(self._floor, version)
+
+    def etag(self, kind: str, key: str, version: int, *variant: Any) -> str:
+        """Strong ETag for one representation of a resource at ``version``"""
+        digest = hashlib.blake2b(digest_size=12)
+        bucket = int(time.time() // self.max_staleness) if self.max_staleness > 0 else 0
+        for part in (self.epoch, bucket, kind, key, version, *variant):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x1f")
+        return f'"{digest.hexdigest()}"'
+
+    def close(self):
+        if self.l2 is not None:
+            self.l2.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shared": self.l2 is not None,
+            "max_staleness_seconds": self.max_staleness,
+            "tracked": len(self._versions) if self.l2 is None else None,
+            "bumps": self.bumps,
+            "not_modified": self.not_modified
+        }
@@ -0,0 +1,462 @@
+"""
+Local stand-ins for the memory (8002) and RAG (8001) services
+Implements every endpoint ``MemoryEnhancedAPI`` calls, with configurable latency
+distributions, injected error rates and payload sizes, so the API can be benchmarked and
+load-tested on a laptop. Writes are kept in memory and show up in later reads; users and
+sessions that were never written get deterministic synthetic history of the configured size.
+
+    python backend/fake_services.py --profile laptop
+    python backend/fake_services.py --profile instant --latency query=800:2500 --error-rate search=0.02
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import zlib
+from collections import deque
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from biomarkers import OPTIMAL_RANGES
+
+# z-score of the 99th percentile of a standard normal
+Z_P99 = 2.3263
+
+# Endpoint names used for per-endpoint latency and error settings
+ENDPOINTS = (
+    "sessions",          # POST /sessions
+    "search",            # POST /sessions/{id}/search
+    "messages",          # POST /sessions/{id}/messages
+    "context",           # GET  /sessions/{id}/context
+    "journey_trends",    # GET  /health-journey/{user_id}/trends
+    "journey_write",     # POST /health-journey/{user_id}
+    "journey_batch",     # POST /health-journey/{user_id}/batch
+    "query",             # POST /query
+    "health",            # GET  /health (both services)
+)
+
+
+@dataclass
+class LatencyProfile:
+    """Log-normal latency given by its median and 99th percentile (equal values mean fixed latency)"""
+    median_ms: float = 0.0
+    p99_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    def sample(self, rng: random.Random) -> float:
+        """One latency draw in seconds"""
+        if self.median_ms <= 0:
+            return 0.0
+        if self.p99_ms <= self.median_ms:
+            return self.median_ms / 1000
+        sigma = math.log(self.p99_ms / self.median_ms) / Z_P99
+        return rng.lognormvariate(math.log(self.median_ms), sigma) / 1000
+
+
+PROFILES: Dict[str, Dict[str, LatencyProfile]] = {
+    # No added latency: measures the API's own overhead
+    "instant": {},
+    # Roughly what the services show on a developer machine
+    "laptop": {
+        "sessions": LatencyProfile(8, 40),
+        "search": LatencyProfile(35, 150),
+        "messages": LatencyProfile(10, 50),
+        "context": LatencyProfile(15, 60),
+        "journey_trends": LatencyProfile(25, 120),
+        "journey_write": LatencyProfile(10, 50),
+        "journey_batch": LatencyProfile(15, 70),
+        "query": LatencyProfile(900, 2500),
+        "health": LatencyProfile(1, 5),
+    },
+    # Slow, long-tailed and occasionally failing upstreams
+    "degraded": {
+        "sessions": LatencyProfile(40, 400, error_rate=0.02),
+        "search": LatencyProfile(120, 1500, error_rate=0.05),
+        "messages": LatencyProfile(40, 400, error_rate=0.02),
+        "context": LatencyProfile(60, 800, error_rate=0.02),
+        "journey_trends": LatencyProfile(100, 1200, error_rate=0.05),
+        "journey_write": LatencyProfile(40, 400, error_rate=0.02),
+        "journey_batch": LatencyProfile(60, 600, error_rate=0.02),
+        "query": LatencyProfile(2000, 8000, error_rate=0.03),
+        "health": LatencyProfile(5, 50),
+    },
+}
+
+
+@dataclass
+class FakeServiceConfig:
+    """Latency, error and payload-size settings shared by both fake services"""
+    latency: Dict[str, LatencyProfile] = field(default_factory=dict)
+    seed: int = 0
+    analysis_chars: int = 3000
+    sources: int = 5
+    source_chars: int = 600
+    message_chars: int = 400
+    history_messages: int = 20
+    history_biomarkers: int = 8
+    history_readings: int = 6
+    stream_chunks: int = 20
+    max_session_messages: int = 1000
+
+    def profile(self, endpoint: str) -> LatencyProfile:
+        return self.latency.get(endpoint) or LatencyProfile()
+
+    @classmethod
+    def from_profile(cls, name: str, **overrides: Any) -> "FakeServiceConfig":
+        return cls(latency={endpoint: replace(profile) for endpoint, profile in PROFILES[name].items()}, **overrides)
+
+
+def _stable_seed(*parts: Any) -> int:
+    """Seed that is the same in every process (``hash`` of a str is salted per process)"""
+    return zlib.crc32("\x1f".join(str(part) for part in parts).encode("utf-8"))
+
+
+def _text(rng: random.Random, sentences: List[str], chars: int) -> str:
+    parts: List[str] = []
+    length = 0
+    while length < chars:
+        sentence = rng.choice(sentences)
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:chars]
+
+
+ANALYSIS_SENTENCES = [
+    "Your thyroid markers suggest a lower metabolic rate than optimal.",
+    "I recommend increasing carbohydrate intake from fruit and orange juice.",
+    "Consider reducing polyunsaturated fats, which suppress thyroid function.",
+    "Avoid long fasting periods, since they raise stress hormones.",
+    "Try adding gelatin or collagen to balance the amino acid profile.",
+    "A higher pulse and body temperature would indicate improved metabolism.",
+    "Increase calcium intake with milk or cheese to lower parathyroid hormone.",
+    "Decrease caffeine late in the day if sleep quality is poor.",
+    "Ferritin in this range suggests iron stores are adequate.",
+    "Suggest retesting in eight to twelve weeks to confirm the trend.",
+]
+
+SOURCE_SENTENCES = [
+    "Thyroid hormone is the main regulator of cellular energy production.",
+    "Sugar is a protective factor against the stress response.",
+    "Polyunsaturated oils interfere with respiration and hormone signalling.",
+    "Progesterone and pregnenolone oppose the effects of estrogen.",
+    "Adequate calcium and vitamin D reduce parathyroid hormone.",
+]
+
+MESSAGE_SENTENCES = [
+    "My TSH was a bit high on the last panel.",
+    "I have been eating more fruit and less seed oil.",
+    "Energy in the afternoon is still low.",
+    "Body temperature in the morning is around 97.8F.",
+    "The previous analysis suggested more calcium.",
+]
+
+
+class FakeServices:
+    """State and endpoint handlers behind ``memory_app`` and ``rag_app``"""
+
+    def __init__(self, config: Optional[FakeServiceConfig] = None):
+        self.config = config or FakeServiceConfig()
+        self.rng = random.Random(self.config.seed)
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.messages: Dict[str, Deque[Dict[str, Any]]] = {}
+        self.journeys: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self.requests: Dict[str, int] = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.errors: Dict[str, int] = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.memory_app = self._build_memory_app()
+        self.rag_app = self._build_rag_app()
+
+    async def _simulate(self, endpoint: str, delay: bool = True) -> Optional[JSONResponse]:
+        """Count the call, sleep for a latency draw and return an error response when one is injected"""
+        profile = self.config.profile(endpoint)
+        self.requests[endpoint] += 1
+        if delay:
+            latency = profile.sample(self.rng)
+            if latency:
+                await asyncio.sleep(latency)
+        if profile.error_rate and self.rng.random() < profile.error_rate:
+            self.errors[endpoint] += 1
+            return JSONResponse({"detail": f"injected {endpoint} failure"}, status_code=profile.error_status)
+        return None
+
+    def _session_messages(self, session_id: str) -> Deque[Dict[str, Any]]:
+        messages = self.messages.get(session_id)
+        if messages is None:
+            rng = random.Random(_stable_seed(self.config.seed, "session", session_id))
+            start = datetime(2026, 1, 1)
+            messages = self.messages[session_id] = deque(
+                (
+                    {
+                        "role": "user" if index % 2 == 0 else "assistant",
+                        "content": _text(rng, MESSAGE_SENTENCES if index % 2 == 0 else ANALYSIS_SENTENCES, self.config.message_chars),
+                        "metadata": {"timestamp": (start + timedelta(hours=index)).isoformat(), "synthetic": True}
+                    }
+                    for index in range(self.config.history_messages)
+                ),
+                maxlen=self.config.max_session_messages
+            )
+        return messages
+
+    def _journey(self, user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        journey = self.journeys.get(user_id)
+        if journey is None:
+            rng = random.Random(_stable_seed(self.config.seed, "journey", user_id))
+            names = list(OPTIMAL_RANGES)[:self.config.history_biomarkers]
+            start = datetime(2026, 1, 1)
+            journey = self.journeys[user_id] = {}
+            for name in names:
+                bounds = OPTIMAL_RANGES[name]
+                width = bounds["max"] - bounds["min"] or 1.0
+                value = bounds["min"] + width * rng.uniform(-0.5, 1.5)
+                series = journey[name] = []
+                for reading in range(self.config.history_readings):
+                    value += width * rng.uniform(-0.15, 0.15)
+                    series.append({
+                        "value": round(value, 2),
+                        "interpretation": _text(rng, ANALYSIS_SENTENCES, 160),
+                        "recommendations": _text(rng, ANALYSIS_SENTENCES[1:5], 80),
+                        "timestamp": (start + timedelta(days=30 * reading)).isoformat(),
+                        "metadata": {"session_id": f"synthetic-{reading}", "source": "fake_services"}
+                    })
+        return journey
+
+    def _record_journey(self, user_id: str, entry: Dict[str, Any]):
+        self._journey(user_id).setdefault(entry["biomarker_type"], []).append({
+            "value": entry["biomarker_value"],
+            "interpretation": entry.get("ray_peat_interpretation", ""),
+            "recommendations": entry.get("recommendations", []),
+            "timestamp": (entry.get("metadata") or {}).get("analysis_timestamp") or datetime.now().isoformat(),
+            "metadata": {"session_id": entry.get("session_id"), **(entry.get("metadata") or {})}
+        })
+
+    def _analysis(self, query: str) -> Dict[str, Any]:
+        rng = random.Random(_stable_seed(self.config.seed, "query", query))
+        return {
+            "analysis": _text(rng, ANALYSIS_SENTENCES, self.config.analysis_chars),
+            "sources": [
+                {
+                    "content": _text(rng, SOURCE_SENTENCES, self.config.source_chars),
+                    "metadata": {"title": f"Ray Peat article {index + 1}", "score": round(0.95 - index * 0.03, 2)}
+                }
+                for index in range(self.config.sources)
+            ]
+        }
+
+    def _build_memory_app(self) -> FastAPI:
+        app = FastAPI(title="Fake memory service")
+
+        @app.post("/sessions")
+        async def upsert_session(request: Request):
+            body = await request.json()
+            if (error := await self._simulate("sessions")) is not None:
+                return error
+            self.sessions[body["session_id"]] = body
+            return body
+
+        @app.post("/sessions/{session_id}/search")
+        async def search(session_id: str, request: Request):
+            body = await request.json()
+            if (error := await self._simulate("search")) is not None:
+                return error
+            terms = set(str(body.get("query", "")).lower().split())
+            scored = []
+            for message in self._session_messages(session_id):
+                overlap = len(terms & set(message["content"].lower().split()))
+                scored.append((overlap, message))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            limit = int(body.get("limit", 5))
+            return [
+                {**message, "score": round(min(1.0, 0.6 + 0.05 * overlap), 3)}
+                for overlap, message in scored[:limit]
+            ]
+
+        @app.post("/sessions/{session_id}/messages")
+        async def add_message(session_id: str, request: Request):
+            body = await request.json()
+            if (error := await self._simulate("messages")) is not None:
+                return error
+            self._session_messages(session_id).append(body)
+            return {"status": "stored", "session_id": session_id}
+
+        @app.get("/sessions/{session_id}/context")
+        async def context(session_id: str, limit: int = 10):
+            if (error := await self._simulate("context")) is not None:
+                return error
+            messages = self._session_messages(session_id)
+            return list(messages)[-limit:] if limit > 0 else []
+
+        @app.get("/health-journey/{user_id}/trends")
+        async def trends(user_id: str, days: int = 30):
+            if (error := await self._simulate("journey_trends")) is not None:
+                return error
+            return {"user_id": user_id, "days": days, "trends": self._journey(user_id)}
+
+        @app.post("/health-journey/{user_id}")
+        async def write_journey(user_id: str, request: Request):
+            body = await request.json()
+            if (error := await self._simulate("journey_write")) is not None:
+                return error
+            self._record_journey(user_id, body)
+            return {"status": "stored"}
+
+        @app.post("/health-journey/{user_id}/batch")
+        async def write_journey_batch(user_id: str, request: Request):
+            batch = await request.json()
+            if (error := await self._simulate("journey_batch")) is not None:
+                return error
+            for entry in batch.get("entries", []):
+                analysis = batch["analyses"][entry["analysis"]]
+                self._record_journey(user_id, {**analysis, **entry})
+            return {"status": "stored", "entries": len(batch.get("entries", []))}
+
+        @app.get("/health")
+        async def health():
+            if (error := await self._simulate("health")) is not None:
+                return error
+            return {"status": "healthy", "service": "fake-memory", "sessions": len(self.messages), "users": len(self.journeys)}
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats()
+
+        return app
+
+    def _build_rag_app(self) -> FastAPI:
+        app = FastAPI(title="Fake RAG service")
+
+        @app.post("/query")
+        async def query(request: Request):
+            body = await request.json()
+            if not body.get("stream"):
+                if (error := await self._simulate("query")) is not None:
+                    return error
+                return self._analysis(body.get("query", ""))
+
+            # Streaming: the latency draw is spread across the chunks, so time to first chunk is short
+            if (error := await self._simulate("query", delay=False)) is not None:
+                return error
+            response = self._analysis(body.get("query", ""))
+            total = self.config.profile("query").sample(self.rng)
+            return StreamingResponse(self._stream(response, total), media_type="text/event-stream")
+
+        @app.get("/health")
+        async def health():
+            if (error := await self._simulate("health")) is not None:
+                return error
+            return {"status": "healthy", "service": "fake-rag"}
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats()
+
+        return app
+
+    async def _stream(self, response: Dict[str, Any], total: float):
+        text = response["analysis"]
+        chunks = max(1, self.config.stream_chunks)
+        size = math.ceil(len(text) / chunks) or 1
+        pause = total / chunks
+        for start in range(0, len(text), size):
+            if pause:
+                await asyncio.sleep(pause)
+            yield "data: " + json.dumps({"delta": text[start:start + size]}) + "\n\n"
+        yield "data: " + json.dumps({"sources": response["sources"]}) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "errors": dict(self.errors),
+            "sessions": len(self.messages),
+            "users": len(self.journeys)
+        }
+
+
+def _parse_overrides(values: List[str], option: str) -> Dict[str, str]:
+    overrides = {}
+    for value in values:
+        endpoint, _, setting = value.partition("=")
+        endpoint = endpoint.strip()
+        if endpoint != "all" and endpoint not in ENDPOINTS:
+            raise SystemExit(f"{option}: unknown endpoint '{endpoint}' (expected one of: all, {', '.join(ENDPOINTS)})")
+        overrides[endpoint] = setting
+    return overrides
+
+
+def build_config(args: argparse.Namespace) -> FakeServiceConfig:
+    config = FakeServiceConfig.from_profile(
+        args.profile,
+        seed=args.seed,
+        analysis_chars=args.analysis_chars,
+        sources=args.sources,
+        source_chars=args.source_chars,
+        message_chars=args.message_chars,
+        history_messages=args.history_messages,
+        history_biomarkers=args.history_biomarkers,
+        history_readings=args.history_readings,
+        stream_chunks=args.stream_chunks
+    )
+    for endpoint, setting in _parse_overrides(args.latency, "--latency").items():
+        median, _, p99 = setting.partition(":")
+        for name in ENDPOINTS if endpoint == "all" else (endpoint,):
+            profile = config.latency.setdefault(name, LatencyProfile())
+            profile.median_ms = float(median)
+            profile.p99_ms = float(p99) if p99 else float(median)
+    for endpoint, setting in _parse_overrides(args.error_rate, "--error-rate").items():
+        rate, _, status = setting.partition(":")
+        for name in ENDPOINTS if endpoint == "all" else (endpoint,):
+            profile = config.latency.setdefault(name, LatencyProfile())
+            profile.error_rate = float(rate)
+            if status:
+                profile.error_status = int(status)
+    return config
+
+
+async def serve(services: FakeServices, host: str, memory_port: int, rag_port: int, log_level: str = "warning"):
+    """Run both fake services until cancelled"""
+    servers = [
+        uvicorn.Server(uvicorn.Config(services.memory_app, host=host, port=memory_port, log_level=log_level)),
+        uvicorn.Server(uvicorn.Config(services.rag_app, host=host, port=rag_port, log_level=log_level))
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--memory-port", type=int, default=8002)
+    parser.add_argument("--rag-port", type=int, default=8001)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="laptop")
+    parser.add_argument("--latency", action="append", default=[], metavar="ENDPOINT=MEDIAN_MS[:P99_MS]",
+                        help="Override an endpoint's latency ('all' for every endpoint); repeatable")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="ENDPOINT=RATE[:STATUS]",
+                        help="Fraction of calls answered with STATUS (default 503); repeatable")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--analysis-chars", type=int, default=3000)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--source-chars", type=int, default=600)
+    parser.add_argument("--message-chars", type=int, default=400)
+    parser.add_argument("--history-messages", type=int, default=20)
+    parser.add_argument("--history-biomarkers", type=int, default=8)
+    parser.add_argument("--history-readings", type=int, default=6)
+    parser.add_argument("--stream-chunks", type=int, default=20)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    services = FakeServices(build_config(args))
+    print(f"Fake memory service on http://{args.host}:{args.memory_port}, fake RAG service on http://{args.host}:{args.rag_port} (profile: {args.profile})")
+    try:
+        asyncio.run(serve(services, args.host, args.memory_port, args.rag_port, args.log_level))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Incremental NDJSON conversion of health-journey bodies for the Memory-Enhanced API
+The memory service answers ``/health-journey/{user_id}/trends`` with one JSON object whose
+``trends`` member maps each biomarker to its series. ``TrendsNDJSONScanner`` walks that body
+chunk by chunk, tracking only nesting depth and string state, and re-emits every series as
+it arrives as one ``{"biomarker": ..., "series": ...}`` line. Neither the document nor a
+single series is ever held in memory, so memory use does not grow with history length.
+"""
+
+import re
+from typing import List, Optional
+
+# Structural bytes outside strings
+_STRUCTURAL = re.compile(rb'["{}\[\],:]')
+# Inside a series only nesting matters: skip everything up to the next bracket or unterminated string.
+# Unrolled so each byte matches one way only, which keeps backtracking linear without possessive quantifiers
+_SERIES_RUN = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
+_STRING_END = re.compile(rb'["\\]')
+# Raw tabs and line breaks are only legal between tokens, so dropping them keeps each series on one line
+_LINE_BREAKS = b"\t\r\n"
+
+
+class TrendsNDJSONScanner:
+    """Push parser turning ``{..., "trends": {name: series, ...}, ...}`` into NDJSON lines
+
+    ``feed`` takes the next chunk of the upstream body and returns the bytes ready to send
+    (possibly empty); ``close`` checks that the document ended cleanly. Members other than
+    ``trends`` are skipped. Line breaks between tokens are dropped, so pretty-printed upstream
+    bodies still produce one line per biomarker.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.in_trends = False
+        self.emitting = False
+        self.expect_key = False
+        self.capturing: Optional[bytearray] = None
+        self.top_key = b""
+        self.key = b""
+        self.lines = 0
+
+    def feed(self, chunk: bytes) -> bytes:
+        out: List[bytes] = []
+        position = 0
+        length = len(chunk)
+        while position < length:
+            if self.in_string:
+                position = self._scan_string(chunk, position, out)
+                continue
+            if self.emitting and self.depth > 2:
+                end = _SERIES_RUN.match(chunk, position).end()
+                found = end < length
+            else:
+                match = _STRUCTURAL.search(chunk, position)
+                found = match is not None
+                end = match.start() if found else length
+            if self.emitting and end > position:
+                out.append(chunk[position:end].translate(None, _LINE_BREAKS))
+            if not found:
+                break
+            self._structural(chunk[end:end + 1], out)
+            position = end + 1
+        return b"".join(out)
+
+    def close(self):
+        if self.depth != 0 or self.in_string:
+            raise ValueError("health journey body ended before the JSON document was complete")
+
+    def _scan_string(self, chunk: bytes, position: int, out: List[bytes]) -> int:
+        start = position
+        if self.escaped:
+            # The escape started at the end of the previous chunk
+            self.escaped = False
+            position += 1
+        while True:
+            match = _STRING_END.search(chunk, position)
+            if match is None:
+                self._string_bytes(chunk[start:], out)
+                return len(chunk)
+            if match.group() == b"\\":
+                if match.end() == len(chunk):
+                    self.escaped = True
+                    self._string_bytes(chunk[start:], out)
+                    return len(chunk)
+                position = match.end() + 1
+                continue
+            self.in_string = False
+            self._string_bytes(chunk[start:match.start()], out)
+            if self.capturing is not None:
+                self._finish_key()
+            elif self.emitting:
+                out.append(b'"')
+            return match.end()
+
+    def _string_bytes(self, data: bytes, out: List[bytes]):
+        if self.capturing is not None:
+            self.capturing += data
+        elif self.emitting:
+            out.append(data)
+
+    def _finish_key(self):
+        key = bytes(self.capturing)
+        self.capturing = None
+        if self.depth == 1:
+            self.top_key = key
+        else:
+            self.key = key
+
+    def _structural(self, char: bytes, out: List[bytes]):
+        if char == b'"':
+            self.in_string = True
+            if self.expect_key:
+                self.capturing = bytearray()
+            elif self.emitting:
+                out.append(char)
+        elif char in (b"{", b"["):
+            self.depth += 1
+            if self.emitting:
+                out.append(char)
+            elif self.depth == 1:
+                self.expect_key = char == b"{"
+            elif self.depth == 2 and self.top_key == b"trends" and char == b"{":
+                self.in_trends = True
+                self.expect_key = True
+        elif char in (b"}", b"]"):
+            if self.in_trends and self.depth == 2:
+                self._end_line(out)
+                self.in_trends = False
+            elif self.emitting:
+                out.append(char)
+            self.depth -= 1
+        elif char == b":":
+            self.expect_key = False
+            if self.in_trends and self.depth == 2:
+                self.emitting = True
+                out.append(b'{"biomarker":"' + self.key + b'","series":')
+            elif self.emitting:
+                out.append(char)
+        elif char == b",":
+            if self.in_trends and self.depth == 2:
+                self._end_line(out)
+                self.expect_key = True
+            elif self.depth == 1:
+                self.expect_key = True
+            elif self.emitting:
+                out.append(char)
+
+    def _end_line(self, out: List[bytes]):
+        if self.emitting:
+            out.append(b"}\n")
+            self.emitting = False
+            self.lines += 1
@@ -0,0 +1,165 @@
+"""
+Batched health-journey writes for the Memory-Enhanced API
+Builds one bulk payload per lab panel and coalesces concurrent writes for the same user
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# Batch payload sent to ``POST /health-journey/{user_id}/batch``:
+#   {"analyses": [{"session_id", "ray_peat_interpretation", "recommendations", "metadata"}],
+#    "entries":  [{"analysis": <index into analyses>, "biomarker_type", "biomarker_value"}]}
+# The interpretation and recommendations are stored once per analysis instead of once per biomarker.
+
+
+def build_journey_analysis(session_id: str, interpretation: str, recommendations: List[str], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Shared part of a panel's journey writes"""
+    return {
+        "session_id": session_id,
+        "ray_peat_interpretation": interpretation,
+        "recommendations": recommendations,
+        "metadata": metadata
+    }
+
+
+def build_journey_entries(lab_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One entry per numeric biomarker in the panel"""
+    return [
+        {"biomarker_type": biomarker, "biomarker_value": float(value)}
+        for biomarker, value in lab_data.items()
+        if isinstance(value, (int, float))
+    ]
+
+
+def build_journey_batch(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge ``{"analysis", "entries"}`` parts into one batch payload, deduplicating identical analyses"""
+    analyses: List[Dict[str, Any]] = []
+    index_by_key: Dict[str, int] = {}
+    entries: List[Dict[str, Any]] = []
+    for part in parts:
+        key = json.dumps(part["analysis"], sort_keys=True, default=str)
+        index = index_by_key.get(key)
+        if index is None:
+            index = index_by_key[key] = len(analyses)
+            analyses.append(part["analysis"])
+        for entry in part["entries"]:
+            entries.append({"analysis": index, **entry})
+    return {"analyses": analyses, "entries": entries}
+
+
+def expand_journey_batch(batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a batch payload into legacy single-biomarker ``POST /health-journey/{user_id}`` bodies"""
+    payloads = []
+    for entry in batch["entries"]:
+        analysis = batch["analyses"][entry["analysis"]]
+        payloads.append({
+            "session_id": analysis["session_id"],
+            "biomarker_type": entry["biomarker_type"],
+            "biomarker_value": entry["biomarker_value"],
+            "ray_peat_interpretation": analysis["ray_peat_interpretation"],
+            "recommendations": analysis["recommendations"],
+            "metadata": analysis["metadata"]
+        })
+    return payloads
+
+
+class JourneyWriteCoalescer:
+    """Merge journey writes for the same user that arrive within a short window into one batch
+
+    Callers await ``submit`` until the batch containing their entries has been sent, so failures
+    still surface in the caller's task. A submission whose caller is cancelled before its batch
+    goes out is dropped; once a batch is sent, each part's ``on_sent`` runs even if its caller has
+    gone away, so the sender can record the write. ``send(user_id, batch, entry_sent)`` calls
+    ``entry_sent(index)`` for each batch entry it writes on its own (the per-biomarker fallback), which
+    runs the owning part's ``on_entry_sent`` with the entry's index in that part, so a failed batch
+    retried later can skip what already went out. A window of 0 sends every submission immediately.
+    """
+
+    def __init__(self, send: Callable[[str, Dict[str, Any], Callable[[int], None]], Awaitable[None]], window: float = 0.025, max_entries: int = 500):
+        self._send = send
+        self.window = window
+        self.max_entries = max_entries
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        self.submissions = 0
+        self.batches_sent = 0
+        self.entries_sent = 0
+
+    async def submit(self, user_id: str, analysis: Dict[str, Any], entries: List[Dict[str, Any]], on_sent: Optional[Callable[[], None]] = None, on_entry_sent: Optional[Callable[[int], None]] = None):
+        """Queue one panel's writes for ``user_id`` and wait for its batch to be sent"""
+        if not entries:
+            return
+        self.submissions += 1
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._pending.setdefault(user_id, []).append({"analysis": analysis, "entries": entries, "on_sent": on_sent, "on_entry_sent": on_entry_sent})
+        self._waiters.setdefault(user_id, []).append(waiter)
+
+        pending_entries = sum(len(part["entries"]) for part in self._pending[user_id])
+        if self.window <= 0 or pending_entries >= self.max_entries:
+            self._schedule_flush(user_id)
+        elif user_id not in self._timers:
+            self._timers[user_id] = loop.call_later(self.window, self._schedule_flush, user_id)
+        await waiter
+
+    def _schedule_flush(self, user_id: str):
+        timer = self._timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        parts = self._pending.pop(user_id, [])
+        waiters = self._waiters.pop(user_id, [])
+        if parts:
+            task = asyncio.ensure_future(self._flush(user_id, parts, waiters))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, user_id: str, parts: List[Dict[str, Any]], waiters: List[asyncio.Future]):
+        live = [(part, waiter) for part, waiter in zip(parts, waiters) if not waiter.done()]
+        if not live:
+            return
+        parts = [part for part, _ in live]
+        waiters = [waiter for _, waiter in live]
+        batch = build_journey_batch(parts)
+        owners = [(part, index) for part in parts for index in range(len(part["entries"]))]
+
+        def entry_sent(index: int):
+            part, part_index = owners[index]
+            if part["on_entry_sent"] is not None:
+                part["on_entry_sent"](part_index)
+
+        error: Optional[BaseException] = None
+        try:
+            await self._send(user_id, batch, entry_sent)
+            self.batches_sent += 1
+            self.entries_sent += len(batch["entries"])
+            for part in parts:
+                if part["on_sent"] is not None:
+                    part["on_sent"]()
+        except Exception as e:
+            error = e
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+    async def flush_all(self):
+        """Send everything still pending and wait for every batch under way (used on shutdown)"""
+        for user_id in list(self._pending):
+            self._schedule_flush(user_id)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000,
+            "submissions": self.submissions,
+            "batches_sent": self.batches_sent,
+            "entries_sent": self.entries_sent,
+            "pending_users": len(self._pending)
+        }
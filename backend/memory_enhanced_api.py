@@ -7,18 +7,65 @@ Phase 2C: Memory + Context Integration with Ray Peat Knowledge
 import asyncio
 import json
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-import httpx
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel
+import math
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import date, datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Any, Set, Tuple
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 import uvicorn
 import uuid
 
+from admission import AdmissionLimiter, AdmissionMiddleware
+from caching import MISSING, SingleFlight, SQLiteCacheTier, TieredCache, TTLCache, fingerprint, group_key, json_size
+from conditional import ContentVersions, etag_matches
+from memory_index import MemoryIndex
+from journey_stream import TrendsNDJSONScanner
+from journey_writes import (
+    JourneyWriteCoalescer,
+    build_journey_analysis,
+    build_journey_entries,
+    expand_journey_batch,
+)
+from metrics import ApiMetrics
+from probing import UpstreamProber
+from prompt_builder import PromptBuild, PromptBuilder
+from recommendations import RecommendationExtractor
+from resilience import CircuitOpenError
+from serialization import FastJSONResponse, dumps, model_payload
+from settings import env_bool, env_float, env_int, env_str
+from tracing import Tracer, current_trace, record_cache
+from trends import TrendEngine
+from upstreams import UpstreamClient, UpstreamConfig, call_budget
+from write_behind import WriteBehindFullError, WriteBehindQueue, WriteProgress
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Context fan-out branch -> latency histogram stage
+CONTEXT_STAGES = {
+    "session": "session_ensure",
+    "health_journey": "journey_fetch",
+    "memory": "memory_search"
+}
+
+# Admission lane -> default (concurrency, queue length, max queue wait in seconds); each is
+# overridable as ADMISSION_<LANE>_CONCURRENCY / _QUEUE / _MAX_WAIT_SECONDS
+ADMISSION_LANES = {
+    "analysis": (32, 64, 10.0),
+    "batch": (4, 8, 10.0),
+    "health_journey": (32, 64, 5.0),
+    "sessions": (32, 64, 5.0),
+    # Cheap endpoints: never queued behind analyses
+    "priority": (128, 256, 2.0)
+}
+
+PRIORITY_PATHS = frozenset({"/health", "/health/live", "/health/ready", "/metrics", "/stats"})
+
 class LabAnalysisRequest(BaseModel):
     user_id: str
     session_id: Optional[str] = None
@@ -34,144 +81,751 @@ class MemoryEnhancedResponse(BaseModel):
     session_id: str
     recommendations: List[str]
     health_trends: Optional[Dict[str, Any]] = None
+    trend_summary: Optional[Dict[str, Any]] = None
 
 class MemoryEnhancedAPI:
     def __init__(self):
-        self.app = FastAPI(title="LabInsight AI - Memory Enhanced", version="2.0.0")
-        self.memory_url = "http://localhost:8002"
-        self.rag_url = "http://localhost:8001"
+        self.metrics = ApiMetrics()
+        self.memory = UpstreamClient(UpstreamConfig.from_env("memory", "http://localhost:8002"), self.metrics)
+        self.rag = UpstreamClient(UpstreamConfig.from_env("rag", "http://localhost:8001", timeout=30.0), self.metrics)
+        
+        # Overall context fan-out deadline and per-branch latency budgets (seconds)
+        self.context_deadline = env_float("CONTEXT_DEADLINE_SECONDS", 2.0)
+        self.context_budgets = {
+            "session": env_float("CONTEXT_SESSION_BUDGET_SECONDS", 1.0),
+            "health_journey": env_float("CONTEXT_JOURNEY_BUDGET_SECONDS", 1.5),
+            "memory": env_float("CONTEXT_MEMORY_BUDGET_SECONDS", 1.5)
+        }
+        
+        # Journey writes go out as one batch per panel; concurrent writes per user are coalesced
+        self.journey_batch_supported = True
+        self.journey_writer = JourneyWriteCoalescer(
+            self._send_journey_batch,
+            window=env_float("JOURNEY_COALESCE_WINDOW_MS", 25.0) / 1000,
+            max_entries=env_int("JOURNEY_BATCH_MAX_ENTRIES", 500)
+        )
+        
+        # Multi-worker mode: caches share a SQLite tier; L1 entries live briefly to bound cross-worker staleness
+        self.workers = env_int("API_WORKERS", 1)
+        self.shared_cache_path = env_str(
+            "SHARED_CACHE_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "shared_cache.sqlite3") if self.workers > 1 else ""
+        )
+        self.shared_l1_ttl = env_float("SHARED_CACHE_L1_TTL_SECONDS", 5.0)
+        
+        # Memory and journey writes are spooled to disk and flushed by a background task
+        self.write_behind = WriteBehindQueue(
+            env_str("WRITE_BEHIND_SPOOL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool", "memory_writes.jsonl")),
+            handlers={
+                "interaction": self._store_interaction_memory,
+                "health_journey": self._update_health_journey
+            },
+            batch_size=env_int("WRITE_BEHIND_BATCH_SIZE", 32),
+            max_concurrency=env_int("WRITE_BEHIND_CONCURRENCY", 8),
+            max_pending=env_int("WRITE_BEHIND_MAX_PENDING", 10000),
+            backpressure_timeout=env_float("WRITE_BEHIND_BACKPRESSURE_SECONDS", 2.0),
+            max_attempts=env_int("WRITE_BEHIND_MAX_ATTEMPTS", 5),
+            fsync=env_bool("WRITE_BEHIND_FSYNC", False),
+            observe_write=lambda kind, seconds: self.metrics.observe_stage("background_persistence", seconds),
+            observe_flush=self.metrics.write_behind_flush.observe
+        )
+        
+        # Per-user health journey context, invalidated by journey writes (in every worker when shared)
+        self.journey_cache = self._tiered_cache(
+            "health_journey",
+            ttl=env_float("JOURNEY_CACHE_TTL_SECONDS", 300.0),
+            max_entries=env_int("JOURNEY_CACHE_MAX_ENTRIES", 10000),
+            max_bytes=env_int("JOURNEY_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+        )
+        
+        # Exact-match RAG responses keyed on a fingerprint of the full query payload
+        self.rag_cache = self._tiered_cache(
+            "rag",
+            ttl=env_float("RAG_CACHE_TTL_SECONDS", 3600.0),
+            max_entries=env_int("RAG_CACHE_MAX_ENTRIES", 2048),
+            max_bytes=env_int("RAG_CACHE_MAX_BYTES", 128 * 1024 * 1024),
+            path=env_str("RAG_CACHE_PATH", "")
+        )
+        
+        # Prompts are fitted to a token budget, most informative context first
+        self.trend_engine = TrendEngine(ewma_alpha=env_float("TREND_EWMA_ALPHA", 0.5))
+        self.prompt_builder = PromptBuilder(token_budget=env_int("PROMPT_TOKEN_BUDGET", 2000), trend_engine=self.trend_engine)
+        
+        # Recommendations are ranked once per distinct analysis text and cached
+        self.recommendation_extractor = RecommendationExtractor(limit=env_int("RECOMMENDATIONS_LIMIT", 5))
+        
+        # (user_id, session_id) pairs confirmed upstream; analyses for them skip the session upsert
+        self.known_sessions = self._tiered_cache(
+            "sessions",
+            ttl=env_float("SESSION_CACHE_TTL_SECONDS", 3600.0),
+            max_entries=env_int("SESSION_CACHE_MAX_ENTRIES", 100000),
+            sizeof=lambda _: 0
+        )
+        
+        # ETags on session context and health journey polls. Versions only see writes made through this
+        # instance (and workers sharing SHARED_CACHE_PATH), so they are opt-in for single-instance
+        # deployments; behind a load balancer with several replicas, leave them off
+        self.conditional_get = env_bool("CONDITIONAL_GET_ENABLED", False)
+        self.content_versions = ContentVersions(
+            SQLiteCacheTier(self.shared_cache_path, "content_versions") if self.shared_cache_path and self.conditional_get else None,
+            max_entries=env_int("CONTENT_VERSION_MAX_ENTRIES", 100000),
+            max_staleness=env_float("CONDITIONAL_GET_MAX_STALENESS_SECONDS", 300.0)
+        )
+        
+        # Per-session BM25 over the messages this process writes; cold sessions hydrate in the background.
+        # Opt-in: writes through other workers or replicas never reach this index, so it suits a single
+        # instance, and even then each session is reconciled with the memory service every refresh period
+        self.memory_index = MemoryIndex(
+            max_sessions=env_int("MEMORY_INDEX_MAX_SESSIONS", 10000),
+            max_documents=env_int("MEMORY_INDEX_MAX_DOCUMENTS", 200),
+            refresh_after=env_float("MEMORY_INDEX_REFRESH_SECONDS", 300.0)
+        ) if env_bool("MEMORY_INDEX_ENABLED", False) else None
+        self.hydration_tasks: Set[asyncio.Task] = set()
+        
+        # Concurrent identical lookups share one upstream call
+        self.session_flights = SingleFlight("sessions")
+        self.journey_flights = SingleFlight("health_journey")
+        self.rag_flights = SingleFlight("rag")
+        
+        # Opt-in: build responses without re-validation and encode them with orjson when available
+        self.fast_serialization = env_bool("FAST_SERIALIZATION", False)
+        
+        # Batch analysis limits
+        self.batch_max_items = env_int("BATCH_MAX_ITEMS", 100)
+        self.batch_concurrency = env_int("BATCH_CONCURRENCY", 8)
+        
+        # Per-request traces: Server-Timing on every analysis, sampled JSON records on disk
+        self.tracer = Tracer(
+            env_str("TRACE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces", "analysis_traces.jsonl")),
+            sample_rate=env_float("TRACE_SAMPLE_RATE", 0.01),
+            slow_threshold=env_float("TRACE_SLOW_THRESHOLD_MS", 0.0) / 1000,
+            max_bytes=env_int("TRACE_MAX_BYTES", 10 * 1024 * 1024),
+            backup_count=env_int("TRACE_BACKUP_COUNT", 5),
+            # Callers sending this value as X-Trace get their trace written; unset disables forcing
+            force_token=env_str("TRACE_FORCE_TOKEN", "")
+        )
+        
+        # Upstream status for /health is refreshed in the background, never on the probe path
+        self.started = False
+        self.prober = UpstreamProber(
+            {"memory": self._check_memory_service, "rag": self._check_rag_service},
+            interval=env_float("HEALTH_PROBE_INTERVAL_SECONDS", 5.0),
+            jitter=env_float("HEALTH_PROBE_JITTER", 0.2)
+        )
+        
+        # Per-lane concurrency limits with bounded, deadline-aware wait queues (503 + Retry-After when shed)
+        self.admission_enabled = env_bool("ADMISSION_ENABLED", True)
+        self.admission = {
+            lane: AdmissionLimiter(
+                lane,
+                concurrency=env_int(f"ADMISSION_{lane.upper()}_CONCURRENCY", concurrency),
+                max_queue=env_int(f"ADMISSION_{lane.upper()}_QUEUE", queue),
+                max_wait=env_float(f"ADMISSION_{lane.upper()}_MAX_WAIT_SECONDS", max_wait),
+                observe_wait=self.metrics.admission_wait.observe,
+                on_reject=self.metrics.admission_rejections.inc
+            )
+            for lane, (concurrency, queue, max_wait) in ADMISSION_LANES.items()
+        }
+        
+        self.app = FastAPI(title="LabInsight AI - Memory Enhanced", version="2.0.0", lifespan=self._lifespan)
+        if self.admission_enabled:
+            self.app.add_middleware(AdmissionMiddleware, classify=self._admission_lane, limiters=self.admission)
+        self._register_gauges()
         self._setup_routes()
     
+    def _tiered_cache(self, name: str, ttl: float, max_entries: int, max_bytes: int = 64 * 1024 * 1024, path: str = "", sizeof: Callable[[Any], int] = json_size) -> TieredCache:
+        """L1 ``TTLCache`` plus a SQLite tier at ``path``, or in the shared cache file when one is configured
+        
+        The SQLite tier holds up to ``<NAME>_CACHE_DISK_MAX_ENTRIES`` rows (default: ``max_entries``
+        per worker sharing it) and is purged every ``CACHE_DISK_PURGE_EVERY`` writes.
+        """
+        path = path or self.shared_cache_path
+        shared = path == self.shared_cache_path and bool(path)
+        l1_ttl = min(ttl, self.shared_l1_ttl) if shared else ttl
+        disk_max_entries = env_int(f"{name.upper()}_CACHE_DISK_MAX_ENTRIES", max_entries * (self.workers if shared else 1))
+        return TieredCache(
+            TTLCache(name, ttl=l1_ttl, max_entries=max_entries, max_bytes=max_bytes, sizeof=sizeof),
+            SQLiteCacheTier(path, name, max_entries=disk_max_entries, purge_every=env_int("CACHE_DISK_PURGE_EVERY", 1000)) if path else None,
+            l2_ttl=ttl
+        )
+    
+    @staticmethod
+    def _admission_lane(method: str, path: str) -> Optional[str]:
+        """Admission lane for a request; ``None`` for routes that are not limited"""
+        if path in PRIORITY_PATHS or (method == "GET" and path.startswith("/sessions/") and path.endswith("/context")):
+            return "priority"
+        if path == "/analyze-with-memory/batch":
+            return "batch"
+        if path.startswith("/analyze-with-memory"):
+            return "analysis"
+        if path.startswith("/health-journey/"):
+            return "health_journey"
+        if path == "/sessions":
+            return "sessions"
+        return None
+    
+    def _register_gauges(self):
+        """Scrape-time gauges over queue, cache and upstream state"""
+        registry = self.metrics.registry
+        breaker_states = {"closed": 0, "half_open": 1, "open": 2}
+        upstreams = (self.memory, self.rag)
+        registry.gauge_callback(
+            "memory_api_write_behind_depth", "Writes spooled but not yet acknowledged", (),
+            lambda: {(): self.write_behind.depth}
+        )
+        registry.gauge_callback(
+            "memory_api_upstream_in_flight", "Requests currently in flight per upstream", ("upstream",),
+            lambda: {(upstream.name,): upstream.in_flight for upstream in upstreams}
+        )
+        registry.gauge_callback(
+            "memory_api_circuit_breaker_state", "Circuit breaker state (0=closed, 1=half_open, 2=open)", ("upstream",),
+            lambda: {(upstream.name,): breaker_states[upstream.breaker.state] for upstream in upstreams}
+        )
+        registry.gauge_callback(
+            "memory_api_upstream_timeout_seconds", "Current adaptive timeout per upstream endpoint class", ("upstream", "endpoint"),
+            lambda: {(upstream.name, endpoint): timeout.current() for upstream in upstreams for endpoint, timeout in upstream.timeouts.items()}
+        )
+        registry.gauge_callback(
+            "memory_api_cache_hit_ratio", "Hit ratio of the in-process caches", ("cache",),
+            lambda: {(name,): cache.l1.stats()["hit_ratio"] for name, cache in self._tiered_caches().items()}
+        )
+        registry.gauge_callback(
+            "memory_api_cache_bytes", "Approximate bytes held by the in-process caches", ("cache",),
+            lambda: {(name,): cache.l1.bytes for name, cache in self._tiered_caches().items()}
+        )
+        registry.gauge_callback(
+            "memory_api_admission_in_flight", "Requests admitted and running per admission lane", ("lane",),
+            lambda: {(lane,): limiter.in_flight for lane, limiter in self.admission.items()}
+        )
+        registry.gauge_callback(
+            "memory_api_admission_queued", "Requests waiting for a slot per admission lane", ("lane",),
+            lambda: {(lane,): limiter.depth for lane, limiter in self.admission.items()}
+        )
+    
+    @property
+    def memory_url(self) -> str:
+        return self.memory.base_url
+    
+    @property
+    def rag_url(self) -> str:
+        return self.rag.base_url
+    
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        """Open shared upstream pools on startup and close them on shutdown"""
+        await self.memory.start()
+        await self.rag.start()
+        await self.write_behind.start()
+        for cache in self._tiered_caches().values():
+            await asyncio.to_thread(cache.purge_expired)
+        self.prober.start()
+        self.started = True
+        try:
+            yield
+        finally:
+            self.started = False
+            await self.prober.stop()
+            for task in list(self.hydration_tasks):
+                task.cancel()
+            # Coalesced journey writes are sent inside the drain, while their records can still be acked
+            await self.write_behind.stop(flush=self.journey_writer.flush_all)
+            await self.memory.close()
+            await self.rag.close()
+            for cache in self._tiered_caches().values():
+                cache.close()
+            self.content_versions.close()
+            self.tracer.close()
+    
+    def _tiered_caches(self) -> Dict[str, TieredCache]:
+        return {"health_journey": self.journey_cache, "rag": self.rag_cache, "sessions": self.known_sessions}
+    
+    def upstream_stats(self) -> Dict[str, Any]:
+        """Per-upstream connection pool metrics"""
+        return {
+            "memory": self.memory.stats(),
+            "rag": self.rag.stats()
+        }
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Size and hit-ratio metrics for the in-process caches"""
+        return {
+            "health_journey": self.journey_cache.stats(),
+            "rag": self.rag_cache.stats(),
+            "recommendations": self.recommendation_extractor.stats(),
+            "sessions": self.known_sessions.stats(),
+            "memory_index": self.memory_index.stats() if self.memory_index is not None else None,
+            "single_flight": {
+                "sessions": self.session_flights.stats(),
+                "health_journey": self.journey_flights.stats(),
+                "rag": self.rag_flights.stats()
+            }
+        }
+    
     def _setup_routes(self):
         """Setup FastAPI routes"""
         
         @self.app.post("/analyze-with-memory", response_model=MemoryEnhancedResponse)
-        async def analyze_with_memory(request: LabAnalysisRequest, background_tasks: BackgroundTasks):
-            return await self.create_contextual_analysis(request, background_tasks)
+        async def analyze_with_memory(request: LabAnalysisRequest, response: Response, x_request_id: Optional[str] = Header(None), x_trace: Optional[str] = Header(None)):
+            trace = None
+            try:
+                with self.tracer.trace("/analyze-with-memory", x_request_id, force=self.tracer.forced(x_trace)) as trace:
+                    result = await self.create_contextual_analysis(request)
+            except HTTPException as e:
+                # Failures carry the timing too; they are the responses most worth triaging
+                if trace is not None:
+                    e.headers = {**(e.headers or {}), "Server-Timing": trace.server_timing(), "X-Request-ID": trace.request_id}
+                raise
+            headers = {"Server-Timing": trace.server_timing(), "X-Request-ID": trace.request_id}
+            if self.fast_serialization:
+                return FastJSONResponse(model_payload(result), headers=headers)
+            response.headers.update(headers)
+            return result
+        
+        @self.app.post("/analyze-with-memory/stream")
+        async def analyze_with_memory_stream(request: LabAnalysisRequest):
+            return StreamingResponse(
+                self.stream_contextual_analysis(request),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        @self.app.post("/analyze-with-memory/batch")
+        async def analyze_with_memory_batch(requests: List[Any], concurrency: Optional[int] = None):
+            if len(requests) > self.batch_max_items:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {self.batch_max_items} items")
+            concurrency = max(1, min(concurrency or self.batch_concurrency, self.batch_concurrency))
+            return StreamingResponse(
+                self.stream_batch_analysis(requests, concurrency),
+                media_type="application/x-ndjson"
+            )
         
         @self.app.get("/health-journey/{user_id}")
-        async def get_health_journey(user_id: str, days: int = 30):
-            return await self.get_user_health_journey(user_id, days)
+        async def get_health_journey(user_id: str, days: int = 30, response_format: Literal["json", "ndjson"] = Query("json", alias="format"), accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+            if not self.conditional_get:
+                return await self.get_user_health_journey(user_id, days, response_format, accept_encoding)
+            # The day is part of the tag: readings age out of the ``days`` window without a write
+            encoding = (accept_encoding or "identity") if response_format == "json" else "identity"
+            version = await self.content_versions.get("journey", user_id)
+            etag = self.content_versions.etag("journey", user_id, version, days, response_format, encoding, date.today().isoformat())
+            headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+            if etag_matches(if_none_match, etag):
+                return self._not_modified(headers)
+            response = await self.get_user_health_journey(user_id, days, response_format, accept_encoding)
+            response.headers.update(headers)
+            return response
         
         @self.app.post("/sessions")
         async def create_session(user_id: str):
             return await self.create_user_session(user_id)
         
         @self.app.get("/sessions/{session_id}/context")
-        async def get_session_context(session_id: str, limit: int = 10):
-            return await self.get_session_memory_context(session_id, limit)
+        async def get_session_context(session_id: str, response: Response, limit: int = 10, if_none_match: Optional[str] = Header(None)):
+            if not self.conditional_get:
+                return await self.get_session_memory_context(session_id, limit)
+            version = await self.content_versions.get("session", session_id)
+            etag = self.content_versions.etag("session", session_id, version, limit)
+            if etag_matches(if_none_match, etag):
+                return self._not_modified({"ETag": etag})
+            context = await self.get_session_memory_context(session_id, limit)
+            response.headers["ETag"] = etag
+            return context
         
         @self.app.get("/health")
         async def health_check():
+            # Polled by the load balancer: upstream status comes from the background prober's
+            # cached snapshot, and the detailed counters are served by /stats
+            age = self.prober.age()
             return {
                 "status": "healthy",
                 "service": "labinsight-ai-memory-enhanced",
                 "timestamp": datetime.now().isoformat(),
-                "memory_service": await self._check_memory_service(),
-                "rag_service": await self._check_rag_service()
+                "memory_service": self.prober.status("memory"),
+                "rag_service": self.prober.status("rag"),
+                "upstream_status_age_seconds": round(age, 3) if age is not None else None
+            }
+        
+        @self.app.get("/stats")
+        async def stats():
+            return {
+                "timestamp": datetime.now().isoformat(),
+                "upstream_pools": self.upstream_stats(),
+                "write_behind": self.write_behind.stats(),
+                "journey_writes": self.journey_writer.stats(),
+                "caches": self.cache_stats(),
+                "conditional_get": self.content_versions.stats() if self.conditional_get else None,
+                "admission": {lane: limiter.stats() for lane, limiter in self.admission.items()} if self.admission_enabled else None,
+                "tracing": self.tracer.stats()
             }
+        
+        @self.app.get("/metrics")
+        async def metrics():
+            return PlainTextResponse(self.metrics.render(), media_type="text/plain; version=0.0.4")
+        
+        @self.app.get("/health/live")
+        async def liveness():
+            return {"status": "alive", "timestamp": datetime.now().isoformat()}
+        
+        @self.app.get("/health/ready")
+        async def readiness():
+            ready = self.started and self.prober.has_snapshot
+            body = {
+                "status": "ready" if ready else "not_ready",
+                "started": self.started,
+                "upstreams": self.prober.snapshot()
+            }
+            return JSONResponse(body, status_code=200 if ready else 503)
     
-    async def create_contextual_analysis(self, request: LabAnalysisRequest, background_tasks: BackgroundTasks) -> MemoryEnhancedResponse:
+    async def create_contextual_analysis(self, request: LabAnalysisRequest, session_id: Optional[str] = None, shared_context: Optional[Dict[str, Awaitable[Any]]] = None) -> MemoryEnhancedResponse:
         """Create contextual analysis combining memory, current data, and Ray Peat knowledge"""
         try:
             # Generate session ID if not provided
-            session_id = request.session_id or str(uuid.uuid4())
+            session_id = session_id or request.session_id or self._new_session_id()
+            trace = current_trace()
+            if trace is not None:
+                trace.attributes["session_id"] = session_id
             
-            # Ensure user session exists
-            await self._ensure_user_session(request.user_id, session_id)
-            
-            # Get user's health journey context if requested
-            health_context = {}
-            if request.include_context:
-                health_context = await self._get_health_journey_context(request.user_id)
-            
-            # Get relevant memory context
-            memory_context = []
-            if request.include_context:
-                memory_context = await self._get_memory_context(session_id, request.query)
+            # Ensure session, fetch health journey and memory context concurrently
+            health_context, memory_context, context_sources = await self._gather_context(
+                request.user_id,
+                session_id,
+                request.query,
+                request.include_context,
+                shared_context
+            )
             
             # Build contextual prompt for Ray Peat analysis
-            contextual_prompt = self._build_contextual_prompt(
-                request.query, 
-                request.lab_data, 
-                health_context, 
-                memory_context
-            )
+            with self.metrics.stage("prompt_build"):
+                prompt = self._build_contextual_prompt(
+                    request.query, 
+                    request.lab_data, 
+                    health_context, 
+                    memory_context
+                )
             
             # Get Ray Peat analysis with context
-            rag_response = await self._get_rag_analysis(contextual_prompt)
+            with self.metrics.stage("rag_call"):
+                rag_response = await self._get_rag_analysis(prompt.text)
             
             # Extract recommendations
-            recommendations = self._extract_recommendations(rag_response.get('analysis', ''))
+            with self.metrics.stage("recommendation_extraction"):
+                recommendations = self._extract_recommendations(rag_response.get('analysis', ''))
             
-            # Store interaction in memory (background task)
-            background_tasks.add_task(
-                self._store_interaction_memory, 
-                session_id, 
-                request.query, 
-                request.lab_data, 
-                rag_response
+            # Store interaction and update health journey (durable write-behind)
+            await self._persist_interaction(
+                request.user_id,
+                session_id,
+                request.query,
+                request.lab_data,
+                rag_response,
+                recommendations
             )
             
-            # Update health journey (background task)
-            background_tasks.add_task(
-                self._update_health_journey, 
-                request.user_id, 
-                session_id, 
-                request.lab_data, 
-                rag_response
-            )
-            
-            return MemoryEnhancedResponse(
+            # Everything below was produced or validated by this service; skip re-validation in fast mode
+            build_response = MemoryEnhancedResponse.model_construct if self.fast_serialization else MemoryEnhancedResponse
+            return build_response(
                 analysis=rag_response.get('analysis', ''),
                 sources=rag_response.get('sources', []),
-                context_used={
-                    "health_journey_entries": len(health_context.get('trends', {})),
-                    "memory_entries": len(memory_context),
-                    "contextual_insights": request.include_context
-                },
+                context_used=self._context_used(request, health_context, memory_context, context_sources, prompt),
                 personalized=request.include_context,
                 session_id=session_id,
                 recommendations=recommendations,
-                health_trends=health_context.get('trends') if request.include_context else None
+                health_trends=health_context.get('trends') if request.include_context else None,
+                trend_summary=health_context.get('trend_summary') if request.include_context else None
             )
             
+        except WriteBehindFullError as e:
+            logger.error(f"Contextual analysis rejected: {e}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
         except Exception as e:
             logger.error(f"Contextual analysis error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    async def get_user_health_journey(self, user_id: str, days: int = 30) -> Dict[str, Any]:
-        """Get user's health journey"""
+    async def stream_batch_analysis(self, items: List[Any], concurrency: int) -> AsyncIterator[str]:
+        """Analyse many lab panels, yielding one NDJSON line per item in completion order
+        
+        Items are validated individually (the route accepts any JSON array), so one malformed
+        item, even one that is not an object, yields an error line instead of rejecting the batch.
+        Session upserts and health-journey lookups run once per distinct session / user and are
+        shared by every item that needs them; each starts when the first such item gets a slot, so
+        the batch never has more upstream calls in flight than its concurrency allows. Analyses
+        run with bounded concurrency, and a failing item does not fail the rest of the batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        requests: List[Tuple[int, LabAnalysisRequest]] = []
+        for index, item in enumerate(items):
+            try:
+                requests.append((index, LabAnalysisRequest.model_validate(item)))
+            except ValidationError as e:
+                detail = e.errors(include_url=False)
+                yield self._ndjson_line({"index": index, "status": "error", "status_code": 422, "detail": detail})
+        session_ids = [request.session_id or self._new_session_id() for _, request in requests]
+        
+        shared_sessions: Dict[Tuple[str, str], asyncio.Future] = {}
+        shared_journeys: Dict[str, asyncio.Future] = {}
+        
+        async def run_item(index: int, request: LabAnalysisRequest, session_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                key = (request.user_id, session_id)
+                if key not in shared_sessions:
+                    shared_sessions[key] = asyncio.ensure_future(self._ensure_user_session(request.user_id, session_id))
+                shared_context = {"session": shared_sessions[key]}
+                if request.include_context:
+                    if request.user_id not in shared_journeys:
+                        shared_journeys[request.user_id] = asyncio.ensure_future(self._get_health_journey_context(request.user_id))
+                    shared_context["health_journey"] = shared_journeys[request.user_id]
+                try:
+                    response = await self.create_contextual_analysis(request, session_id, shared_context)
+                    result = model_payload(response) if self.fast_serialization else response.model_dump()
+                    return {"index": index, "status": "ok", "result": result}
+                except HTTPException as e:
+                    return {"index": index, "status": "error", "status_code": e.status_code, "detail": e.detail}
+                except Exception as e:
+                    logger.error(f"Batch item {index} error: {e}")
+                    return {"index": index, "status": "error", "status_code": 500, "detail": str(e)}
+        
+        tasks = [
+            asyncio.ensure_future(run_item(index, request, session_id))
+            for (index, request), session_id in zip(requests, session_ids)
+        ]
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.memory_url}/health-journey/{user_id}/trends?days={days}")
-                if response.status_code == 200:
-                    return response.json()
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                yield self._ndjson_line(item)
+        finally:
+            # Client went away (or we finished): stop unstarted items and drop shared lookups
+            for task in tasks:
+                task.cancel()
+            for future in list(shared_sessions.values()) + list(shared_journeys.values()):
+                if not future.done():
+                    future.cancel()
+    
+    def _ndjson_line(self, item: Dict[str, Any]) -> str:
+        if self.fast_serialization:
+            return dumps(item).decode("utf-8") + "\n"
+        return json.dumps(item, default=str) + "\n"
+    
+    async def stream_contextual_analysis(self, request: LabAnalysisRequest) -> AsyncIterator[str]:
+        """Server-Sent-Events variant of ``create_contextual_analysis``
+        
+        Emits ``context`` once the context fan-out finishes, ``chunk`` events as analysis text
+        arrives from the RAG service, then ``sources``, ``recommendations`` and ``done``.
+        Persistence is spooled only after the full analysis has been received; if the RAG stream
+        breaks off midway the stream ends with an ``error`` event flagged ``partial`` instead,
+        and the truncated analysis is not stored.
+        """
+        try:
+            session_id = request.session_id or self._new_session_id()
+            health_context, memory_context, context_sources = await self._gather_context(
+                request.user_id,
+                session_id,
+                request.query,
+                request.include_context
+            )
+            with self.metrics.stage("prompt_build"):
+                prompt = self._build_contextual_prompt(
+                    request.query,
+                    request.lab_data,
+                    health_context,
+                    memory_context
+                )
+            yield self._sse_event("context", {
+                "session_id": session_id,
+                "personalized": request.include_context,
+                "context_used": self._context_used(request, health_context, memory_context, context_sources, prompt),
+                "health_trends": health_context.get('trends') if request.include_context else None,
+                "trend_summary": health_context.get('trend_summary') if request.include_context else None
+            })
+            
+            rag_response = None
+            truncated = None
+            rag_started = time.perf_counter()
+            async for event, data in self._stream_rag_analysis(prompt.text):
+                if event == "chunk":
+                    yield self._sse_event("chunk", {"text": data})
+                elif event == "truncated":
+                    truncated = data
                 else:
-                    raise HTTPException(status_code=response.status_code, detail="Failed to retrieve health journey")
+                    rag_response = data
+            self.metrics.observe_stage("rag_call", time.perf_counter() - rag_started)
+            if truncated is not None:
+                yield self._sse_event("error", {"detail": f"Analysis stream interrupted: {truncated}", "partial": True, "session_id": session_id})
+                return
+            
+            analysis = rag_response.get('analysis', '')
+            yield self._sse_event("sources", {"sources": rag_response.get('sources', [])})
+            
+            with self.metrics.stage("recommendation_extraction"):
+                recommendations = self._extract_recommendations(analysis)
+            yield self._sse_event("recommendations", {"recommendations": recommendations})
+            
+            await self._persist_interaction(
+                request.user_id,
+                session_id,
+                request.query,
+                request.lab_data,
+                rag_response,
+                recommendations
+            )
+            yield self._sse_event("done", {"session_id": session_id})
+            
         except Exception as e:
+            logger.error(f"Streaming analysis error: {e}")
+            yield self._sse_event("error", {"detail": str(e)})
+    
+    @staticmethod
+    def _sse_event(event: str, data: Any) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    
+    def _context_used(self, request: LabAnalysisRequest, health_context: Dict[str, Any], memory_context: List[Dict[str, Any]], context_sources: Dict[str, Dict[str, Any]], prompt: PromptBuild) -> Dict[str, Any]:
+        return {
+            "health_journey_entries": len(health_context.get('trends', {})),
+            "memory_entries": len(memory_context),
+            "contextual_insights": request.include_context,
+            "context_sources": context_sources,
+            **prompt.stats()
+        }
+    
+    async def _gather_context(self, user_id: str, session_id: str, query: str, include_context: bool, shared: Optional[Dict[str, Awaitable[Any]]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Run the independent context lookups concurrently under one overall deadline
+        
+        Each branch gets its own latency budget (capped by the overall deadline) and falls back
+        to its degraded value when late, so the critical path is the slowest branch, not the sum.
+        ``shared`` may supply already-started ``session`` / ``health_journey`` lookups (batch
+        requests share them across items); those are shielded so one item's timeout cannot cancel them.
+        """
+        shared = shared or {}
+        deadline = self.context_deadline
+        branches = [
+            # The session upsert is shielded: if it misses its budget it still completes in the background
+            ("session", shared.get("session") or self._ensure_user_session(user_id, session_id), None, True),
+        ]
+        if include_context:
+            if "health_journey" in shared:
+                branches.append(("health_journey", shared["health_journey"], {"trends": {}}, True))
+            else:
+                branches.append(("health_journey", self._get_health_journey_context(user_id), {"trends": {}}, False))
+            branches.append(("memory", self._get_memory_context(session_id, query), [], False))
+        
+        results = await asyncio.gather(*[
+            self._run_context_branch(name, coro, min(self.context_budgets[name], deadline), default, shield)
+            for name, coro, default, shield in branches
+        ])
+        
+        values = {name: value for name, value, _ in results}
+        context_sources = {name: status for name, _, status in results}
+        for name in ("health_journey", "memory"):
+            context_sources.setdefault(name, {"status": "skipped"})
+        
+        return values.get("health_journey", {}), values.get("memory", []), context_sources
+    
+    async def _run_context_branch(self, name: str, coro: Awaitable[Any], budget: float, default: Any, shield: bool = False) -> Tuple[str, Any, Dict[str, Any]]:
+        """Await one context branch within its budget, degrading to ``default`` when late"""
+        started = time.perf_counter()
+        try:
+            with call_budget(budget):
+                value = await asyncio.wait_for(asyncio.shield(coro) if shield else coro, timeout=budget)
+            status = "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"Context branch '{name}' missed its {budget:.2f}s budget; continuing without it")
+            value = default
+            status = "timeout"
+        elapsed = time.perf_counter() - started
+        self.metrics.observe_stage(CONTEXT_STAGES[name], elapsed)
+        return name, value, {"status": status, "latency_ms": round(elapsed * 1000, 2)}
+    
+    async def get_user_health_journey(self, user_id: str, days: int = 30, response_format: str = "json", accept_encoding: Optional[str] = None) -> StreamingResponse:
+        """Stream user's health journey from the memory service without buffering it
+        
+        ``json`` passes the upstream body through byte for byte, negotiated with the client's
+        ``Accept-Encoding``; ``ndjson`` emits one ``{"biomarker", "series"}`` line per entry of
+        its ``trends`` object.
+        """
+        headers = {} if response_format == "ndjson" else {"Accept-Encoding": accept_encoding or "identity"}
+        stack = AsyncExitStack()
+        try:
+            upstream = await stack.enter_async_context(
+                self.memory.stream("GET", f"/health-journey/{user_id}/trends", params={"days": days}, headers=headers)
+            )
+            if upstream.status_code != 200:
+                raise HTTPException(status_code=upstream.status_code, detail="Failed to retrieve health journey")
+        except HTTPException:
+            await stack.aclose()
+            raise
+        except CircuitOpenError as e:
+            await stack.aclose()
+            raise self._upstream_unavailable(e)
+        except Exception as e:
+            await stack.aclose()
             logger.error(f"Health journey retrieval error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
+        
+        if response_format == "ndjson":
+            return StreamingResponse(self._stream_journey_ndjson(stack, upstream), media_type="application/x-ndjson")
+        headers = {
+            name: upstream.headers[name]
+            for name in ("content-encoding", "content-length")
+            if name in upstream.headers
+        }
+        return StreamingResponse(
+            self._stream_journey_raw(stack, upstream),
+            headers=headers,
+            media_type=upstream.headers.get("content-type", "application/json")
+        )
+    
+    @staticmethod
+    async def _stream_journey_raw(stack: AsyncExitStack, upstream) -> AsyncIterator[bytes]:
+        async with stack:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+    
+    @staticmethod
+    async def _stream_journey_ndjson(stack: AsyncExitStack, upstream) -> AsyncIterator[bytes]:
+        async with stack:
+            scanner = TrendsNDJSONScanner()
+            async for chunk in upstream.aiter_bytes():
+                lines = scanner.feed(chunk)
+                if lines:
+                    yield lines
+            try:
+                scanner.close()
+            except ValueError as e:
+                # Headers are already sent; log and let the client see a short body
+                logger.error(f"Health journey NDJSON conversion error: {e}")
+    
+    def _not_modified(self, headers: Dict[str, str]) -> Response:
+        """304 for a conditional GET whose ETag still matches; nothing is fetched or serialised"""
+        self.content_versions.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    
+    @staticmethod
+    def _upstream_unavailable(error: CircuitOpenError) -> HTTPException:
+        """503 for a call rejected by an open circuit breaker"""
+        logger.warning(str(error))
+        return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(math.ceil(error.retry_after))})
     
     async def create_user_session(self, user_id: str) -> Dict[str, Any]:
         """Create a new user session"""
         try:
             session_id = str(uuid.uuid4())
-            async with httpx.AsyncClient() as client:
-                session_data = {
-                    "session_id": session_id,
-                    "user_id": user_id,
-                    "metadata": {
-                        "created_by": "labinsight_ai",
-                        "version": "2.0.0",
-                        "features": ["memory", "context", "ray_peat_analysis"]
-                    }
+            session_data = {
+                "session_id": session_id,
+                "user_id": user_id,
+                "metadata": {
+                    "created_by": "labinsight_ai",
+                    "version": "2.0.0",
+                    "features": ["memory", "context", "ray_peat_analysis"]
                 }
-                response = await client.post(f"{self.memory_url}/sessions", json=session_data)
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise HTTPException(status_code=response.status_code, detail="Failed to create session")
+            }
+            response = await self.memory.post("/sessions", endpoint="session_upsert", json=session_data)
+            if response.status_code == 200:
+                await self.known_sessions.set(group_key(user_id, session_id), True)
+                if self.memory_index is not None:
+                    self.memory_index.mark_complete(session_id)
+                return response.json()
+            else:
+                raise HTTPException(status_code=response.status_code, detail="Failed to create session")
+        except CircuitOpenError as e:
+            raise self._upstream_unavailable(e)
         except Exception as e:
             logger.error(f"Session creation error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
@@ -179,215 +833,375 @@ class MemoryEnhancedAPI:
     async def get_session_memory_context(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get session memory context"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.memory_url}/sessions/{session_id}/context?limit={limit}")
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise HTTPException(status_code=response.status_code, detail="Failed to retrieve context")
+            response = await self.memory.get(f"/sessions/{session_id}/context", endpoint="session_context", params={"limit": limit})
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise HTTPException(status_code=response.status_code, detail="Failed to retrieve context")
+        except CircuitOpenError as e:
+            raise self._upstream_unavailable(e)
         except Exception as e:
             logger.error(f"Context retrieval error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
     async def _ensure_user_session(self, user_id: str, session_id: str):
-        """Ensure user session exists"""
+        """Ensure user session exists (skipped for sessions this process has already confirmed)"""
+        key = group_key(user_id, session_id)
+        if await self.known_sessions.get(key) is not MISSING:
+            return
+        await self.session_flights.do(key, lambda: self._upsert_user_session(user_id, session_id))
+    
+    async def _upsert_user_session(self, user_id: str, session_id: str):
+        """Upsert the session upstream and remember it once confirmed"""
         try:
-            async with httpx.AsyncClient() as client:
-                session_data = {
-                    "session_id": session_id,
-                    "user_id": user_id,
-                    "metadata": {"ensured_by": "memory_enhanced_api"}
-                }
-                await client.post(f"{self.memory_url}/sessions", json=session_data)
+            session_data = {
+                "session_id": session_id,
+                "user_id": user_id,
+                "metadata": {"ensured_by": "memory_enhanced_api"}
+            }
+            response = await self.memory.post("/sessions", endpoint="session_upsert", json=session_data)
+            if response.status_code < 300:
+                await self.known_sessions.set(group_key(user_id, session_id), True)
         except Exception as e:
             logger.error(f"Session ensure error: {e}")
     
     async def _get_health_journey_context(self, user_id: str, days: int = 90) -> Dict[str, Any]:
         """Get user's health journey context"""
+        cache_key = group_key(user_id, days)
+        cached = await self.journey_cache.get(cache_key, group=user_id)
+        record_cache("health_journey", cached is not MISSING)
+        if cached is not MISSING:
+            return cached
+        return await self.journey_flights.do(cache_key, lambda: self._fetch_health_journey_context(user_id, days))
+    
+    async def _fetch_health_journey_context(self, user_id: str, days: int) -> Dict[str, Any]:
+        """Fetch journey trends from the memory service, summarise them and populate the cache"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.memory_url}/health-journey/{user_id}/trends?days={days}")
-                if response.status_code == 200:
-                    return response.json()
-                return {"trends": {}}
+            generation = await self.journey_cache.generation(user_id)
+            response = await self.memory.get(f"/health-journey/{user_id}/trends", endpoint="journey_trends", params={"days": days})
+            if response.status_code == 200:
+                health_context = response.json()
+                # Summarised once per fetch; cached alongside the raw trends
+                health_context["trend_summary"] = self.trend_engine.summarize(health_context.get('trends') or {})
+                await self.journey_cache.set(group_key(user_id, days), health_context, group=user_id, generation=generation)
+                return health_context
+            return {"trends": {}}
         except Exception as e:
             logger.error(f"Health journey context error: {e}")
             return {"trends": {}}
     
     async def _get_memory_context(self, session_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Get relevant memory context for the query"""
+        """Get relevant memory context for the query, from the local index when the session is complete there"""
+        if self.memory_index is not None:
+            local = self.memory_index.search(session_id, query, limit)
+            record_cache("memory_index", local is not None)
+            if local is not None:
+                return local
+            self._start_memory_hydration(session_id)
         try:
-            async with httpx.AsyncClient() as client:
-                search_payload = {
-                    "query": query,
-                    "session_id": session_id,
-                    "limit": limit,
-                    "relevance_threshold": 0.6
-                }
-                response = await client.post(f"{self.memory_url}/sessions/{session_id}/search", json=search_payload)
-                if response.status_code == 200:
-                    return response.json()
-                return []
+            search_payload = {
+                "query": query,
+                "session_id": session_id,
+                "limit": limit,
+                "relevance_threshold": 0.6
+            }
+            response = await self.memory.post(f"/sessions/{session_id}/search", endpoint="memory_search", json=search_payload)
+            if response.status_code == 200:
+                return response.json()
+            return []
         except Exception as e:
             logger.error(f"Memory context error: {e}")
             return []
     
-    def _build_contextual_prompt(self, query: str, lab_data: Dict[str, Any], health_context: Dict[str, Any], memory_context: List[Dict[str, Any]]) -> str:
-        """Build contextual prompt for Ray Peat analysis"""
-        
-        prompt_parts = [
-            f"CONTEXTUAL HEALTH ANALYSIS REQUEST",
-            f"Current Query: {query}",
-            f"Current Lab Data: {json.dumps(lab_data, indent=2)}"
-        ]
-        
-        # Add health journey context
-        if health_context.get('trends'):
-            prompt_parts.append("\nHEALTH JOURNEY CONTEXT:")
-            for biomarker, trend_data in health_context['trends'].items():
-                if trend_data:
-                    latest = trend_data[-1]
-                    if len(trend_data) > 1:
-                        prev_value = trend_data[-2]['value']
-                        current_value = latest['value']
-                        if current_value > prev_value:
-                            trend_direction = "improving"
-                        elif current_value < prev_value:
-                            trend_direction = "declining"
-                        else:
-                            trend_direction = "stable"
-                    else:
-                        trend_direction = "first measurement"
-                    
-                    prompt_parts.append(f"- {biomarker}: Latest value {latest['value']}, trend {trend_direction}")
-                    if latest.get('interpretation'):
-                        prompt_parts.append(f"  Previous Ray Peat interpretation: {latest['interpretation']}")
-        
-        # Add memory context
-        if memory_context:
-            prompt_parts.append("\nRELEVANT CONVERSATION HISTORY:")
-            for memory in memory_context[-3:]:  # Last 3 relevant memories
-                content_preview = memory['content'][:200] + "..." if len(memory['content']) > 200 else memory['content']
-                prompt_parts.append(f"- {memory['role']}: {content_preview}")
-        
-        prompt_parts.append("\nPlease provide a Ray Peat-informed analysis that:")
-        prompt_parts.append("1. Considers the user's health journey and trends")
-        prompt_parts.append("2. References relevant previous conversations")
-        prompt_parts.append("3. Provides personalized recommendations based on patterns")
-        prompt_parts.append("4. Identifies any concerning trends or improvements")
-        prompt_parts.append("5. Suggests specific Ray Peat protocols based on individual response history")
-        
-        return "\n".join(prompt_parts)
+    def _new_session_id(self) -> str:
+        """Fresh session id; the local memory index can answer for it from the first request"""
+        session_id = str(uuid.uuid4())
+        if self.memory_index is not None:
+            self.memory_index.mark_complete(session_id)
+        return session_id
+    
+    def _start_memory_hydration(self, session_id: str):
+        """Load a cold session's recent history into the local index in the background"""
+        if not self.memory_index.begin_hydration(session_id):
+            return
+        task = asyncio.ensure_future(self._hydrate_memory_index(session_id))
+        self.hydration_tasks.add(task)
+        task.add_done_callback(self.hydration_tasks.discard)
+    
+    async def _hydrate_memory_index(self, session_id: str):
+        try:
+            response = await self.memory.get(f"/sessions/{session_id}/context", endpoint="session_context", params={"limit": self.memory_index.max_documents})
+            if response.status_code == 200:
+                history = response.json()
+                self.memory_index.hydrate(session_id, history if isinstance(history, list) else history.get("messages", []))
+                return
+            if response.status_code == 404:
+                # No such session upstream yet: nothing to load
+                self.memory_index.hydrate(session_id, [])
+                return
+            logger.warning(f"Memory index hydration for session {session_id} failed: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Memory index hydration error: {e}")
+        self.memory_index.abort_hydration(session_id)
+    
+    def _build_contextual_prompt(self, query: str, lab_data: Dict[str, Any], health_context: Dict[str, Any], memory_context: List[Dict[str, Any]]) -> PromptBuild:
+        """Build contextual prompt for Ray Peat analysis within the prompt token budget"""
+        return self.prompt_builder.build(query, lab_data, health_context, memory_context)
     
     async def _get_rag_analysis(self, contextual_prompt: str) -> Dict[str, Any]:
         """Get Ray Peat analysis with contextual prompt"""
+        payload = {
+            "query": contextual_prompt,
+            "include_sources": True,
+            "max_results": 5
+        }
+        cache_key = fingerprint(payload)
+        cached = await self.rag_cache.get(cache_key)
+        record_cache("rag", cached is not MISSING)
+        if cached is not MISSING:
+            return cached
+        return await self.rag_flights.do(cache_key, lambda: self._fetch_rag_analysis(payload, cache_key))
+    
+    async def _fetch_rag_analysis(self, payload: Dict[str, Any], cache_key: str) -> Dict[str, Any]:
+        """Query the RAG service and cache successful responses"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                payload = {
-                    "query": contextual_prompt,
-                    "include_sources": True,
-                    "max_results": 5
-                }
-                response = await client.post(f"{self.rag_url}/query", json=payload)
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"RAG analysis failed: {response.status_code}")
-                    return {"analysis": "Analysis temporarily unavailable", "sources": []}
+            response = await self.rag.post("/query", endpoint="query", json=payload)
+            if response.status_code == 200:
+                rag_response = response.json()
+                await self.rag_cache.set(cache_key, rag_response)
+                return rag_response
+            else:
+                logger.error(f"RAG analysis failed: {response.status_code}")
+                return {"analysis": "Analysis temporarily unavailable", "sources": []}
         except Exception as e:
             logger.error(f"RAG analysis error: {e}")
             return {"analysis": "Analysis temporarily unavailable", "sources": []}
     
-    async def _store_interaction_memory(self, session_id: str, query: str, lab_data: Dict[str, Any], rag_response: Dict[str, Any]):
-        """Store the interaction in memory"""
+    async def _stream_rag_analysis(self, contextual_prompt: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield ``("chunk", text)`` as analysis text arrives, then ``("response", rag_response)``
+        
+        If the stream fails after some text was sent, ``("truncated", reason)`` comes before the
+        response, which then only holds the partial text.
+        
+        Asks the RAG service to stream (``"stream": true``). Server-Sent-Events and NDJSON bodies
+        are read incrementally, as JSON objects carrying ``delta`` text and/or ``sources``; a plain
+        JSON body (a RAG service without streaming support) is emitted as a single chunk.
+        """
+        payload = {
+            "query": contextual_prompt,
+            "include_sources": True,
+            "max_results": 5
+        }
+        cache_key = fingerprint(payload)
+        cached = await self.rag_cache.get(cache_key)
+        if cached is not MISSING:
+            yield "chunk", cached.get('analysis', '')
+            yield "response", cached
+            return
+        
+        degraded = {"analysis": "Analysis temporarily unavailable", "sources": []}
+        parts: List[str] = []
+        sources: List[Dict[str, Any]] = []
         try:
-            async with httpx.AsyncClient() as client:
-                # Store user query
-                user_message = {
-                    "role": "user",
-                    "content": f"Query: {query}\nLab Data: {json.dumps(lab_data)}",
-                    "metadata": {
-                        "type": "lab_analysis_request", 
-                        "timestamp": datetime.now().isoformat(),
-                        "lab_data_keys": list(lab_data.keys())
-                    }
-                }
-                await client.post(f"{self.memory_url}/sessions/{session_id}/messages", json=user_message)
+            async with self.rag.stream("POST", "/query", json={**payload, "stream": True}) as response:
+                if response.status_code != 200:
+                    logger.error(f"RAG analysis failed: {response.status_code}")
+                    yield "chunk", degraded["analysis"]
+                    yield "response", degraded
+                    return
                 
-                # Store assistant response
-                assistant_message = {
-                    "role": "assistant",
-                    "content": rag_response.get('analysis', ''),
-                    "metadata": {
-                        "type": "ray_peat_analysis",
-                        "sources": rag_response.get('sources', []),
-                        "contextual": True,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                }
-                await client.post(f"{self.memory_url}/sessions/{session_id}/messages", json=assistant_message)
+                content_type = response.headers.get("content-type", "")
+                if "text/event-stream" not in content_type and "ndjson" not in content_type:
+                    rag_response = json.loads(await response.aread())
+                    await self.rag_cache.set(cache_key, rag_response)
+                    yield "chunk", rag_response.get('analysis', '')
+                    yield "response", rag_response
+                    return
                 
+                async for line in response.aiter_lines():
+                    line = line.strip()
+                    if line.startswith("data:"):
+                        line = line[5:].strip()
+                    if not line or line.startswith(("event:", "id:", ":")) or line == "[DONE]":
+                        continue
+                    message = json.loads(line)
+                    if message.get("sources"):
+                        sources = message["sources"]
+                    delta = message.get("delta") or message.get("analysis")
+                    if delta:
+                        parts.append(delta)
+                        yield "chunk", delta
         except Exception as e:
-            logger.error(f"Memory storage error: {e}")
+            logger.error(f"RAG streaming error: {e}")
+            if not parts:
+                yield "chunk", degraded["analysis"]
+                yield "response", degraded
+                return
+            # Keep what already reached the client, but do not cache a truncated analysis
+            yield "truncated", str(e) or type(e).__name__
+            yield "response", {"analysis": "".join(parts), "sources": sources, "partial": True}
+            return
+        
+        rag_response = {"analysis": "".join(parts), "sources": sources}
+        await self.rag_cache.set(cache_key, rag_response)
+        yield "response", rag_response
     
-    async def _update_health_journey(self, user_id: str, session_id: str, lab_data: Dict[str, Any], rag_response: Dict[str, Any]):
-        """Update health journey with new data"""
+    async def _persist_interaction(self, user_id: str, session_id: str, query: str, lab_data: Dict[str, Any], rag_response: Dict[str, Any], recommendations: List[str]):
+        """Spool the interaction and journey writes; the write-behind queue flushes them to the memory service"""
+        timestamp = datetime.now().isoformat()
+        await self.write_behind.enqueue(
+            "interaction",
+            session_id=session_id,
+            query=query,
+            lab_data=lab_data,
+            rag_response=rag_response,
+            timestamp=timestamp
+        )
+        if self.memory_index is not None:
+            # Indexed as soon as the write is durable in the spool, ahead of the flush
+            self.memory_index.add(session_id, *self._interaction_messages(query, lab_data, rag_response, timestamp))
+        await self.write_behind.enqueue(
+            "health_journey",
+            user_id=user_id,
+            session_id=session_id,
+            lab_data=lab_data,
+            rag_response=rag_response,
+            recommendations=recommendations,
+            timestamp=timestamp
+        )
+    
+    @staticmethod
+    def _interaction_messages(query: str, lab_data: Dict[str, Any], rag_response: Dict[str, Any], timestamp: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """The user and assistant messages one interaction stores in the session"""
+        user_message = {
+            "role": "user",
+            "content": f"Query: {query}\nLab Data: {json.dumps(lab_data)}",
+            "metadata": {
+                "type": "lab_analysis_request", 
+                "timestamp": timestamp,
+                "lab_data_keys": list(lab_data.keys())
+            }
+        }
+        assistant_message = {
+            "role": "assistant",
+            "content": rag_response.get('analysis', ''),
+            "metadata": {
+                "type": "ray_peat_analysis",
+                "sources": rag_response.get('sources', []),
+                "contextual": True,
+                "timestamp": timestamp
+            }
+        }
+        return user_message, assistant_message
+    
+    async def _store_interaction_memory(self, session_id: str, query: str, lab_data: Dict[str, Any], rag_response: Dict[str, Any], timestamp: Optional[str] = None, progress: Optional[WriteProgress] = None):
+        """Store the interaction in memory (raises so the write-behind queue can retry)
+        
+        Each message is a step of the spooled record, so a retry never re-posts one already stored.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        user_message, assistant_message = self._interaction_messages(query, lab_data, rag_response, timestamp)
         try:
-            async with httpx.AsyncClient() as client:
-                for biomarker, value in lab_data.items():
-                    if isinstance(value, (int, float)):
-                        journey_data = {
-                            "session_id": session_id,
-                            "biomarker_type": biomarker,
-                            "biomarker_value": float(value),
-                            "ray_peat_interpretation": rag_response.get('analysis', '')[:500],
-                            "recommendations": self._extract_recommendations(rag_response.get('analysis', '')),
-                            "metadata": {
-                                "sources": rag_response.get('sources', []),
-                                "contextual_analysis": True,
-                                "analysis_timestamp": datetime.now().isoformat()
-                            }
-                        }
-                        await client.post(f"{self.memory_url}/health-journey/{user_id}", json=journey_data)
-                        
+            # Store user query, then assistant response
+            for step, message in (("user_message", user_message), ("assistant_message", assistant_message)):
+                if progress is not None and progress.done(step):
+                    continue
+                response = await self.memory.post(f"/sessions/{session_id}/messages", endpoint="session_messages", json=message)
+                response.raise_for_status()
+                if progress is not None:
+                    progress.complete(step)
+        finally:
+            # Even a failed attempt may have stored the first message; never let a stale ETag match
+            await self._after_write("session", session_id)
+    
+    async def _update_health_journey(self, user_id: str, session_id: str, lab_data: Dict[str, Any], rag_response: Dict[str, Any], recommendations: Optional[List[str]] = None, timestamp: Optional[str] = None, progress: Optional[WriteProgress] = None):
+        """Update health journey with new data (raises so the write-behind queue can retry)"""
+        entries = build_journey_entries(lab_data)
+        if not entries:
+            return
+        analysis_text = rag_response.get('analysis', '')
+        if recommendations is None:
+            recommendations = self._extract_recommendations(analysis_text)
+        analysis = build_journey_analysis(
+            session_id,
+            analysis_text[:500],
+            recommendations,
+            {
+                "sources": rag_response.get('sources', []),
+                "contextual_analysis": True,
+                "analysis_timestamp": timestamp or datetime.now().isoformat()
+            }
+        )
+        try:
+            if progress is None:
+                await self.journey_writer.submit(user_id, analysis, entries)
+            elif not progress.done("journey"):
+                # Entries the per-biomarker fallback already wrote are not sent again on a retry
+                entries = [entry for entry in entries if not progress.done(f"journey:{entry['biomarker_type']}")]
+                # Recorded when the batch is sent, even if this attempt is cancelled meanwhile
+                await self.journey_writer.submit(
+                    user_id,
+                    analysis,
+                    entries,
+                    on_sent=lambda: progress.complete("journey"),
+                    on_entry_sent=lambda index: progress.complete(f"journey:{entries[index]['biomarker_type']}")
+                )
+        finally:
+            # A failed batch may still have written some entries (per-biomarker fallback)
+            await self._after_write("journey", user_id)
+    
+    async def _after_write(self, kind: str, key: str):
+        """Invalidate what a write made stale; best-effort, so a cache error never gets the write retried"""
+        try:
+            if self.conditional_get:
+                await self.content_versions.bump(kind, key)
+            if kind == "journey":
+                await self.journey_cache.invalidate_group(key)
         except Exception as e:
-            logger.error(f"Health journey update error: {e}")
+            logger.error(f"Cache invalidation after {kind} write for {key} failed: {e}")
     
-    def _extract_recommendations(self, analysis_text: str) -> List[str]:
-        """Extract recommendations from analysis text"""
-        # Simple extraction - look for recommendation keywords
-        lines = analysis_text.split('\n')
-        recommendations = []
-        
-        for line in lines:
-            line = line.strip()
-            if any(keyword in line.lower() for keyword in ['recommend', 'suggest', 'consider', 'try', 'increase', 'decrease', 'avoid']):
-                if len(line) > 10:  # Avoid very short lines
-                    recommendations.append(line)
+    async def _send_journey_batch(self, user_id: str, batch: Dict[str, Any], entry_sent: Optional[Callable[[int], None]] = None):
+        """Write a whole batch of journey entries in one request, falling back to per-biomarker writes
+
+        Each per-biomarker write is reported through ``entry_sent`` as soon as it succeeds.
+        """
+        if self.journey_batch_supported:
+            response = await self.memory.post(f"/health-journey/{user_id}/batch", endpoint="journey_batch", json=batch)
+            if response.status_code not in (404, 405):
+                response.raise_for_status()
+                return
+            logger.warning("Memory service has no batch journey endpoint; falling back to per-biomarker writes")
+            self.journey_batch_supported = False
         
-        return recommendations[:5]  # Top 5 recommendations
+        for index, journey_data in enumerate(expand_journey_batch(batch)):
+            response = await self.memory.post(f"/health-journey/{user_id}", endpoint="journey_entry", json=journey_data)
+            response.raise_for_status()
+            if entry_sent is not None:
+                entry_sent(index)
+    
+    def _extract_recommendations(self, analysis_text: str) -> List[str]:
+        """Extract the top RECOMMENDATIONS_LIMIT ranked, deduplicated recommendations from analysis text"""
+        return self.recommendation_extractor.extract(analysis_text)
     
     async def _check_memory_service(self) -> Dict[str, Any]:
         """Check memory service health"""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.memory_url}/health")
-                if response.status_code == 200:
-                    return {"status": "healthy", "details": response.json()}
-                else:
-                    return {"status": "unhealthy", "code": response.status_code}
+            response = await self.memory.get("/health", timeout=5.0)
+            if response.status_code == 200:
+                return {"status": "healthy", "details": response.json()}
+            else:
+                return {"status": "unhealthy", "code": response.status_code}
         except Exception as e:
             return {"status": "error", "error": str(e)}
     
     async def _check_rag_service(self) -> Dict[str, Any]:
         """Check RAG service health"""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.rag_url}/health")
-                if response.status_code == 200:
-                    return {"status": "healthy"}
-                else:
-                    return {"status": "unhealthy", "code": response.status_code}
+            response = await self.rag.get("/health", timeout=5.0)
+            if response.status_code == 200:
+                return {"status": "healthy"}
+            else:
+                return {"status": "unhealthy", "code": response.status_code}
         except Exception as e:
             return {"status": "error", "error": str(e)}
 
@@ -396,4 +1210,15 @@ memory_api = MemoryEnhancedAPI()
 app = memory_api.app
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8004)
+    workers = env_int("API_WORKERS", 1)
+    if workers > 1:
+        # Worker processes import the app themselves, so it has to be passed as an import string
+        uvicorn.run(
+            "memory_enhanced_api:app",
+            host="0.0.0.0",
+            port=8004,
+            workers=workers,
+            app_dir=os.path.dirname(os.path.abspath(__file__))
+        )
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8004)
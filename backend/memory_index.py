@@ -0,0 +1,218 @@
+"""
+Per-session lexical memory index for the Memory-Enhanced API
+Every message this process writes to a session is also added to a small in-process BM25 index,
+so ``_get_memory_context`` can rank a session's messages locally instead of asking the memory
+service to search. An index only answers once it is complete: the session was created by this
+process, or its recent history has been hydrated from the memory service. Until then callers
+fall back to the remote search. Messages written elsewhere (another replica, or straight to the
+memory service) never reach the index, so completeness lapses after ``refresh_after`` seconds:
+the next lookup goes remote again and the session is re-hydrated. Sessions and their message
+counts are both bounded.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+_TOKENS = re.compile(r"[a-z0-9]+")
+
+# Short function words carry no ranking signal and would dominate every posting list
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its my of on or our so that the "
+    "their this to was what when which with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKENS.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def _fingerprint(message: Dict[str, Any]) -> str:
+    """Identity used to merge hydrated history with messages written while it was in flight"""
+    return hashlib.blake2b(
+        json.dumps([message.get("role"), message.get("content")], ensure_ascii=False).encode("utf-8"),
+        digest_size=12
+    ).hexdigest()
+
+
+class SessionIndex:
+    """BM25 over one session's most recent ``max_documents`` messages"""
+
+    def __init__(self, max_documents: int, k1: float, b: float):
+        self.max_documents = max_documents
+        self.k1 = k1
+        self.b = b
+        self.complete = False
+        self.completed_at = 0.0
+        self.hydrating = False
+        # Sequence of the first message added after the current hydration began
+        self.hydration_mark = 0
+        # (sequence, term frequencies, length, message), oldest first; sequences are contiguous
+        self.documents: Deque[Tuple[int, Counter, int, Dict[str, Any]]] = deque()
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self.sequence = 0
+
+    def add(self, message: Dict[str, Any]):
+        terms = Counter(tokenize(str(message.get("content", ""))))
+        length = sum(terms.values())
+        sequence = self.sequence
+        self.sequence += 1
+        self.documents.append((sequence, terms, length, message))
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[sequence] = frequency
+        while len(self.documents) > self.max_documents:
+            self._evict()
+
+    def _evict(self):
+        sequence, terms, length, _ = self.documents.popleft()
+        self.total_length -= length
+        for term in terms:
+            posting = self.postings[term]
+            del posting[sequence]
+            if not posting:
+                del self.postings[term]
+
+    def hydrate(self, history: List[Dict[str, Any]]):
+        """Rebuild from the service's recent ``history`` (oldest first), keeping messages it lacks
+
+        A local message missing from a full ``history`` window is kept only if it was added after
+        the hydration began; older ones have most likely just aged out of the window.
+        """
+        full = len(history) >= self.max_documents
+        written = [document[3] for document in self.documents if not full or document[0] >= self.hydration_mark]
+        known = {_fingerprint(message) for message in history}
+        self.documents.clear()
+        self.postings.clear()
+        self.total_length = 0
+        for message in history:
+            self.add(message)
+        for message in written:
+            if _fingerprint(message) not in known:
+                self.add(message)
+
+    def search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Top ``limit`` messages sharing at least one term with ``query``, in chronological order"""
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count or 1.0
+        first = self.documents[0][0]
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for sequence, frequency in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.documents[sequence - first][2] / average_length)
+                scores[sequence] = scores.get(sequence, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        if not scores:
+            return []
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [
+            {**self.documents[sequence - first][3], "score": round(score, 4)}
+            for sequence, score in sorted(top)
+        ]
+
+
+class MemoryIndex:
+    """LRU collection of ``SessionIndex`` objects, at most ``max_sessions`` of them
+
+    ``search`` returns ``None`` for a session whose index is not complete, or was completed more
+    than ``refresh_after`` seconds ago (0 never lapses); the caller should use the remote search
+    and may start a hydration (``begin_hydration`` / ``hydrate``).
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_documents: int = 200, k1: float = 1.2, b: float = 0.75, refresh_after: float = 300.0):
+        self.max_sessions = max_sessions
+        self.max_documents = max_documents
+        self.refresh_after = refresh_after
+        self.k1 = k1
+        self.b = b
+        self._sessions: "OrderedDict[str, SessionIndex]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.hydrations = 0
+        self.evictions = 0
+
+    def _session(self, session_id: str) -> SessionIndex:
+        index = self._sessions.get(session_id)
+        if index is None:
+            index = self._sessions[session_id] = SessionIndex(self.max_documents, self.k1, self.b)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        return index
+
+    def _fresh(self, index: SessionIndex) -> bool:
+        if not index.complete:
+            return False
+        return self.refresh_after <= 0 or time.monotonic() - index.completed_at < self.refresh_after
+
+    def _complete(self, index: SessionIndex):
+        index.complete = True
+        index.completed_at = time.monotonic()
+
+    def mark_complete(self, session_id: str):
+        """The session was created here, so every message it has went through ``add``"""
+        self._complete(self._session(session_id))
+
+    def add(self, session_id: str, *messages: Dict[str, Any]):
+        index = self._session(session_id)
+        for message in messages:
+            index.add(message)
+
+    def search(self, session_id: str, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        index = self._sessions.get(session_id)
+        if index is None or not self._fresh(index):
+            self.misses += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        self.hits += 1
+        return index.search(query, limit)
+
+    def begin_hydration(self, session_id: str) -> bool:
+        """Claim the session's hydration; False if it is fresh or already being hydrated"""
+        index = self._session(session_id)
+        if self._fresh(index) or index.hydrating:
+            return False
+        index.hydrating = True
+        index.hydration_mark = index.sequence
+        return True
+
+    def hydrate(self, session_id: str, history: List[Dict[str, Any]]):
+        index = self._session(session_id)
+        index.hydrate(history)
+        index.hydrating = False
+        self._complete(index)
+        self.hydrations += 1
+
+    def abort_hydration(self, session_id: str):
+        index = self._sessions.get(session_id)
+        if index is not None:
+            index.hydrating = False
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "complete_sessions": sum(1 for index in self._sessions.values() if self._fresh(index)),
+            "refresh_after_seconds": self.refresh_after,
+            "documents": sum(len(index.documents) for index in self._sessions.values()),
+            "max_sessions": self.max_sessions,
+            "max_documents_per_session": self.max_documents,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "hydrations": self.hydrations,
+            "evictions": self.evictions
+        }
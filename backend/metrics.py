@@ -0,0 +1,223 @@
+"""
+Prometheus-format metrics for the Memory-Enhanced API
+Counters and histograms are plain Python objects updated on the event loop, so recording
+is a dict lookup plus a bisect with no locks or allocation on the hot path.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tracing import record_span
+
+# Seconds; spans sub-millisecond cache hits up to the 30s RAG timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [non-cumulative bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labelvalues: str) -> "Timer":
+        return Timer(self, labelvalues)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Timer:
+    """``with histogram.time("label"):`` records the block's wall time in seconds"""
+
+    __slots__ = ("histogram", "labelvalues", "started", "elapsed")
+
+    def __init__(self, histogram: Histogram, labelvalues: LabelValues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+        self.histogram.observe(self.elapsed, *self.labelvalues)
+        return False
+
+
+class StageTimer(Timer):
+    """Timer that also adds its span to the current request trace"""
+
+    __slots__ = ()
+
+    def __exit__(self, *exc_info):
+        super().__exit__(*exc_info)
+        record_span(self.labelvalues[0], self.elapsed)
+        return False
+
+
+class GaugeCallback:
+    """Gauge whose samples are read from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], collect: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, labelnames: Tuple[str, ...], collect: Callable[[], Dict[LabelValues, float]]) -> GaugeCallback:
+        return self._register(GaugeCallback(name, documentation, labelnames, collect))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ApiMetrics:
+    """The Memory-Enhanced API's metric set"""
+
+    STAGES = (
+        "session_ensure",
+        "journey_fetch",
+        "memory_search",
+        "prompt_build",
+        "rag_call",
+        "recommendation_extraction",
+        "background_persistence",
+    )
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        self.stage_duration = self.registry.histogram(
+            "memory_api_stage_duration_seconds",
+            "Time spent in each stage of contextual analysis",
+            ("stage",)
+        )
+        self.upstream_requests = self.registry.counter(
+            "memory_api_upstream_requests_total",
+            "Upstream requests by upstream, method and status code (or error / circuit_open)",
+            ("upstream", "method", "status")
+        )
+        self.upstream_duration = self.registry.histogram(
+            "memory_api_upstream_request_duration_seconds",
+            "Upstream request latency",
+            ("upstream", "method")
+        )
+        self.write_behind_flush = self.registry.histogram(
+            "memory_api_write_behind_flush_duration_seconds",
+            "Time to flush one write-behind batch to the memory service"
+        )
+        self.admission_wait = self.registry.histogram(
+            "memory_api_admission_wait_seconds",
+            "Time admitted requests spent queued for a slot",
+            ("lane",)
+        )
+        self.admission_rejections = self.registry.counter(
+            "memory_api_admission_rejections_total",
+            "Requests shed by admission control by lane and reason (queue_full, deadline, timeout)",
+            ("lane", "reason")
+        )
+
+    def stage(self, name: str) -> Timer:
+        return StageTimer(self.stage_duration, (name,))
+
+    def observe_stage(self, name: str, seconds: float):
+        self.stage_duration.observe(seconds, name)
+        record_span(name, seconds)
+
+    def record_upstream(self, upstream: str, method: str, status: str, seconds: Optional[float] = None):
+        self.upstream_requests.inc(upstream, method, status)
+        if seconds is not None:
+            self.upstream_duration.observe(seconds, upstream, method)
+
+    def render(self) -> str:
+        return self.registry.render()
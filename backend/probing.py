@@ -0,0 +1,92 @@
+"""
+Background upstream health prober for the Memory-Enhanced API
+Keeps a cached snapshot of upstream status so health probes never wait on upstreams
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class UpstreamProber:
+    """Refresh upstream status on a jittered interval and serve the last snapshot"""
+
+    def __init__(self, checks: Dict[str, Check], interval: float = 5.0, jitter: float = 0.2, check_timeout: float = 5.0):
+        self.checks = checks
+        self.interval = interval
+        self.jitter = jitter
+        self.check_timeout = check_timeout
+        self._task: Optional[asyncio.Task] = None
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._checked_at: Optional[float] = None
+        self._checked_at_iso: Optional[str] = None
+        self.probes = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def probe(self):
+        """Run every check concurrently and replace the snapshot"""
+        names = list(self.checks)
+        results = await asyncio.gather(
+            *[asyncio.wait_for(self.checks[name](), timeout=self.check_timeout) for name in names],
+            return_exceptions=True
+        )
+        snapshot = {}
+        for name, result in zip(names, results):
+            if isinstance(result, asyncio.TimeoutError):
+                snapshot[name] = {"status": "error", "error": f"probe timed out after {self.check_timeout}s"}
+            elif isinstance(result, Exception):
+                snapshot[name] = {"status": "error", "error": str(result)}
+            else:
+                snapshot[name] = result
+        self._results = snapshot
+        self._checked_at = time.monotonic()
+        self._checked_at_iso = datetime.now().isoformat()
+        self.probes += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Upstream probe error: {e}")
+            # Jitter keeps replicas from probing the upstreams in lockstep
+            spread = self.interval * self.jitter
+            await asyncio.sleep(max(0.0, self.interval + random.uniform(-spread, spread)))
+
+    @property
+    def has_snapshot(self) -> bool:
+        return self._checked_at is not None
+
+    def age(self) -> Optional[float]:
+        if self._checked_at is None:
+            return None
+        return time.monotonic() - self._checked_at
+
+    def status(self, name: str) -> Dict[str, Any]:
+        return self._results.get(name, {"status": "unknown"})
+
+    def snapshot(self) -> Dict[str, Any]:
+        age = self.age()
+        return {
+            "checked_at": self._checked_at_iso,
+            "age_seconds": round(age, 3) if age is not None else None,
+            "interval_seconds": self.interval,
+            "services": dict(self._results)
+        }
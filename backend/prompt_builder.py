@@ -0,0 +1,225 @@
+"""
+Token-budgeted prompt assembly for the Memory-Enhanced API
+Lab data is encoded as one compact ``name=value`` line, and trends as one line per biomarker
+from the ``TrendEngine`` summary.
+Candidate lines are admitted in a fixed priority order until the token budget is spent:
+out-of-range lab values, then trends for abnormal or changing biomarkers, then the rest of
+the panel, recent conversation, remaining trends and finally past interpretations. Equal
+inputs always produce the same prompt, so RAG cache keys stay stable.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from biomarkers import normalize_biomarker, optimal_range, range_deviation
+from trends import STABLE_CHANGE, TrendEngine
+
+# Rough BPE approximation: one token per 4 characters of each word or punctuation mark
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+INSTRUCTIONS = [
+    "\nPlease provide a Ray Peat-informed analysis that:",
+    "1. Considers the user's health journey and trends",
+    "2. References relevant previous conversations",
+    "3. Provides personalized recommendations based on patterns",
+    "4. Identifies any concerning trends or improvements",
+    "5. Suggests specific Ray Peat protocols based on individual response history",
+]
+
+LAB_HEADING = "Current Lab Data:"
+JOURNEY_HEADING = "\nHEALTH JOURNEY CONTEXT:"
+MEMORY_HEADING = "\nRELEVANT CONVERSATION HISTORY:"
+
+# Trend lines for markers moving away from their optimal range outrank those moving toward it
+ASSESSMENT_RANK = {"worsening": 0, "improving": 1}
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count; additive across lines joined by whitespace"""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PIECES.findall(text))
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _fmt(value: Optional[float], spec: str = "g") -> str:
+    # Statistics that could not be computed (non-finite input) come through as None
+    return "n/a" if value is None else format(value, spec)
+
+
+def _truncate(text: str, chars: int) -> str:
+    return text[:chars] + "..." if len(text) > chars else text
+
+
+class PromptBuild:
+    """An assembled prompt and how it was fitted to the budget"""
+
+    def __init__(self, text: str, tokens: int, budget: int, omitted: Dict[str, int]):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.omitted = omitted
+
+    @property
+    def truncated(self) -> bool:
+        return any(self.omitted.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.tokens,
+            "prompt_token_budget": self.budget,
+            "prompt_truncated": self.truncated,
+            "prompt_omitted": self.omitted
+        }
+
+
+class PromptBuilder:
+    def __init__(self, token_budget: int = 2000, max_memories: int = 3, memory_chars: int = 200, interpretation_chars: int = 160, trend_engine: Optional[TrendEngine] = None):
+        self.token_budget = token_budget
+        self.trend_engine = trend_engine or TrendEngine()
+        self.max_memories = max_memories
+        self.memory_chars = memory_chars
+        self.interpretation_chars = interpretation_chars
+
+    def build(self, query: str, lab_data: Dict[str, Any], health_context: Dict[str, Any], memory_context: List[Dict[str, Any]]) -> PromptBuild:
+        trends = health_context.get('trends') or {}
+        summary = health_context.get('trend_summary')
+        if summary is None:
+            summary = self.trend_engine.summarize(trends)
+        latest_by_key = {normalize_biomarker(name): stats["latest"] for name, stats in summary.items()}
+
+        lab_items = self._lab_items(lab_data, latest_by_key)
+        trend_lines = self._trend_lines(summary, trends, lab_data)
+        memory_lines = [
+            f"- {memory.get('role', 'unknown')}: {_truncate(str(memory.get('content', '')), self.memory_chars)}"
+            for memory in memory_context[-self.max_memories:]
+        ] if self.max_memories > 0 else []
+
+        # Candidates in admission order: (section, index within section, text)
+        candidates: List[Tuple[str, Any, str]] = []
+        candidates += [("lab", index, text) for index, (text, important) in enumerate(lab_items) if important]
+        candidates += [("trends", index, line) for index, (line, _, important) in enumerate(trend_lines) if important]
+        candidates += [("lab", index, text) for index, (text, important) in enumerate(lab_items) if not important]
+        candidates += [("memory", index, line) for index, line in reversed(list(enumerate(memory_lines)))]
+        candidates += [("trends", index, line) for index, (line, _, important) in enumerate(trend_lines) if not important]
+        candidates += [("interpretations", index, line) for index, (_, line, _) in enumerate(trend_lines) if line]
+
+        header = ["CONTEXTUAL HEALTH ANALYSIS REQUEST", f"Current Query: {query}"]
+        # Headroom for the omission note, which is only known once admission is done
+        note_reserve = 32
+        fixed = estimate_tokens("\n".join(header + INSTRUCTIONS))
+        remaining = self.token_budget - fixed - note_reserve
+        if remaining < 0:
+            # The query alone overruns the budget: keep its head, drop every optional section
+            query_tokens = max(estimate_tokens(query) + remaining, 0)
+            header[1] = f"Current Query: {_truncate(query, query_tokens * 4)}"
+            remaining = 0
+
+        headings = {"lab": LAB_HEADING, "trends": JOURNEY_HEADING, "memory": MEMORY_HEADING}
+        admitted: Dict[str, set] = {"lab": set(), "trends": set(), "memory": set(), "interpretations": set()}
+        omitted = {"lab": 0, "trends": 0, "memory": 0, "interpretations": 0}
+        for section, index, text in candidates:
+            # Once a section overflows, its lower-priority lines are dropped too, so a short
+            # low-value line never displaces a longer high-value one
+            if omitted[section] or (section == "interpretations" and index not in admitted["trends"]):
+                omitted[section] += 1
+                continue
+            # Lab values share one line joined by "; ", costing one extra token each
+            cost = estimate_tokens(text) + (1 if section == "lab" else 0)
+            heading = headings.get(section)
+            if heading is not None and not admitted[section]:
+                cost += estimate_tokens(heading)
+            if cost > remaining:
+                omitted[section] += 1
+                continue
+            admitted[section].add(index)
+            remaining -= cost
+
+        parts = list(header)
+        if admitted["lab"]:
+            parts.append(LAB_HEADING + " " + "; ".join(text for index, (text, _) in enumerate(lab_items) if index in admitted["lab"]))
+        if admitted["trends"]:
+            parts.append(JOURNEY_HEADING)
+            for index, (line, interpretation, _) in enumerate(trend_lines):
+                if index in admitted["trends"]:
+                    parts.append(line)
+                    if index in admitted["interpretations"]:
+                        parts.append(interpretation)
+        if admitted["memory"]:
+            parts.append(MEMORY_HEADING)
+            parts.extend(line for index, line in enumerate(memory_lines) if index in admitted["memory"])
+        if any(omitted.values()):
+            dropped = ", ".join(f"{count} {section}" for section, count in omitted.items() if count)
+            parts.append(f"[Omitted for length: {dropped}]")
+        parts.extend(INSTRUCTIONS)
+
+        text = "\n".join(parts)
+        return PromptBuild(text, estimate_tokens(text), self.token_budget, omitted)
+
+    def _lab_items(self, lab_data: Dict[str, Any], latest_by_key: Dict[str, float]) -> List[Tuple[str, bool]]:
+        """``name=value`` items, out-of-range first (most severe first), then changed, then the rest"""
+        ranked = []
+        for position, (name, raw) in enumerate(lab_data.items()):
+            value = _number(raw)
+            if value is None:
+                encoded = raw if isinstance(raw, str) else json.dumps(raw, separators=(",", ":"), default=str)
+                ranked.append(((3, 0.0, position), f"{name}={encoded}", False))
+                continue
+            text = f"{name}={_fmt(value)}"
+            deviation = range_deviation(name, value)
+            previous = latest_by_key.get(normalize_biomarker(name))
+            change = abs(value - previous) / abs(previous) if previous else 0.0
+            if deviation:
+                bounds = optimal_range(name)
+                flag = "L" if deviation < 0 else "H"
+                text += f" [{flag}; opt {_fmt(bounds['min'])}-{_fmt(bounds['max'])}]"
+                ranked.append(((0, -abs(deviation), position), text, True))
+            elif change >= STABLE_CHANGE:
+                ranked.append(((1, -change, position), text, False))
+            else:
+                ranked.append(((2, 0.0, position), text, False))
+        ranked.sort(key=lambda item: item[0])
+        return [(text, important) for _, text, important in ranked]
+
+    def _trend_lines(self, summary: Dict[str, Dict[str, Any]], trends: Dict[str, List[Dict[str, Any]]], lab_data: Dict[str, Any]) -> List[Tuple[str, Optional[str], bool]]:
+        """``(line, interpretation line, important)`` per biomarker, highest priority first
+
+        A trend is important when its latest reading is out of range or it is moving; worsening
+        trends rank first, then improving ones, with ties broken on panel membership, distance
+        from the optimal range, size of change and name.
+        """
+        in_panel = {normalize_biomarker(name) for name in lab_data}
+        ranked = []
+        for name, stats in summary.items():
+            status = "" if stats["status"] == "unknown" else f" {stats['status']}"
+            if stats["readings"] < 2:
+                line = f"- {name}: {_fmt(stats['latest'])}{status} (first measurement)"
+            else:
+                assessment = f" ({stats['assessment']})" if stats["assessment"] in ("improving", "worsening") else ""
+                unit = "/day" if stats["slope_unit"] == "per_day" else "/reading"
+                details = [f"slope {_fmt(stats['slope'], '+.3g')}{unit}", f"EWMA {_fmt(stats['ewma'])}"]
+                if stats["volatility"] is not None:
+                    details.append(f"volatility {stats['volatility']:.0%}")
+                if stats["rate_of_change"] is not None:
+                    details.append(f"{stats['rate_of_change']:+.0%} over {stats['readings']} readings")
+                line = f"- {name}: {_fmt(stats['latest'])}{status}, {stats['direction']}{assessment}; " + ", ".join(details)
+            deviation = (range_deviation(name, stats["latest"]) if stats["latest"] is not None else None) or 0.0
+            important = bool(deviation) or stats["direction"] != "stable"
+            series = trends.get(name) or [{}]
+            interpretation = series[-1].get('interpretation')
+            interpretation_line = f"  Previous Ray Peat interpretation: {_truncate(str(interpretation), self.interpretation_chars)}" if interpretation else None
+            key = (
+                not important,
+                ASSESSMENT_RANK.get(stats["assessment"], 2),
+                normalize_biomarker(name) not in in_panel,
+                -abs(deviation),
+                -abs(stats["rate_of_change"] or 0.0),
+                name
+            )
+            ranked.append((key, line, interpretation_line, important))
+        ranked.sort(key=lambda item: item[0])
+        return [(line, interpretation, important) for _, line, interpretation, important in ranked]
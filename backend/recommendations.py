@@ -0,0 +1,115 @@
+"""
+Recommendation extraction for the Memory-Enhanced API
+All keywords are compiled into one alternation, so the analysis text is scanned once. Each
+sentence is scored by the keywords it contains and how early it appears. Near-duplicate
+sentences are collapsed, and the results are cached per analysis text.
+"""
+
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Tuple
+
+from caching import MISSING, TTLCache
+
+# Keyword stem -> strength; stems match at word starts ("avoiding", "suggested")
+KEYWORD_STRENGTHS = {
+    "recommend": 3.0,
+    "suggest": 2.5,
+    "avoid": 2.0,
+    "increase": 2.0,
+    "decrease": 2.0,
+    "consider": 1.5,
+    "try": 1.0,
+}
+
+_KEYWORDS = re.compile(r"\b(" + "|".join(sorted(KEYWORD_STRENGTHS, key=len, reverse=True)) + r")", re.IGNORECASE)
+# Sentences end at a line break or at terminal punctuation followed by whitespace ("2.5 mg" stays whole)
+_SENTENCES = re.compile(r"(?:[^\n.!?]|[.!?](?=\S))+[.!?]*")
+_BULLET = re.compile(r"^(?:[-*•]+|\d+[.)])\s*")
+_WORDS = re.compile(r"[a-z0-9]+")
+
+# Sentence shorter than this is not a recommendation on its own
+MIN_LENGTH = 10
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class RecommendationExtractor:
+    """Rank keyword-bearing sentences and keep the top ``limit``
+
+    Score = sum of distinct keyword strengths + ``lead_bonus`` when the sentence opens with a
+    keyword + up to ``position_weight`` for appearing early in the text. Sentences whose word
+    sets overlap an already selected one by ``duplicate_threshold`` (Jaccard) or more are skipped.
+    """
+
+    def __init__(self, limit: int = 5, position_weight: float = 1.0, lead_bonus: float = 1.0, duplicate_threshold: float = 0.8, cache_entries: int = 1024, cache_ttl: float = 3600.0):
+        self.limit = limit
+        self.position_weight = position_weight
+        self.lead_bonus = lead_bonus
+        self.duplicate_threshold = duplicate_threshold
+        self.cache = TTLCache(
+            "recommendations",
+            ttl=cache_ttl,
+            max_entries=cache_entries,
+            sizeof=lambda value: sum(len(item) for item in value)
+        )
+
+    def extract(self, analysis_text: str) -> List[str]:
+        cached = self.cache.get(analysis_text)
+        if cached is not MISSING:
+            return list(cached)
+        recommendations = self._extract(analysis_text)
+        self.cache.set(analysis_text, tuple(recommendations))
+        return recommendations
+
+    def _extract(self, text: str) -> List[str]:
+        if not text:
+            return []
+        spans = [(match.start(), match.end()) for match in _SENTENCES.finditer(text)]
+        starts = [start for start, _ in spans]
+
+        # Single keyword pass: attribute each hit to the sentence containing it
+        hits: Dict[int, Dict[str, int]] = {}
+        for match in _KEYWORDS.finditer(text):
+            index = bisect_right(starts, match.start()) - 1
+            if index < 0:
+                continue
+            keyword = match.group(1).lower()
+            hits.setdefault(index, {}).setdefault(keyword, match.start())
+
+        candidates: List[Tuple[float, int, str]] = []
+        length = len(text)
+        for index, keywords in hits.items():
+            start, end = spans[index]
+            raw = text[start:end]
+            stripped = raw.strip()
+            bullet = _BULLET.match(stripped)
+            sentence = stripped[bullet.end():] if bullet else stripped
+            if len(sentence) <= MIN_LENGTH:
+                continue
+            score = sum(KEYWORD_STRENGTHS[keyword] for keyword in keywords)
+            lead = start + (len(raw) - len(raw.lstrip())) + (bullet.end() if bullet else 0)
+            if min(keywords.values()) == lead:
+                score += self.lead_bonus
+            score += self.position_weight * (1.0 - start / length)
+            candidates.append((-score, start, sentence))
+        candidates.sort()
+
+        selected: List[str] = []
+        selected_words: List[frozenset] = []
+        for _, _, sentence in candidates:
+            words = frozenset(_WORDS.findall(sentence.lower()))
+            if any(_similarity(words, other) >= self.duplicate_threshold for other in selected_words):
+                continue
+            selected.append(sentence)
+            selected_words.append(words)
+            if len(selected) == self.limit:
+                break
+        return selected
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
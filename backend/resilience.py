@@ -0,0 +1,143 @@
+"""
+Circuit breakers and adaptive timeouts for upstream calls
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} upstream circuit is open; retry in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by consecutive failures
+
+    After ``failure_threshold`` consecutive failures the breaker opens and every call fails
+    fast for ``recovery_timeout`` seconds. It then lets up to ``half_open_max_calls`` trial
+    calls through: a success closes it again, a failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 10.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self) -> bool:
+        """Raise ``CircuitOpenError`` if the call must not go upstream
+
+        Returns True when the call is a half-open trial.
+        """
+        if self.state == CLOSED:
+            return False
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self.opened_at + self.recovery_timeout - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+        if self.half_open_calls >= self.half_open_max_calls:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.recovery_timeout)
+        self.half_open_calls += 1
+        return True
+
+    def release(self):
+        """Give back a half-open trial slot whose call was cancelled before it completed"""
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.half_open_calls = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.half_open_calls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class AdaptiveTimeout:
+    """Timeout derived from recently observed latency percentiles
+
+    ``current()`` returns ``percentile latency * multiplier`` clamped to
+    ``[min_timeout, max_timeout]``; until ``min_samples`` calls have been seen it
+    returns ``max_timeout`` (the statically configured timeout). A call that timed out is
+    recorded as a censored sample at the timeout it was given, so when latency rises above
+    the current timeout the percentile, and with it the timeout, grows until calls succeed.
+    """
+
+    def __init__(self, max_timeout: float, min_timeout: float = 0.5, multiplier: float = 3.0, percentile: float = 0.99, window: int = 256, min_samples: int = 20):
+        self.max_timeout = max_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.multiplier = multiplier
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def observe_timeout(self, timeout: float):
+        """Record a call cut off after ``timeout`` seconds (its real latency is at least that)"""
+        self.observe(timeout)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        index = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+        return self._sorted[index]
+
+    def current(self) -> float:
+        if len(self._samples) < self.min_samples:
+            return self.max_timeout
+        timeout = self.quantile(self.percentile) * self.multiplier
+        return max(self.min_timeout, min(self.max_timeout, timeout))
+
+    def stats(self) -> Dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 2) if value is not None else None
+        return {
+            "timeout_seconds": round(self.current(), 3),
+            "samples": len(self._samples),
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99))
+        }
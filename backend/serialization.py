@@ -0,0 +1,38 @@
+"""
+Fast response serialization for the Memory-Enhanced API
+Responses the API assembles itself are built with ``model_construct`` (no re-validation) and
+encoded directly, bypassing FastAPI's validate-then-``jsonable_encoder`` response path. Uses
+``orjson`` when installed and compact stdlib JSON otherwise.
+"""
+
+import json
+from typing import Any, Dict
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # optional dependency
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a JSON-compatible value; unknown types fall back to ``str``"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def model_payload(model: BaseModel) -> Dict[str, Any]:
+    """Field values of a model whose fields already hold plain JSON data, without a model_dump walk"""
+    return dict(model.__dict__)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
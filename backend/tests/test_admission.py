@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionLimiter, AdmissionRejected
+
+
+def test_estimated_wait_scales_with_slot_release_rate():
+    limiter = AdmissionLimiter("analysis", concurrency=32, max_queue=64, max_wait=10.0)
+    limiter.service_time = 12.0
+    # One of 32 busy slots frees every 12 / 32 = 0.375s
+    assert limiter.estimated_wait(1) == pytest.approx(0.375)
+    assert limiter.estimated_wait(32) == pytest.approx(12.0)
+
+
+def test_first_waiter_is_queued_when_service_time_exceeds_deadline():
+    async def scenario():
+        limiter = AdmissionLimiter("analysis", concurrency=32, max_queue=64, max_wait=10.0)
+        limiter.service_time = 12.0
+        for _ in range(32):
+            await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.depth == 1
+        limiter.release(12.0)
+        assert await waiter >= 0.0
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.rejected == {}
+    assert limiter.in_flight == 32
+
+
+def test_waiter_beyond_deadline_is_shed_immediately():
+    async def scenario():
+        limiter = AdmissionLimiter("analysis", concurrency=2, max_queue=64, max_wait=10.0)
+        limiter.service_time = 12.0
+        await limiter.acquire()
+        await limiter.acquire()
+        # Position 2 waits 12s on average: 12 > 10
+        first = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        first.cancel()
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "deadline"
+    assert rejected.retry_after == pytest.approx(12.0)
+
+
+def test_queue_full_is_rejected():
+    async def scenario():
+        limiter = AdmissionLimiter("cheap", concurrency=1, max_queue=1, max_wait=10.0)
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        queued.cancel()
+        return rejected.value
+
+    assert asyncio.run(scenario()).reason == "queue_full"
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import memory_enhanced_api
+
+
+@pytest.fixture
+def client():
+    # No lifespan: only paths that answer before any upstream call are exercised here
+    return TestClient(memory_enhanced_api.app)
+
+
+def test_batch_reports_non_object_items_per_item(client):
+    response = client.post("/analyze-with-memory/batch", json=[5, "panel", {"query": "q"}])
+    assert response.status_code == 200
+    lines = [line for line in response.text.splitlines() if line]
+    assert [json.loads(line)["index"] for line in lines] == [0, 1, 2]
+    assert all(json.loads(line)["status_code"] == 422 for line in lines)
+
+
+def test_batch_body_must_be_an_array(client):
+    assert client.post("/analyze-with-memory/batch", json={"query": "q"}).status_code == 422
+
+
+def test_truncated_rag_stream_is_flagged_and_not_persisted(monkeypatch):
+    api = memory_enhanced_api.memory_api
+    persisted = []
+
+    async def gather_context(*args, **kwargs):
+        return {"trends": {}}, [], {}
+
+    async def stream_rag(prompt):
+        yield "chunk", "I recommend "
+        yield "truncated", "connection reset"
+        yield "response", {"analysis": "I recommend ", "sources": [], "partial": True}
+
+    async def persist(*args, **kwargs):
+        persisted.append(args)
+
+    monkeypatch.setattr(api, "_gather_context", gather_context)
+    monkeypatch.setattr(api, "_stream_rag_analysis", stream_rag)
+    monkeypatch.setattr(api, "_persist_interaction", persist)
+
+    async def collect():
+        request = memory_enhanced_api.LabAnalysisRequest(user_id="u1", query="q", lab_data={"TSH": 2.0})
+        return [event async for event in api.stream_contextual_analysis(request)]
+
+    events = asyncio.run(collect())
+    names = [event.split("\n", 1)[0] for event in events]
+    assert names == ["event: context", "event: chunk", "event: error"]
+    assert json.loads(events[-1].split("data: ", 1)[1])["partial"] is True
+    assert persisted == []
+
+
+def test_error_responses_carry_server_timing(client, monkeypatch):
+    async def unavailable(request):
+        raise memory_enhanced_api.HTTPException(status_code=503, detail="rag upstream circuit is open")
+
+    monkeypatch.setattr(memory_enhanced_api.memory_api, "create_contextual_analysis", unavailable)
+    response = client.post(
+        "/analyze-with-memory",
+        json={"user_id": "u1", "query": "q", "lab_data": {"TSH": 2.0}},
+        headers={"X-Request-ID": "req-7"}
+    )
+    assert response.status_code == 503
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert response.headers["X-Request-ID"] == "req-7"
+
+
+def test_journey_retry_skips_biomarkers_the_fallback_already_wrote(monkeypatch):
+    api = memory_enhanced_api.memory_api
+    posts = []
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise RuntimeError(f"HTTP {self.status_code}")
+
+    class Memory:
+        async def post(self, path, endpoint=None, json=None):
+            if path.endswith("/batch"):
+                return Response(404)
+            posts.append(json["biomarker_type"])
+            return Response(500 if json["biomarker_type"] == "T3" and posts.count("T3") == 1 else 200)
+
+    class Progress:
+        def __init__(self):
+            self.steps = []
+
+        def done(self, step):
+            return step in self.steps
+
+        def complete(self, step):
+            self.steps.append(step)
+
+    monkeypatch.setattr(api, "memory", Memory())
+    monkeypatch.setattr(api, "journey_batch_supported", True)
+    progress = Progress()
+
+    async def attempt():
+        await api._update_health_journey("u1", "s1", {"TSH": 2.0, "T3": 3.1, "T4": 1.2}, {"analysis": ""}, recommendations=[], progress=progress)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(attempt())
+    asyncio.run(attempt())
+    assert posts == ["TSH", "T3", "T3", "T4"]
+    assert progress.steps == ["journey:TSH", "journey:T3", "journey:T4", "journey"]
+
+
+def test_batch_starts_shared_lookups_inside_the_concurrency_limit(monkeypatch):
+    api = memory_enhanced_api.memory_api
+    events = []
+
+    async def ensure_session(user_id, session_id):
+        events.append(f"session {user_id}")
+
+    async def journey_context(user_id):
+        events.append(f"journey {user_id}")
+        return {"trends": {}}
+
+    async def analyse(request, session_id, shared_context):
+        await asyncio.gather(*shared_context.values())
+        events.append(f"analysis {request.user_id}")
+        raise memory_enhanced_api.HTTPException(status_code=503, detail="unavailable")
+
+    monkeypatch.setattr(api, "_ensure_user_session", ensure_session)
+    monkeypatch.setattr(api, "_get_health_journey_context", journey_context)
+    monkeypatch.setattr(api, "create_contextual_analysis", analyse)
+    items = [
+        {"user_id": "u1", "session_id": "s1", "query": "q", "lab_data": {}},
+        {"user_id": "u1", "session_id": "s1", "query": "q", "lab_data": {}},
+        {"user_id": "u2", "session_id": "s2", "query": "q", "lab_data": {}, "include_context": False}
+    ]
+
+    async def collect():
+        return [line async for line in api.stream_batch_analysis(items, concurrency=1)]
+
+    assert len(asyncio.run(collect())) == 3
+    assert events == ["session u1", "journey u1", "analysis u1", "analysis u1", "session u2", "analysis u2"]
+
+
+def test_health_stays_cheap_and_stats_carry_the_counters(client):
+    health = client.get("/health").json()
+    assert health["status"] == "healthy"
+    assert "caches" not in health and "write_behind" not in health
+    stats = client.get("/stats").json()
+    assert {"upstream_pools", "write_behind", "journey_writes", "caches", "tracing"} <= set(stats)
+
+
+def test_context_lookups_run_concurrently_and_late_branches_degrade(monkeypatch):
+    api = memory_enhanced_api.memory_api
+
+    async def ensure_session(user_id, session_id):
+        await asyncio.sleep(0.05)
+
+    async def journey_context(user_id):
+        await asyncio.sleep(1.0)
+        return {"trends": {"TSH": []}}
+
+    async def memory_context(session_id, query):
+        await asyncio.sleep(0.05)
+        return [{"role": "user", "content": "earlier"}]
+
+    monkeypatch.setattr(api, "_ensure_user_session", ensure_session)
+    monkeypatch.setattr(api, "_get_health_journey_context", journey_context)
+    monkeypatch.setattr(api, "_get_memory_context", memory_context)
+    monkeypatch.setitem(api.context_budgets, "health_journey", 0.1)
+
+    async def gather():
+        started = time.perf_counter()
+        result = await api._gather_context("u1", "s1", "q", include_context=True)
+        return result, time.perf_counter() - started
+
+    (journey, memories, sources), elapsed = asyncio.run(gather())
+    assert journey == {"trends": {}}
+    assert memories == [{"role": "user", "content": "earlier"}]
+    assert sources["health_journey"]["status"] == "timeout"
+    assert sources["session"]["status"] == sources["memory"]["status"] == "ok"
+    # The slowest branch's budget, not the sum of the lookups
+    assert elapsed < 0.2
+
+
+def test_confirmed_sessions_are_not_upserted_again(monkeypatch):
+    api = memory_enhanced_api.memory_api
+    posts = []
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    class Memory:
+        async def post(self, path, endpoint=None, json=None):
+            posts.append(json["session_id"])
+            await asyncio.sleep(0.01)
+            return Response(500 if json["session_id"] == "failing" else 200)
+
+    monkeypatch.setattr(api, "memory", Memory())
+
+    async def scenario():
+        await asyncio.gather(*[api._ensure_user_session("known-u1", "s1") for _ in range(3)])
+        await api._ensure_user_session("known-u1", "s1")
+        await api._ensure_user_session("known-u1", "failing")
+        await api._ensure_user_session("known-u1", "failing")
+
+    asyncio.run(scenario())
+    # Concurrent first calls share one upsert; a failed upsert is not remembered
+    assert posts == ["s1", "failing", "failing"]
@@ -0,0 +1,131 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from caching import MISSING, SingleFlight, SQLiteCacheTier, TTLCache, TieredCache, group_key
+
+
+@pytest.fixture
+def tier(tmp_path):
+    tier = SQLiteCacheTier(str(tmp_path / "cache.db"), "rag")
+    yield tier
+    tier.close()
+
+
+def test_promotion_is_capped_at_remaining_disk_ttl(tier):
+    cache = TieredCache(TTLCache("rag", ttl=60.0), tier, l2_ttl=60.0)
+    tier.set("k", {"analysis": "x"}, ttl=2.0)
+    assert asyncio.run(cache.get("k")) == {"analysis": "x"}
+    _, expires_at, _, _ = cache.l1._entries["k"]
+    assert expires_at - time.monotonic() <= 2.0
+
+
+def test_disk_errors_do_not_lose_fetched_values(tier):
+    cache = TieredCache(TTLCache("rag", ttl=60.0), tier)
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    tier.set = locked
+    tier.lookup = locked
+    tier.generation = locked
+    assert asyncio.run(cache.set("k", {"analysis": "x"})) is False
+    # The first tier still took the value
+    assert cache.l1.get("k") == {"analysis": "x"}
+    assert asyncio.run(cache.get("missing")) is MISSING
+    assert asyncio.run(cache.generation("u1"))[1] == -1
+
+
+def test_group_invalidation_fences_stale_writes(tier):
+    cache = TieredCache(TTLCache("journey", ttl=60.0), tier)
+
+    async def scenario():
+        generation = await cache.generation("u1")
+        await cache.invalidate_group("u1")
+        stored = await cache.set(group_key("u1", 30), {"trends": {}}, group="u1", generation=generation)
+        return stored, await cache.get(group_key("u1", 30), group="u1")
+
+    stored, value = asyncio.run(scenario())
+    assert stored is False
+    assert value is MISSING
+
+
+def test_disk_stats_do_not_query_the_file(tier):
+    tier.set("k", 1, ttl=60.0)
+    tier.get("k")
+    tier._conn.close()
+    stats = tier.stats()
+    assert stats["writes"] == 1
+    assert stats["hits"] == 1
+
+
+def test_ttl_cache_fences_writes_that_raced_an_invalidation():
+    cache = TTLCache("journey", ttl=60.0)
+    generation = cache.generation("u1")
+    cache.invalidate_group("u1")
+    assert cache.set(group_key("u1", 30), {"trends": {}}, group="u1", generation=generation) is False
+    assert cache.set(group_key("u1", 30), {"trends": {}}, group="u1", generation=cache.generation("u1")) is True
+
+
+def test_ttl_cache_evicts_to_its_byte_bound():
+    cache = TTLCache("rag", ttl=60.0, max_bytes=100, sizeof=lambda value: 40)
+    for key in "abc":
+        cache.set(key, key)
+    assert len(cache) == 2
+    assert cache.get("a") is MISSING
+    assert cache.evictions == 1
+
+
+def test_single_flight_shares_one_call_and_survives_waiter_cancellation():
+    calls = []
+
+    async def scenario():
+        flights = SingleFlight("rag")
+        release = asyncio.Event()
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return {"analysis": "x"}
+
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return flights, await second
+
+    flights, result = asyncio.run(scenario())
+    assert result == {"analysis": "x"}
+    assert calls == [1]
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 1, "cancelled_waiters": 1}
+
+
+def test_single_flight_propagates_errors_to_every_waiter():
+    async def scenario():
+        flights = SingleFlight("journey")
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        return await asyncio.gather(flights.do("k", fail), flights.do("k", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_disk_tier_purges_expired_rows_and_caps_its_size(tmp_path):
+    tier = SQLiteCacheTier(str(tmp_path / "cache.db"), "rag", max_entries=3, purge_every=6)
+    tier.set("stale", 1, ttl=-1.0)
+    assert tier.lookup("stale") == (MISSING, 0.0)
+    assert tier.purged == 1
+    for index in range(5):
+        tier.set(f"k{index}", index, ttl=60.0 + index)
+    # The sixth write purged the namespace down to its cap, soonest-expiring first
+    assert tier.evicted == 2
+    assert [tier.get(f"k{index}") for index in range(5)] == [MISSING, MISSING, 2, 3, 4]
+    tier.close()
@@ -0,0 +1,48 @@
+import asyncio
+
+import conditional
+from conditional import ContentVersions, etag_matches
+
+
+def test_etag_matches_weak_and_wildcard():
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_write_changes_the_tag():
+    versions = ContentVersions()
+
+    async def scenario():
+        before = versions.etag("session", "s1", await versions.get("session", "s1"), 10)
+        await versions.bump("session", "s1")
+        after = versions.etag("session", "s1", await versions.get("session", "s1"), 10)
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert before != after
+
+
+def test_tag_rolls_over_after_max_staleness(monkeypatch):
+    versions = ContentVersions(max_staleness=60.0)
+    monkeypatch.setattr(conditional.time, "time", lambda: 1000.0)
+    first = versions.etag("journey", "u1", 0, 30)
+    monkeypatch.setattr(conditional.time, "time", lambda: 1019.0)
+    assert versions.etag("journey", "u1", 0, 30) == first
+    # A write this process never saw stays hidden behind 304s for at most one bucket
+    monkeypatch.setattr(conditional.time, "time", lambda: 1021.0)
+    assert versions.etag("journey", "u1", 0, 30) != first
+
+
+def test_evicted_resources_never_match_an_older_version():
+    versions = ContentVersions(max_entries=1)
+
+    async def scenario():
+        await versions.bump("session", "s1")
+        version = await versions.get("session", "s1")
+        await versions.bump("session", "s2")
+        return version, await versions.get("session", "s1")
+
+    before, after = asyncio.run(scenario())
+    assert after >= before
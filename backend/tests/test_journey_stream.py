@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from journey_stream import TrendsNDJSONScanner
+
+BODY = json.dumps({
+    "user_id": "u1",
+    "trends": {
+        "TSH": [{"value": 2.1, "note": "after \"fasting\" {x}"}, {"value": 1.8, "note": "a\\b"}],
+        "glucose": [{"value": 90, "tags": ["[am]", "fed"]}]
+    },
+    "summary": {"trends": "not this one"}
+}, indent=2).encode()
+
+
+def scan(body, size):
+    scanner = TrendsNDJSONScanner()
+    out = b"".join(scanner.feed(body[start:start + size]) for start in range(0, len(body), size))
+    scanner.close()
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(BODY)])
+def test_series_are_emitted_one_per_line_whatever_the_chunking(size):
+    lines = [json.loads(line) for line in scan(BODY, size).splitlines()]
+    assert [line["biomarker"] for line in lines] == ["TSH", "glucose"]
+    assert lines[0]["series"][0]["note"] == 'after "fasting" {x}'
+    assert lines[0]["series"][1]["note"] == "a\\b"
+    assert lines[1]["series"] == [{"value": 90, "tags": ["[am]", "fed"]}]
+
+
+def test_truncated_body_is_rejected():
+    scanner = TrendsNDJSONScanner()
+    scanner.feed(BODY[:len(BODY) // 2])
+    with pytest.raises(ValueError):
+        scanner.close()
@@ -0,0 +1,69 @@
+import asyncio
+
+from journey_writes import JourneyWriteCoalescer, build_journey_batch, expand_journey_batch
+
+
+def part(session_id, value):
+    return (
+        {"session_id": session_id, "ray_peat_interpretation": "x", "recommendations": [], "metadata": {}},
+        [{"biomarker_type": "TSH", "biomarker_value": value}]
+    )
+
+
+def test_batch_deduplicates_analyses_and_expands_back():
+    analysis, entries = part("s1", 2.0)
+    batch = build_journey_batch([{"analysis": analysis, "entries": entries}, {"analysis": analysis, "entries": entries}])
+    assert len(batch["analyses"]) == 1
+    assert [payload["biomarker_value"] for payload in expand_journey_batch(batch)] == [2.0, 2.0]
+
+
+def test_failure_fans_out_to_every_coalesced_caller():
+    sent = []
+
+    async def send(user_id, batch, entry_sent):
+        raise RuntimeError("memory service down")
+
+    async def scenario():
+        writer = JourneyWriteCoalescer(send, window=0.01)
+        results = await asyncio.gather(
+            writer.submit("u1", *part("s1", 1.0), on_sent=lambda: sent.append("s1")),
+            writer.submit("u1", *part("s2", 2.0), on_sent=lambda: sent.append("s2")),
+            return_exceptions=True
+        )
+        return writer, results
+
+    writer, results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert writer.batches_sent == 0
+    assert sent == []
+
+
+def test_cancelled_submission_is_dropped_and_sent_one_is_recorded():
+    batches = []
+    sent = []
+    sending = None
+
+    async def send(user_id, batch, entry_sent):
+        batches.append(batch)
+        await sending.wait()
+
+    async def scenario():
+        nonlocal sending
+        sending = asyncio.Event()
+        writer = JourneyWriteCoalescer(send, window=0.01)
+        dropped = asyncio.ensure_future(writer.submit("u1", *part("s1", 1.0), on_sent=lambda: sent.append("s1")))
+        kept = asyncio.ensure_future(writer.submit("u1", *part("s2", 2.0), on_sent=lambda: sent.append("s2")))
+        await asyncio.sleep(0)
+        dropped.cancel()
+        await asyncio.sleep(0.05)
+        # The batch is under way; its caller goes away before it completes
+        kept.cancel()
+        sending.set()
+        await writer.flush_all()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert len(batches) == 1
+    assert [entry["biomarker_value"] for entry in batches[0]["entries"]] == [2.0]
+    assert sent == ["s2"]
+    assert writer.entries_sent == 1
@@ -0,0 +1,45 @@
+import memory_index
+from memory_index import MemoryIndex
+
+
+def message(role, content):
+    return {"role": role, "content": content}
+
+
+def test_cold_session_misses_until_hydrated():
+    index = MemoryIndex()
+    assert index.search("s1", "thyroid", 5) is None
+    assert index.begin_hydration("s1")
+    assert not index.begin_hydration("s1")
+    index.add("s1", message("user", "TSH is high, thyroid question"))
+    index.hydrate("s1", [message("user", "earlier thyroid panel"), message("assistant", "liver support")])
+    results = index.search("s1", "thyroid", 5)
+    assert [result["content"] for result in results] == ["earlier thyroid panel", "TSH is high, thyroid question"]
+
+
+def test_complete_session_lapses_and_picks_up_remote_writes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory_index.time, "monotonic", lambda: now[0])
+    index = MemoryIndex(refresh_after=60.0)
+    index.mark_complete("s1")
+    index.add("s1", message("user", "thyroid temperature"))
+    assert len(index.search("s1", "thyroid", 5)) == 1
+    now[0] += 61.0
+    # Another replica wrote to the session meanwhile: the index must not answer alone
+    assert index.search("s1", "thyroid", 5) is None
+    assert index.begin_hydration("s1")
+    index.hydrate("s1", [message("user", "thyroid temperature"), message("user", "thyroid from another replica")])
+    assert len(index.search("s1", "thyroid", 5)) == 2
+
+
+def test_full_history_window_drops_aged_out_local_messages():
+    index = MemoryIndex(max_documents=2, refresh_after=0)
+    index.mark_complete("s1")
+    index.add("s1", message("user", "oldest thyroid"))
+    index._sessions["s1"].complete = False
+    assert index.begin_hydration("s1")
+    index.add("s1", message("user", "newest thyroid"))
+    index.hydrate("s1", [message("user", "middle thyroid"), message("assistant", "recent thyroid")])
+    contents = [result["content"] for result in index.search("s1", "thyroid", 5)]
+    assert "oldest thyroid" not in contents
+    assert "newest thyroid" in contents
@@ -0,0 +1,42 @@
+from prompt_builder import PromptBuilder, estimate_tokens
+
+
+def test_same_day_readings_produce_a_prompt():
+    trends = {"TSH": [{"value": 3.0, "timestamp": "2024-01-01"}, {"value": 2.0, "timestamp": "2024-01-01"}]}
+    prompt = PromptBuilder().build("How is my thyroid?", {"TSH": 2.0}, {"trends": trends}, [])
+    assert "- TSH: 2 optimal, falling" in prompt.text
+    assert "slope -1/reading" in prompt.text
+
+
+def test_uncomputable_statistics_are_rendered_not_raised():
+    summary = {"TSH": {
+        "latest": None, "previous": None, "readings": 2, "slope": None, "slope_unit": "per_day",
+        "ewma": None, "volatility": None, "rate_of_change": None, "direction": "stable",
+        "status": "unknown", "assessment": "unknown", "optimal_range": None
+    }}
+    prompt = PromptBuilder().build("q", {}, {"trends": {}, "trend_summary": summary}, [])
+    assert "slope n/a/day, EWMA n/a" in prompt.text
+
+
+def test_out_of_range_lab_values_are_flagged_and_budget_is_respected():
+    lab = {f"marker_{index}": index for index in range(200)}
+    lab["TSH"] = 4.2
+    prompt = PromptBuilder(token_budget=200).build("q", lab, {"trends": {}}, [])
+    assert "TSH=4.2 [H; opt 0.5-2]" in prompt.text
+    assert prompt.truncated
+    assert prompt.tokens == estimate_tokens(prompt.text)
+    assert prompt.tokens <= 200
+
+
+def test_flagged_values_outrank_conversation_history_under_a_tight_budget():
+    memories = [{"role": "user", "content": f"{turn} " + "x " * 100} for turn in ("first", "second", "third")]
+    roomy = PromptBuilder(token_budget=2000).build("q", {"TSH": 4.2}, {"trends": {}}, memories)
+    assert not roomy.truncated
+    assert roomy.text.count("- user:") == 3
+    tight = PromptBuilder(token_budget=roomy.tokens - 60).build("q", {"TSH": 4.2}, {"trends": {}}, memories)
+    assert "TSH=4.2 [H; opt 0.5-2]" in tight.text
+    # The oldest memories are dropped first
+    assert "- user: third" in tight.text
+    assert "- user: first" not in tight.text
+    assert tight.omitted["memory"] >= 1
+    assert "[Omitted for length:" in tight.text
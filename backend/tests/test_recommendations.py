@@ -0,0 +1,34 @@
+from recommendations import RecommendationExtractor
+
+
+def test_sentences_are_ranked_by_keyword_strength_and_position():
+    text = (
+        "Your thyroid markers look low. Try more salt with meals. "
+        "I recommend 2.5 mg of thyroid with breakfast.\n"
+        "- Avoid polyunsaturated oils where you can."
+    )
+    assert RecommendationExtractor().extract(text) == [
+        "I recommend 2.5 mg of thyroid with breakfast.",
+        "Avoid polyunsaturated oils where you can.",
+        "Try more salt with meals."
+    ]
+
+
+def test_near_duplicates_are_collapsed_and_limit_applies():
+    text = (
+        "Consider adding gelatin to meals. Consider adding gelatin to your meals. "
+        "Increase calcium from milk. Suggest retesting in eight weeks."
+    )
+    recommendations = RecommendationExtractor().extract(text)
+    assert len(recommendations) == 3
+    assert "Consider adding gelatin to your meals." not in recommendations
+    assert len(RecommendationExtractor(limit=2).extract(text)) == 2
+
+
+def test_results_are_cached_per_analysis_text():
+    extractor = RecommendationExtractor()
+    first = extractor.extract("I recommend more orange juice.")
+    first.append("mutated by the caller")
+    assert extractor.extract("I recommend more orange juice.") == ["I recommend more orange juice."]
+    assert extractor.stats()["hits"] == 1
+    assert extractor.extract("") == []
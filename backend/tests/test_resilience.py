@@ -0,0 +1,111 @@
+import asyncio
+
+import httpx
+import pytest
+
+from resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError, HALF_OPEN, OPEN
+from upstreams import UpstreamClient, UpstreamConfig, call_budget
+
+
+def test_adaptive_timeout_recovers_when_latency_rises_above_it():
+    timeout = AdaptiveTimeout(5.0, 0.5, 3.0)
+    for _ in range(50):
+        timeout.observe(0.05)
+    assert timeout.current() == 0.5
+    # The upstream settles at 1s: every call is cut off at the current timeout
+    for _ in range(20):
+        current = timeout.current()
+        if current > 1.0:
+            break
+        timeout.observe_timeout(current)
+    assert timeout.current() > 1.0
+    for _ in range(50):
+        timeout.observe(1.0)
+    assert timeout.current() == 3.0
+
+
+def test_breaker_reports_half_open_trial():
+    breaker = CircuitBreaker("rag", failure_threshold=1, recovery_timeout=0.0)
+    assert breaker.before_call() is False
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.before_call() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_upstream_times_out_adaptively_and_trials_with_configured_timeout():
+    timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        read = request.extensions["timeout"]["read"]
+        timeouts.append(read)
+        if read < 1.0:
+            raise httpx.ReadTimeout("slow upstream", request=request)
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        config = UpstreamConfig(name="rag", base_url="http://rag.test", timeout=5.0, breaker_failures=1, breaker_recovery=0.0)
+        upstream = UpstreamClient(config)
+        upstream._client = httpx.AsyncClient(base_url=config.base_url, transport=httpx.MockTransport(handler))
+        for _ in range(50):
+            upstream.adaptive_timeout("GET").observe(0.05)
+        with pytest.raises(httpx.ReadTimeout):
+            await upstream.get("/health")
+        assert upstream.breaker.state == OPEN
+        # The breaker is open with no recovery delay: the next call is a half-open trial
+        response = await upstream.get("/health")
+        await upstream.close()
+        return upstream, response
+
+    upstream, response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert timeouts == [0.5, 5.0]
+    assert upstream.breaker.state == "closed"
+    assert upstream.adaptive_timeout("GET").stats()["samples"] == 52
+
+
+def test_endpoint_classes_keep_separate_latency_windows():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        config = UpstreamConfig(name="memory", base_url="http://memory.test", timeout=5.0)
+        upstream = UpstreamClient(config)
+        upstream._client = httpx.AsyncClient(base_url=config.base_url, transport=httpx.MockTransport(handler))
+        for _ in range(50):
+            upstream.adaptive_timeout("journey_batch").observe(1.5)
+        await upstream.post("/sessions/s1/search", endpoint="memory_search", json={})
+        await upstream.close()
+        return upstream
+
+    upstream = asyncio.run(scenario())
+    assert upstream.adaptive_timeout("memory_search").stats()["samples"] == 1
+    assert upstream.adaptive_timeout("journey_batch").current() == 4.5
+
+
+def test_call_cut_off_by_the_callers_budget_counts_as_a_timeout():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1.0)
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        config = UpstreamConfig(name="memory", base_url="http://memory.test", timeout=5.0, breaker_failures=2)
+        upstream = UpstreamClient(config)
+        upstream._client = httpx.AsyncClient(base_url=config.base_url, transport=httpx.MockTransport(handler))
+        with call_budget(0.05):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(upstream.post("/sessions/s1/search", endpoint="memory_search", json={}), timeout=0.05)
+        # Cancelled for another reason (e.g. the client went away): not the upstream's fault
+        task = asyncio.ensure_future(upstream.post("/sessions/s1/search", endpoint="memory_search", json={}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await upstream.close()
+        return upstream
+
+    upstream = asyncio.run(scenario())
+    assert upstream.errors_total == 1
+    assert upstream.breaker.stats()["consecutive_failures"] == 1
+    assert upstream.adaptive_timeout("memory_search").quantile(0.5) >= 0.04
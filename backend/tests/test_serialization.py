@@ -0,0 +1,41 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+import serialization
+from memory_enhanced_api import MemoryEnhancedResponse
+from serialization import FastJSONResponse, dumps, model_payload
+
+
+def response_fields():
+    return {
+        "analysis": "Thyroid looks low; increase salt.",
+        "sources": [{"content": "Ray Peat", "metadata": {"score": 0.9}}],
+        "context_used": {"health_trends": 2, "memory": {"status": "ok"}},
+        "personalized": True,
+        "session_id": "s1",
+        "recommendations": ["Increase salt."],
+        "health_trends": None,
+        "trend_summary": {"TSH": {"slope": -0.1}}
+    }
+
+
+def test_constructed_payload_matches_the_validated_dump():
+    fields = response_fields()
+    assert model_payload(MemoryEnhancedResponse.model_construct(**fields)) == MemoryEnhancedResponse(**fields).model_dump()
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_is_compact_and_falls_back_to_str(monkeypatch, use_orjson):
+    if use_orjson and not serialization.ORJSON_AVAILABLE:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(serialization, "ORJSON_AVAILABLE", use_orjson)
+    encoded = dumps({"dose": Decimal("2.50"), 7: ["é", 1]})
+    assert encoded == '{"dose":"2.50","7":["é",1]}'.encode("utf-8")
+
+
+def test_fast_response_renders_the_payload():
+    response = FastJSONResponse(response_fields())
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == response_fields()
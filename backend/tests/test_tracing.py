@@ -0,0 +1,34 @@
+import json
+
+from tracing import Tracer, record_span, sanitize_request_id
+
+
+def test_request_ids_are_sanitised():
+    assert sanitize_request_id("req-42.a:b_c") == "req-42.a:b_c"
+    assert sanitize_request_id("bad\r\nX-Injected: 1") is None
+    assert sanitize_request_id("x" * 129) is None
+    assert sanitize_request_id(None) is None
+
+
+def test_forcing_requires_the_configured_token(tmp_path):
+    assert not Tracer(str(tmp_path / "t.jsonl")).forced("1")
+    tracer = Tracer(str(tmp_path / "t.jsonl"), force_token="s3cret")
+    assert tracer.forced("s3cret")
+    assert not tracer.forced("1")
+    assert not tracer.forced(None)
+
+
+def test_kept_traces_are_written_by_the_writer_thread(tmp_path):
+    path = tmp_path / "traces" / "t.jsonl"
+    tracer = Tracer(str(path), sample_rate=0.0, force_token="s3cret")
+    with tracer.trace("/analyze-with-memory", "bad id\n", force=tracer.forced("s3cret")) as trace:
+        record_span("rag_call", 0.01)
+    with tracer.trace("/analyze-with-memory", "req-2"):
+        pass
+    tracer.close()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record["request_id"] == trace.request_id != "bad id\n"
+    assert record["spans"][0]["name"] == "rag_call"
+    assert tracer.stats()["written"] == 1
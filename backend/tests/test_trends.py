@@ -0,0 +1,39 @@
+import pytest
+
+from trends import TrendEngine
+
+
+def series(*points):
+    return [{"value": value, "timestamp": stamp} for value, stamp in points]
+
+
+def test_daily_slope_and_direction_against_optimal_range():
+    summary = TrendEngine().summarize({"TSH": series((4.0, "2024-01-01"), (3.0, "2024-01-11"), (2.5, "2024-01-21"))})
+    tsh = summary["TSH"]
+    assert tsh["slope_unit"] == "per_day"
+    assert tsh["slope"] == pytest.approx(-0.075)
+    assert tsh["direction"] == "falling"
+    assert tsh["status"] == "high"
+    # Falling toward the range from above is an improvement
+    assert tsh["assessment"] == "improving"
+
+
+def test_readings_sharing_a_timestamp_fall_back_to_reading_index():
+    summary = TrendEngine().summarize({"TSH": series((3.0, "2024-01-01"), (2.0, "2024-01-01"))})
+    tsh = summary["TSH"]
+    assert tsh["slope_unit"] == "per_reading"
+    assert tsh["slope"] == pytest.approx(-1.0)
+    assert tsh["direction"] == "falling"
+
+
+def test_missing_timestamps_and_single_readings():
+    summary = TrendEngine().summarize({
+        "glucose": [{"value": 90}, {"value": 95}, {"value": "n/a"}],
+        "ferritin": [{"value": 80, "timestamp": "2024-01-01"}],
+        "empty": [{"value": None}]
+    })
+    assert summary["glucose"]["slope_unit"] == "per_reading"
+    assert summary["glucose"]["readings"] == 2
+    assert summary["ferritin"]["assessment"] == "first_measurement"
+    assert summary["ferritin"]["slope"] is None
+    assert "empty" not in summary
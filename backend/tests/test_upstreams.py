@@ -0,0 +1,40 @@
+import asyncio
+
+from upstreams import UpstreamClient, UpstreamConfig
+
+
+def test_pool_is_shared_and_configured_from_env(monkeypatch):
+    monkeypatch.setenv("MEMORY_SERVICE_URL", "http://memory.test/")
+    monkeypatch.setenv("MEMORY_POOL_MAX_CONNECTIONS", "7")
+    config = UpstreamConfig.from_env("memory", "http://localhost:8002")
+    assert config.base_url == "http://memory.test"
+    assert config.max_connections == 7
+
+    async def scenario():
+        upstream = UpstreamClient(config)
+        await upstream.start()
+        client = upstream.client
+        await upstream.start()
+        # Idempotent: the lifespan and ad-hoc callers reuse one pool
+        assert upstream.client is client
+        stats = upstream.stats()
+        await upstream.close()
+        return stats, upstream
+
+    stats, upstream = asyncio.run(scenario())
+    assert stats["started"] is True
+    assert stats["limits"]["max_connections"] == 7
+    assert stats["connections"] == {"open": 0, "idle": 0}
+    assert upstream.stats()["started"] is False
+
+
+def test_pool_internals_read_for_stats_are_present():
+    # _pool_connections falls back to an empty pool if httpx moves these; fail loudly here instead
+    async def scenario():
+        upstream = UpstreamClient(UpstreamConfig(name="rag", base_url="http://rag.test"))
+        await upstream.start()
+        pool = upstream.client._transport._pool
+        await upstream.close()
+        return pool
+
+    assert isinstance(asyncio.run(scenario()).connections, list)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+from write_behind import WriteBehindQueue
+
+
+def spool_ids(queue):
+    with open(queue.spool_path, encoding="utf-8") as f:
+        return [json.loads(line)["id"] for line in f if line.strip()]
+
+
+def test_replay_after_partial_ack(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    written = []
+
+    async def write(value, progress):
+        if value == "bad":
+            raise RuntimeError("upstream down")
+        written.append(value)
+
+    async def first_run():
+        queue = WriteBehindQueue(spool, {"write": write}, flush_interval=0, max_attempts=5)
+        await queue.start()
+        await queue.enqueue("write", value="a")
+        await queue.enqueue("write", value="bad")
+        await queue.enqueue("write", value="b")
+        # "bad" waits to retry, so the drain times out with it still in the spool
+        await queue.stop(drain_timeout=0.2)
+        return queue
+
+    queue = asyncio.run(first_run())
+    assert written == ["a", "b"]
+    assert queue.depth == 1
+
+    replayed = []
+
+    async def recovered(value, progress):
+        replayed.append(value)
+
+    async def second_run():
+        queue = WriteBehindQueue(spool, {"write": recovered}, flush_interval=0)
+        await queue.start()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(second_run())
+    assert replayed == ["bad"]
+    assert queue.replayed_total == 1
+    assert queue.depth == 0
+
+
+def test_completed_steps_are_not_repeated_on_replay(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    posts = []
+    fail_second = True
+
+    async def interaction(messages, progress):
+        for step in messages:
+            if progress.done(step):
+                continue
+            if step == "assistant" and fail_second:
+                raise RuntimeError("assistant message rejected")
+            posts.append(step)
+            progress.complete(step)
+
+    async def run(enqueue=False):
+        queue = WriteBehindQueue(spool, {"interaction": interaction}, flush_interval=0)
+        await queue.start()
+        if enqueue:
+            await queue.enqueue("interaction", messages=["user", "assistant"])
+        await queue.stop(drain_timeout=0.2)
+
+    asyncio.run(run(enqueue=True))
+    assert posts == ["user"]
+    fail_second = False
+    # The restarted queue replays the record with the user message already marked done
+    asyncio.run(run())
+    assert posts == ["user", "assistant"]
+
+
+def test_compaction_keeps_records_and_acks_written_meanwhile(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def write(value, progress):
+            if value == "slow":
+                await release.wait()
+
+        queue = WriteBehindQueue(spool, {"write": write}, flush_interval=0, compact_every=1)
+        await queue.start()
+        await queue.enqueue("write", value="slow")
+        await queue.enqueue("write", value="fast")
+        await asyncio.sleep(0.05)
+        compaction = asyncio.ensure_future(queue._compact())
+        await asyncio.sleep(0)
+        # Appended while the snapshot is written in a thread
+        late = await queue.enqueue("write", value="late")
+        await compaction
+        assert late in spool_ids(queue)
+        release.set()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.depth == 0
+    assert queue.flushed_total == 3
+
+
+def test_processes_sharing_a_spool_path_claim_separate_slots(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def noop(value, progress):
+        pass
+
+    async def scenario():
+        first = WriteBehindQueue(spool, {"write": noop})
+        second = WriteBehindQueue(spool, {"write": noop})
+        await first.start()
+        await second.start()
+        paths = (first.spool_path, second.spool_path)
+        await second.stop()
+        await first.stop()
+        return paths
+
+    first_path, second_path = asyncio.run(scenario())
+    assert first_path == spool
+    assert second_path == str(tmp_path / "spool.w1.jsonl")
@@ -0,0 +1,231 @@
+"""
+Per-request traces for the Memory-Enhanced API
+A ``RequestTrace`` bound to the current task context collects stage spans, upstream calls and
+cache lookups for one request. It renders the ``Server-Timing`` response header, and a sampled
+fraction of traces (plus every trace slower than a threshold) is written as a JSON line to a
+size-rotated local file by a background writer thread.
+"""
+
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+# Caller-supplied request ids are echoed and written to logs; anything else gets a fresh id
+_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+def current_trace() -> Optional["RequestTrace"]:
+    """The trace of the request being served by this task, if any"""
+    return _current.get()
+
+
+def record_span(name: str, seconds: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, seconds)
+
+
+def record_upstream(upstream: str, method: str, url: str, status: str, seconds: Optional[float]):
+    trace = _current.get()
+    if trace is not None:
+        trace.upstream_calls.append({
+            "upstream": upstream,
+            "method": method,
+            "url": url,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2) if seconds is not None else None
+        })
+
+
+def record_cache(cache: str, hit: bool):
+    trace = _current.get()
+    if trace is not None:
+        trace.cache_lookups.append({"cache": cache, "hit": hit})
+
+
+class RequestTrace:
+    """Stage spans, upstream calls and cache lookups for one request
+
+    Context branches and single-flight leaders run as tasks that copy the request's context,
+    so their spans land on the same trace object.
+    """
+
+    def __init__(self, request_id: str, route: str):
+        self.request_id = request_id
+        self.route = route
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Dict[str, Any]] = []
+        self.upstream_calls: List[Dict[str, Any]] = []
+        self.cache_lookups: List[Dict[str, Any]] = []
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def add_span(self, name: str, seconds: float):
+        # Spans are reported on completion; derive the start from the duration
+        start = time.perf_counter() - seconds - self.started
+        self.spans.append({
+            "name": name,
+            "start_ms": round(max(start, 0.0) * 1000, 2),
+            "duration_ms": round(seconds * 1000, 2)
+        })
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per stage, summed when a stage ran more than once"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return totals
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value: one entry per stage, cache results, then the total"""
+        entries = [f"{name};dur={duration:.2f}" for name, duration in self.stage_totals().items()]
+        for lookup in self.cache_lookups:
+            entries.append(f'cache-{lookup["cache"]};desc={"hit" if lookup["hit"] else "miss"}')
+        entries.append(f"total;dur={self.duration * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "route": self.route,
+            "timestamp": self.timestamp,
+            "duration_ms": round(self.duration * 1000, 2),
+            "error": self.error,
+            "attributes": self.attributes,
+            "spans": self.spans,
+            "upstream_calls": self.upstream_calls,
+            "cache_lookups": self.cache_lookups
+        }
+
+
+def sanitize_request_id(request_id: Optional[str]) -> Optional[str]:
+    """``request_id`` if it is a short token of safe characters, else None"""
+    if request_id and _REQUEST_ID.fullmatch(request_id):
+        return request_id
+    return None
+
+
+class _TraceFileHandler(RotatingFileHandler):
+    """Rotating trace file that reports outcomes to its ``Tracer`` (runs on the writer thread)"""
+
+    def __init__(self, tracer: "Tracer", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tracer = tracer
+
+    def emit(self, record: logging.LogRecord):
+        errors = self.tracer.write_errors
+        super().emit(record)
+        if self.tracer.write_errors == errors:
+            self.tracer.written += 1
+
+    def handleError(self, record: logging.LogRecord):
+        self.tracer.write_errors += 1
+
+
+class Tracer:
+    """Binds a ``RequestTrace`` to each traced request and writes the kept ones to disk
+
+    A trace is kept when it is sampled (``sample_rate``), slower than ``slow_threshold``
+    seconds (0 disables), or forced by a caller presenting ``force_token`` (forcing is off
+    without one: traces carry user and session ids). Kept traces go through a bounded queue
+    (``max_queue``; overflow is dropped) to a writer thread, so the event loop never does file
+    I/O. The trace file rotates at ``max_bytes`` keeping ``backup_count`` old files.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 0.01, slow_threshold: float = 0.0, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5, force_token: Optional[str] = None, max_queue: int = 10000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.force_token = force_token or None
+        self._queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue)
+        self._listener: Optional[QueueListener] = None
+        self.traced = 0
+        self.written = 0
+        self.write_errors = 0
+        self.dropped = 0
+
+    def forced(self, token: Optional[str]) -> bool:
+        """Whether an ``X-Trace`` header value may force this request's trace to be written"""
+        if self.force_token is None or not token:
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), self.force_token.encode("utf-8"))
+
+    @contextmanager
+    def trace(self, route: str, request_id: Optional[str] = None, force: bool = False) -> Iterator[RequestTrace]:
+        trace = RequestTrace(sanitize_request_id(request_id) or uuid.uuid4().hex, route)
+        token = _current.set(trace)
+        self.traced += 1
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = getattr(e, "detail", None) or type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            trace.finish()
+            if self._should_write(trace, force):
+                self._write(trace)
+
+    def _should_write(self, trace: RequestTrace, force: bool) -> bool:
+        if force:
+            return True
+        if self.slow_threshold > 0 and trace.duration >= self.slow_threshold:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _write(self, trace: RequestTrace):
+        try:
+            if self._listener is None:
+                self._start_writer()
+            self._queue.put_nowait(logging.makeLogRecord({"msg": json.dumps(trace.to_record(), default=str)}))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.write_errors += 1
+
+    def _start_writer(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = _TraceFileHandler(self, self.path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8", delay=True)
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def close(self):
+        """Write out queued traces and stop the writer thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "slow_threshold_ms": round(self.slow_threshold * 1000, 2),
+            "traced": self.traced,
+            "written": self.written,
+            "write_errors": self.write_errors,
+            "dropped": self.dropped,
+            "forcing_enabled": self.force_token is not None
+        }
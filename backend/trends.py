@@ -0,0 +1,162 @@
+"""
+Vectorised biomarker trend engine for the Memory-Enhanced API
+All of a user's series are packed right-aligned into one NaN-padded matrix (one row per
+biomarker), so slope, EWMA, volatility and rate of change come out of a handful of NumPy
+reductions instead of a Python loop per biomarker. Direction is judged against the
+biomarker's optimal range: a rise is an improvement for a low marker and a regression for a
+high one.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from biomarkers import optimal_range
+
+# Fitted change across the window, relative to the EWMA, below which a trend counts as stable
+STABLE_CHANGE = 0.02
+
+SECONDS_PER_DAY = 86400.0
+
+
+def _timestamp(point: Dict[str, Any]) -> Optional[float]:
+    raw = point.get('timestamp')
+    if not isinstance(raw, str):
+        return None
+    try:
+        return datetime.fromisoformat(raw.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+class TrendEngine:
+    """Per-biomarker trend statistics for one user's health journey
+
+    ``summarize`` returns, per biomarker with at least one numeric reading::
+
+        {"latest", "previous", "readings", "slope", "slope_unit", "ewma", "volatility",
+         "rate_of_change", "direction", "status", "assessment", "optimal_range"}
+
+    ``slope`` is per day when every reading carries a parseable ``timestamp`` and the readings
+    span more than one instant, and per reading otherwise (so readings entered for the same
+    date still get a slope). ``volatility`` is the standard deviation of reading-to-reading relative
+    changes; ``rate_of_change`` is the relative change from the first to the latest reading.
+    """
+
+    def __init__(self, ewma_alpha: float = 0.5, stable_change: float = STABLE_CHANGE):
+        self.ewma_alpha = ewma_alpha
+        self.stable_change = stable_change
+
+    def summarize(self, trends: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        names: List[str] = []
+        rows: List[List[float]] = []
+        times: List[List[float]] = []
+        timed: List[bool] = []
+        for name, series in (trends or {}).items():
+            points = [(value, _timestamp(point)) for point in series or [] if (value := _number(point.get('value'))) is not None]
+            if not points:
+                continue
+            names.append(name)
+            rows.append([value for value, _ in points])
+            stamps = [stamp for _, stamp in points]
+            # A zero time span would make every x equal and the fitted slope undefined
+            has_times = all(stamp is not None for stamp in stamps) and (len(stamps) < 2 or max(stamps) > min(stamps))
+            timed.append(has_times)
+            times.append([(stamp - stamps[0]) / SECONDS_PER_DAY for stamp in stamps] if has_times else list(range(len(points))))
+        if not names:
+            return {}
+
+        # Right-aligned NaN padding: column -1 is every biomarker's latest reading
+        width = max(len(row) for row in rows)
+        values = np.full((len(rows), width), np.nan)
+        x = np.full((len(rows), width), np.nan)
+        for index, (row, row_times) in enumerate(zip(rows, times)):
+            values[index, width - len(row):] = row
+            x[index, width - len(row):] = row_times
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=1)
+        latest = values[:, -1]
+        previous = values[:, -2] if width > 1 else np.full(len(rows), np.nan)
+        first = values[np.arange(len(rows)), width - counts]
+
+        # Least-squares slope per row over the valid readings
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = np.nanmean(x, axis=1, keepdims=True)
+            y_mean = np.nanmean(values, axis=1, keepdims=True)
+            dx = np.where(valid, x - x_mean, 0.0)
+            dy = np.where(valid, values - y_mean, 0.0)
+            slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+            span = np.nanmax(x, axis=1) - np.nanmin(x, axis=1)
+
+            # Adjusted EWMA: the same right-aligned weight vector for every row, masked to valid readings
+            weights = self.ewma_alpha * (1 - self.ewma_alpha) ** np.arange(width - 1, -1, -1)
+            masked = np.where(valid, weights, 0.0)
+            ewma = np.where(valid, values, 0.0).dot(weights) / masked.sum(axis=1)
+
+            steps = np.diff(values, axis=1) / np.abs(values[:, :-1])
+            steps[~np.isfinite(steps)] = np.nan
+            has_steps = (~np.isnan(steps)).sum(axis=1) > 1
+            volatility = np.full(len(rows), np.nan)
+            volatility[has_steps] = np.nanstd(steps[has_steps], axis=1)
+            rate_of_change = np.where(counts > 1, (latest - first) / np.abs(first), np.nan)
+            fitted_change = np.where(counts > 1, slope * span / np.abs(ewma), 0.0)
+
+        summary = {}
+        for index, name in enumerate(names):
+            change = fitted_change[index]
+            if counts[index] < 2 or not np.isfinite(change) or abs(change) < self.stable_change:
+                direction = "stable"
+            else:
+                direction = "rising" if change > 0 else "falling"
+            bounds = optimal_range(name)
+            status = self._status(latest[index], bounds)
+            summary[name] = {
+                "latest": _round(latest[index]),
+                "previous": _round(previous[index]) if counts[index] > 1 else None,
+                "readings": int(counts[index]),
+                "slope": _round(slope[index], 6) if counts[index] > 1 else None,
+                "slope_unit": "per_day" if timed[index] else "per_reading",
+                "ewma": _round(ewma[index]),
+                "volatility": _round(volatility[index]),
+                "rate_of_change": _round(rate_of_change[index]),
+                "direction": direction,
+                "status": status,
+                "assessment": self._assess(int(counts[index]), direction, status),
+                "optimal_range": [bounds["min"], bounds["max"]] if bounds else None
+            }
+        return summary
+
+    @staticmethod
+    def _status(value: float, bounds: Optional[Dict[str, Any]]) -> str:
+        if bounds is None:
+            return "unknown"
+        if value < bounds["min"]:
+            return "low"
+        if value > bounds["max"]:
+            return "high"
+        return "optimal"
+
+    @staticmethod
+    def _assess(readings: int, direction: str, status: str) -> str:
+        """Direction read against the optimal range rather than "up is good" """
+        if readings < 2:
+            return "first_measurement"
+        if status == "unknown":
+            return "unknown"
+        if status == "optimal":
+            return "optimal"
+        if direction == "stable":
+            return "stable"
+        toward_range = (direction == "rising") == (status == "low")
+        return "improving" if toward_range else "worsening"
@@ -0,0 +1,292 @@
+"""
+Upstream HTTP clients for the Memory-Enhanced API
+Long-lived, pooled httpx clients for the memory (8002) and RAG (8001) services
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+from resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+from settings import env_bool, env_float, env_int, env_str
+from tracing import record_upstream
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Loop time at which the caller gives up on upstream calls made in this context (see ``call_budget``)
+_budget_deadline: ContextVar[Optional[float]] = ContextVar("upstream_budget_deadline", default=None)
+
+# Slack for the event loop firing the caller's timer up to one clock resolution early
+_BUDGET_SLACK = 0.005
+
+
+@contextmanager
+def call_budget(seconds: float) -> Iterator[None]:
+    """Mark upstream calls started inside as cut off by the caller after ``seconds``
+
+    Tasks created inside (e.g. by ``asyncio.wait_for``) inherit the budget. A call cancelled once
+    it has run out counts as a timeout, like an httpx one: a breaker failure and a censored
+    sample for its adaptive timeout. Other cancellations (client disconnects, shutdown) do not.
+    """
+    token = _budget_deadline.set(asyncio.get_running_loop().time() + seconds)
+    try:
+        yield
+    finally:
+        _budget_deadline.reset(token)
+
+
+@dataclass
+class UpstreamConfig:
+    """Connection settings for a single upstream service"""
+    name: str
+    base_url: str
+    timeout: float = 5.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    breaker_failures: int = 5
+    breaker_recovery: float = 10.0
+    min_timeout: float = 0.5
+    timeout_multiplier: float = 3.0
+
+    @classmethod
+    def from_env(cls, name: str, default_url: str, timeout: float = 5.0) -> "UpstreamConfig":
+        """Build a config from ``<NAME>_SERVICE_URL`` / ``<NAME>_POOL_*`` environment variables"""
+        prefix = name.upper()
+        return cls(
+            name=name,
+            base_url=env_str(f"{prefix}_SERVICE_URL", default_url).rstrip("/"),
+            timeout=env_float(f"{prefix}_TIMEOUT", timeout),
+            max_connections=env_int(f"{prefix}_POOL_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=env_int(f"{prefix}_POOL_MAX_KEEPALIVE", 20),
+            keepalive_expiry=env_float(f"{prefix}_POOL_KEEPALIVE_EXPIRY", 30.0),
+            http2=env_bool(f"{prefix}_HTTP2", False),
+            breaker_failures=env_int(f"{prefix}_BREAKER_FAILURES", 5),
+            breaker_recovery=env_float(f"{prefix}_BREAKER_RECOVERY_SECONDS", 10.0),
+            min_timeout=env_float(f"{prefix}_TIMEOUT_MIN", 0.5),
+            timeout_multiplier=env_float(f"{prefix}_TIMEOUT_MULTIPLIER", 3.0)
+        )
+
+
+class UpstreamClient:
+    """One pooled ``httpx.AsyncClient`` per upstream, opened and closed by the app lifespan
+
+    Every call goes through a circuit breaker (5xx responses and transport errors count as
+    failures) and, unless the caller passes its own ``timeout``, uses a timeout adapted from
+    recent latency percentiles, capped at the configured timeout. Latency is tracked per
+    ``endpoint`` class (the method unless the caller names one), so fast searches are not timed
+    against slow batch writes. Half-open trial calls use the configured timeout, so a recovered
+    but slower upstream can still close the breaker.
+    """
+
+    def __init__(self, config: UpstreamConfig, metrics=None):
+        self.config = config
+        self.metrics = metrics
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(config.name, config.breaker_failures, config.breaker_recovery)
+        self.timeouts: Dict[str, AdaptiveTimeout] = {}
+        self.requests_total = 0
+        self.errors_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latency_total = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def base_url(self) -> str:
+        return self.config.base_url
+
+    async def start(self):
+        """Open the pooled client (idempotent)"""
+        if self._client is not None:
+            return
+        http2 = self.config.http2
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning(f"HTTP/2 requested for {self.name} upstream but 'h2' is not installed; using HTTP/1.1")
+            http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=self.config.base_url,
+            timeout=self.config.timeout,
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry
+            ),
+            http2=http2
+        )
+        logger.info(f"Opened {self.name} upstream pool to {self.config.base_url} (http2={http2})")
+
+    async def close(self):
+        """Close the pooled client and release its connections"""
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        await client.aclose()
+        logger.info(f"Closed {self.name} upstream pool")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError(f"{self.name} upstream client used before application startup")
+        return self._client
+
+    def adaptive_timeout(self, endpoint: str) -> AdaptiveTimeout:
+        """The latency window and timeout of one endpoint class"""
+        timeout = self.timeouts.get(endpoint)
+        if timeout is None:
+            timeout = self.timeouts[endpoint] = AdaptiveTimeout(self.config.timeout, self.config.min_timeout, self.config.timeout_multiplier)
+        return timeout
+
+    async def request(self, method: str, path: str, endpoint: Optional[str] = None, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool, recording per-upstream metrics"""
+        if self._client is None:
+            # Allow use outside the lifespan (scripts, ad-hoc calls); the lifespan still closes it
+            await self.start()
+        trial = self._before_call(method, path)
+        timeout = self.adaptive_timeout(endpoint or method) if "timeout" not in kwargs else None
+        if timeout is not None:
+            kwargs["timeout"] = self.config.timeout if trial else timeout.current()
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except asyncio.CancelledError:
+            self._cancelled(method, path, started, timeout)
+            raise
+        except Exception as e:
+            self.errors_total += 1
+            self.breaker.record_failure()
+            if timeout is not None and isinstance(e, httpx.TimeoutException):
+                timeout.observe_timeout(kwargs["timeout"])
+            self._record(method, path, "error", time.perf_counter() - started)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.in_flight -= 1
+            self.latency_total += elapsed
+        self._record(method, path, str(response.status_code), elapsed)
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            if timeout is not None:
+                timeout.observe(elapsed)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream a response body through the shared pool, recording per-upstream metrics
+
+        Streams use the configured timeout, not an adaptive one: httpx applies it to each read,
+        and how long a streamed body takes depends on its length (or on token generation), not
+        on how healthy the upstream is, so it is no sample for the latency windows either.
+        """
+        if self._client is None:
+            await self.start()
+        self._before_call(method, path)
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            async with self.client.stream(method, path, **kwargs) as response:
+                self._record(method, path, str(response.status_code), time.perf_counter() - started)
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                yield response
+        except httpx.HTTPError:
+            self.errors_total += 1
+            self.breaker.record_failure()
+            self._record(method, path, "error")
+            raise
+        except asyncio.CancelledError:
+            self._cancelled(method, path, started)
+            raise
+        finally:
+            self.in_flight -= 1
+            self.latency_total += time.perf_counter() - started
+
+    def _cancelled(self, method: str, path: str, started: float, timeout: Optional[AdaptiveTimeout] = None):
+        deadline = _budget_deadline.get()
+        if deadline is None or asyncio.get_running_loop().time() < deadline - _BUDGET_SLACK:
+            # Not the caller's latency budget running out: the call says nothing about the upstream
+            self.breaker.release()
+            return
+        elapsed = time.perf_counter() - started
+        self.errors_total += 1
+        self.breaker.record_failure()
+        if timeout is not None:
+            timeout.observe_timeout(elapsed)
+        self._record(method, path, "timeout", elapsed)
+
+    def _before_call(self, method: str, path: str) -> bool:
+        try:
+            return self.breaker.before_call()
+        except CircuitOpenError:
+            self._record(method, path, "circuit_open")
+            raise
+
+    def _record(self, method: str, path: str, status: str, seconds: Optional[float] = None):
+        if self.metrics is not None:
+            self.metrics.record_upstream(self.name, method, status, seconds)
+        record_upstream(self.name, method, f"{self.config.base_url}{path}", status, seconds)
+
+    async def get(self, path: str, endpoint: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, endpoint, **kwargs)
+
+    async def post(self, path: str, endpoint: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, endpoint, **kwargs)
+
+    def _pool_connections(self) -> Dict[str, int]:
+        # httpx does not expose pool state publicly; read it from the httpcore pool when present.
+        # These are private attributes (httpx is pinned in requirements.txt); if they move, the
+        # stats report an empty pool rather than failing
+        transport = getattr(self._client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {"open": 0, "idle": 0}
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"open": len(connections), "idle": idle}
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool and request metrics for this upstream"""
+        average_ms = (self.latency_total / self.requests_total * 1000) if self.requests_total else 0.0
+        return {
+            "base_url": self.config.base_url,
+            "started": self._client is not None,
+            "http2": bool(self._client is not None and self.config.http2 and HTTP2_AVAILABLE),
+            "limits": {
+                "max_connections": self.config.max_connections,
+                "max_keepalive_connections": self.config.max_keepalive_connections,
+                "keepalive_expiry": self.config.keepalive_expiry
+            },
+            "connections": self._pool_connections() if self._client is not None else {"open": 0, "idle": 0},
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "average_latency_ms": round(average_ms, 2),
+            "circuit_breaker": self.breaker.stats(),
+            "adaptive_timeouts": {endpoint: timeout.stats() for endpoint, timeout in self.timeouts.items()}
+        }
@@ -0,0 +1,462 @@
+"""
+Durable write-behind queue for the Memory-Enhanced API
+Memory and health-journey writes are appended to a local spool file before they are
+acknowledged, then flushed to the memory service in batches by a background task.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class WriteBehindFullError(Exception):
+    """Raised when the spool stays above its high-water mark for longer than the backpressure timeout"""
+
+
+class WriteProgress:
+    """Steps of one spooled record that already reached the upstream
+
+    Handlers that make several upstream writes check ``done(step)`` before each one and call
+    ``complete(step)`` as soon as it succeeds; the step is logged next to the acks at once, so a
+    retry or a replay after restart skips it instead of writing it twice.
+    """
+
+    def __init__(self, queue: "WriteBehindQueue", record: Dict[str, Any]):
+        self._queue = queue
+        self._record = record
+
+    def done(self, step: str) -> bool:
+        return step in self._record.get("steps", ())
+
+    def complete(self, step: str):
+        if self.done(step):
+            return
+        self._record.setdefault("steps", []).append(step)
+        self._queue._append_ack(f"{self._record['id']} {step}")
+
+
+class WriteBehindQueue:
+    """Append-only spool plus batched flusher with bounded concurrency
+
+    Records are JSON lines ``{"id", "kind", "payload", "attempts", "steps", "enqueued_at"}`` in
+    ``spool_path``; ids of completed records are appended to ``<spool_path>.acks``, as are ``"<id> <step>"``
+    lines for steps a handler has completed (see ``WriteProgress``). On startup every record without an
+    ack is replayed with its completed steps, so writes accepted before a restart are not lost and
+    are not repeated. Handlers are called with the record's payload plus ``progress``. Records that
+    keep failing are moved to ``<spool_path>.dead`` after ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        spool_path: str,
+        handlers: Dict[str, Handler],
+        batch_size: int = 32,
+        max_concurrency: int = 8,
+        max_pending: int = 10000,
+        backpressure_timeout: float = 2.0,
+        flush_interval: float = 0.05,
+        max_attempts: int = 5,
+        fsync: bool = False,
+        compact_every: int = 1000,
+        observe_write: Optional[Callable[[str, float], None]] = None,
+        observe_flush: Optional[Callable[[float], None]] = None,
+        claim_slot: bool = True,
+    ):
+        self.base_spool_path = spool_path
+        self._set_spool_path(spool_path)
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.backpressure_timeout = backpressure_timeout
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.fsync = fsync
+        self.compact_every = compact_every
+        self.observe_write = observe_write
+        self.observe_flush = observe_flush
+        self.claim_slot = claim_slot
+        self._slot_lock = None
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._unacked: Dict[str, Dict[str, Any]] = {}
+        self._in_flight = 0
+        self._acked_since_compact = 0
+        # Lines appended while a compaction snapshot is being written: (spool line?, text)
+        self._compaction_log: Optional[List[Tuple[bool, str]]] = None
+        self._spool_file = None
+        self._acks_file = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.enqueued_total = 0
+        self.replayed_total = 0
+        self.flushed_total = 0
+        self.failed_total = 0
+        self.dead_lettered_total = 0
+        self.backpressure_waits = 0
+        self.flushes = 0
+        self.flush_latency_total = 0.0
+        self.flush_latency_last = 0.0
+        self.flush_latency_max = 0.0
+
+    def _set_spool_path(self, spool_path: str):
+        self.spool_path = spool_path
+        self.acks_path = f"{spool_path}.acks"
+        self.dead_path = f"{spool_path}.dead"
+
+    def _claim_spool_slot(self):
+        """Take the lowest spool slot no other live process holds
+
+        Slot 0 is ``spool_path`` itself, slot n > 0 is ``<stem>.w<n><ext>``. Processes must not
+        share a spool, however they were started (``API_WORKERS``, ``uvicorn --workers``, gunicorn,
+        two instances in one directory): each would replay the other's records and compaction
+        would drop them. Slots are held with an exclusive ``flock`` for the life of the queue, so
+        a restarted process picks up a slot (and its unflushed records) released by one that exited.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            logger.warning("flock is unavailable on this platform; the write-behind spool is not protected against sharing")
+            return
+
+        stem, ext = os.path.splitext(self.base_spool_path)
+        slot = 0
+        while True:
+            path = self.base_spool_path if slot == 0 else f"{stem}.w{slot}{ext}"
+            handle = open(f"{path}.lock", "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                slot += 1
+                continue
+            self._slot_lock = handle
+            self._set_spool_path(path)
+            logger.info(f"Write-behind spool slot {slot} claimed by pid {os.getpid()}: {path}")
+            return
+
+    def _release_spool_slot(self):
+        if self._slot_lock is not None:
+            self._slot_lock.close()
+            self._slot_lock = None
+
+    @property
+    def depth(self) -> int:
+        """Writes accepted but not yet acknowledged (queued, in flight or waiting to retry)"""
+        return len(self._unacked)
+
+    async def start(self):
+        """Replay unacknowledged records from the spool and start the flusher"""
+        if self._flusher is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._stopping = False
+        spool_dir = os.path.dirname(self.base_spool_path)
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        if self.claim_slot:
+            self._claim_spool_slot()
+        pending = self._load_unacknowledged()
+        self._unacked = {record["id"]: record for record in pending}
+        await self._compact()
+        self._queue.clear()
+        self._queue.extend(pending)
+        self.replayed_total += len(pending)
+        if pending:
+            logger.info(f"Replaying {len(pending)} unflushed write(s) from {self.spool_path}")
+            self._wakeup.set()
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 5.0, flush: Optional[Callable[[], Awaitable[None]]] = None):
+        """Stop the flusher, draining for up to ``drain_timeout``; anything left stays in the spool
+
+        ``flush`` sends writes the handlers hold back (e.g. a coalescing window). It runs at the
+        start of the drain, and again after any cancellation so that sends already under way
+        finish, and record their progress, before the spool is closed.
+        """
+        if self._flusher is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        flusher = self._flusher
+
+        async def drain():
+            if flush is not None:
+                await flush()
+            await flusher
+
+        try:
+            await asyncio.wait_for(asyncio.shield(drain()), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Write-behind drain timed out with {self.depth} write(s) left in the spool")
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if flush is not None:
+            await flush()
+        self._flusher = None
+        self._close_files()
+        self._release_spool_slot()
+
+    async def enqueue(self, kind: str, **payload: Any) -> str:
+        """Durably append a write to the spool and schedule it for flushing"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown write-behind kind: {kind}")
+        if self.depth >= self.max_pending:
+            await self._wait_for_space()
+        record = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "attempts": 0,
+            "steps": [],
+            "enqueued_at": time.time()
+        }
+        self._append_spool(json.dumps(record, default=str))
+        self._unacked[record["id"]] = record
+        self._queue.append(record)
+        self.enqueued_total += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return record["id"]
+
+    async def _wait_for_space(self):
+        self.backpressure_waits += 1
+        if self._space is None:
+            raise WriteBehindFullError("Write-behind queue is full and not running")
+        try:
+            async with self._space:
+                await asyncio.wait_for(
+                    self._space.wait_for(lambda: self.depth < self.max_pending),
+                    timeout=self.backpressure_timeout
+                )
+        except asyncio.TimeoutError:
+            raise WriteBehindFullError(f"Write-behind queue is full ({self.depth} pending writes)")
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if not self._stopping:
+                # Give concurrent requests a moment to add to this batch
+                await asyncio.sleep(self.flush_interval)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            await self._flush_batch(batch)
+
+    async def _flush_batch(self, batch: List[Dict[str, Any]]):
+        self._in_flight += len(batch)
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def flush_one(record: Dict[str, Any]) -> bool:
+            async with semaphore:
+                write_started = time.perf_counter()
+                try:
+                    await self.handlers[record["kind"]](**record["payload"], progress=WriteProgress(self, record))
+                    return True
+                except Exception as e:
+                    logger.error(f"Write-behind '{record['kind']}' write failed (attempt {record['attempts'] + 1}): {e}")
+                    return False
+                finally:
+                    if self.observe_write is not None:
+                        self.observe_write(record["kind"], time.perf_counter() - write_started)
+
+        results = await asyncio.gather(*[flush_one(record) for record in batch])
+        self._in_flight -= len(batch)
+
+        acked = []
+        for record, ok in zip(batch, results):
+            if ok:
+                acked.append(record["id"])
+                self.flushed_total += 1
+                continue
+            self.failed_total += 1
+            record["attempts"] += 1
+            if record["attempts"] >= self.max_attempts:
+                self.dead_lettered_total += 1
+                self._dead_letter(record)
+                acked.append(record["id"])
+            else:
+                self._schedule_retry(record)
+        if acked:
+            self._append_ack("\n".join(acked))
+            for record_id in acked:
+                self._unacked.pop(record_id, None)
+            self._acked_since_compact += len(acked)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flush_latency_last = elapsed
+        self.flush_latency_total += elapsed
+        self.flush_latency_max = max(self.flush_latency_max, elapsed)
+        if self.observe_flush is not None:
+            self.observe_flush(elapsed)
+
+        if self._acked_since_compact >= self.compact_every and self._compaction_log is None:
+            await self._compact()
+        async with self._space:
+            self._space.notify_all()
+
+    def _schedule_retry(self, record: Dict[str, Any]):
+        # Exponential backoff; the record stays counted in depth while it waits
+        delay = min(0.5 * (2 ** (record["attempts"] - 1)), 30.0)
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._queue.append(record)
+            self._wakeup.set()
+
+        task = asyncio.create_task(requeue())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load_unacknowledged(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.spool_path):
+            return []
+        acked = set()
+        progress: Dict[str, List[str]] = {}
+        if os.path.exists(self.acks_path):
+            with open(self.acks_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record_id, _, step = line.strip().partition(" ")
+                    if step:
+                        progress.setdefault(record_id, []).append(step)
+                    elif record_id:
+                        acked.add(record_id)
+        pending = []
+        with open(self.spool_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; the write was never acknowledged
+                    logger.warning(f"Skipping unreadable spool record in {self.spool_path}")
+                    continue
+                if record["id"] not in acked:
+                    steps = record.setdefault("steps", [])
+                    steps.extend(step for step in progress.get(record["id"], ()) if step not in steps)
+                    pending.append(record)
+        return pending
+
+    async def _compact(self):
+        """Rewrite the spool to hold only unacknowledged records and clear the ack log
+
+        The snapshot is written and fsynced in a thread. Spool and ack lines appended meanwhile
+        are logged and carried over when the new files are swapped in, back on the event loop.
+        """
+        self._acked_since_compact = 0
+        snapshot = [{**record, "steps": list(record.get("steps", ()))} for record in self._unacked.values()]
+        self._compaction_log = []
+        tmp_path = f"{self.spool_path}.tmp"
+        try:
+            await asyncio.to_thread(self._write_snapshot, tmp_path, snapshot)
+        except BaseException:
+            self._compaction_log = None
+            raise
+        log, self._compaction_log = self._compaction_log, None
+        self._close_files()
+        spool_lines = [text for is_spool, text in log if is_spool]
+        if spool_lines:
+            with open(tmp_path, "a", encoding="utf-8") as f:
+                self._append(f, "\n".join(spool_lines))
+        os.replace(tmp_path, self.spool_path)
+        with open(self.acks_path, "w", encoding="utf-8") as f:
+            ack_lines = [text for is_spool, text in log if not is_spool]
+            if ack_lines:
+                self._append(f, "\n".join(ack_lines))
+
+    @staticmethod
+    def _write_snapshot(path: str, records: List[Dict[str, Any]]):
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append_spool(self, text: str):
+        self._append(self._spool_handle(), text)
+        if self._compaction_log is not None:
+            self._compaction_log.append((True, text))
+
+    def _append_ack(self, text: str):
+        self._append(self._acks_handle(), text)
+        if self._compaction_log is not None:
+            self._compaction_log.append((False, text))
+
+    def _spool_handle(self):
+        if self._spool_file is None:
+            self._spool_file = open(self.spool_path, "a", encoding="utf-8")
+        return self._spool_file
+
+    def _acks_handle(self):
+        if self._acks_file is None:
+            self._acks_file = open(self.acks_path, "a", encoding="utf-8")
+        return self._acks_file
+
+    def _append(self, handle, text: str):
+        handle.write(text + "\n")
+        handle.flush()
+        if self.fsync:
+            os.fsync(handle.fileno())
+
+    def _dead_letter(self, record: Dict[str, Any]):
+        logger.error(f"Write-behind '{record['kind']}' write {record['id']} dropped to {self.dead_path} after {record['attempts']} attempts")
+        with open(self.dead_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def _close_files(self):
+        for handle in (self._spool_file, self._acks_file):
+            if handle is not None:
+                handle.close()
+        self._spool_file = None
+        self._acks_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and flush latency"""
+        average_ms = (self.flush_latency_total / self.flushes * 1000) if self.flushes else 0.0
+        spool_bytes = os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+        return {
+            "spool_path": self.spool_path,
+            "depth": self.depth,
+            "queued": len(self._queue),
+            "in_flight": self._in_flight,
+            "max_pending": self.max_pending,
+            "spool_bytes": spool_bytes,
+            "enqueued_total": self.enqueued_total,
+            "replayed_total": self.replayed_total,
+            "flushed_total": self.flushed_total,
+            "failed_total": self.failed_total,
+            "dead_lettered_total": self.dead_lettered_total,
+            "backpressure_waits": self.backpressure_waits,
+            "flush_latency_ms": {
+                "last": round(self.flush_latency_last * 1000, 2),
+                "average": round(average_ms, 2),
+                "max": round(self.flush_latency_max * 1000, 2)
+            }
+        }
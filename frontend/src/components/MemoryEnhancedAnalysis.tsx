@@ -28,6 +28,21 @@ interface HealthTrend {
   metadata: any;
 }
 
+interface TrendSummary {
+  latest: number;
+  previous: number | null;
+  readings: number;
+  slope: number | null;
+  slope_unit: 'per_day' | 'per_reading';
+  ewma: number;
+  volatility: number | null;
+  rate_of_change: number | null;
+  direction: 'rising' | 'falling' | 'stable';
+  status: 'low' | 'high' | 'optimal' | 'unknown';
+  assessment: 'improving' | 'worsening' | 'stable' | 'optimal' | 'first_measurement' | 'unknown';
+  optimal_range: [number, number] | null;
+}
+
 interface MemoryEnhancedResponse {
   analysis: string;
   sources: Array<{
@@ -39,6 +54,7 @@ interface MemoryEnhancedResponse {
   session_id: string;
   recommendations: string[];
   health_trends?: { [key: string]: HealthTrend[] };
+  trend_summary?: { [key: string]: TrendSummary } | null;
 }
 
 interface HealthJourney {
@@ -302,6 +318,9 @@ export default function MemoryEnhancedAnalysis() {
                           <h4 className="font-medium">{biomarker}</h4>
                           <div className="text-sm text-gray-600 mt-1">
                             {trends.length} measurements, latest: {trends[trends.length - 1]?.value}
+                            {response.trend_summary?.[biomarker] && (
+                              <>, {response.trend_summary[biomarker].direction} ({response.trend_summary[biomarker].assessment.replace('_', ' ')})</>
+                            )}
                           </div>
                         </div>
                       ))}